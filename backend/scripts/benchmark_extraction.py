@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Compare whole-document text extraction against page-streaming extraction.
+
+Generates a synthetic PDF with dense text on every page, then runs each
+extraction/chunking strategy in a fresh process and reports wall time, peak
+Python heap (tracemalloc) and peak RSS.
+
+Usage:
+    python scripts/benchmark_extraction.py --pages 2000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+
+# Add the parent directory to the Python path so we can import from src
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+from src.rag.index.utils.chunker import IncrementalChunker, iter_pdf_pages  # noqa: E402
+
+SENTENCE = (
+    "Retrieval augmented generation pairs a language model with a search index "
+    "so that answers can cite the passages they were derived from. "
+)
+
+
+def build_synthetic_pdf(path, pages):
+    """Write a PDF with `pages` pages of wrapped body text"""
+    doc = fitz.open()
+    body = SENTENCE * 30
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(50, 50, 550, 800),
+            f"Chapter {i // 20 + 1}, page {i + 1}\n\n{body}",
+            fontsize=8,
+        )
+    doc.save(path)
+    doc.close()
+
+
+def run_whole_document(pdf_path):
+    """The previous approach: concatenate every page, then split once"""
+    doc = fitz.open(pdf_path)
+    text = ""
+    for page in doc:
+        text += page.get_text()
+    doc.close()
+    chunker = IncrementalChunker()
+    return len(chunker.text_splitter.split_text(text))
+
+
+def run_streaming(pdf_path):
+    """Stream pages through the incremental chunker, dropping chunks as they come"""
+    chunker = IncrementalChunker()
+    count = 0
+    for _ in chunker.chunk_pages(iter_pdf_pages(pdf_path)):
+        count += 1
+    return count
+
+
+MODES = {"whole-document": run_whole_document, "streaming": run_streaming}
+
+
+def _measure(mode, pdf_path, results):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = MODES[mode](pdf_path)
+    elapsed = time.perf_counter() - start
+    _, peak_heap = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results.put((mode, chunks, elapsed, peak_heap, peak_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF text extraction strategies")
+    parser.add_argument("--pages", type=int, default=2000, help="Pages in the synthetic PDF")
+    parser.add_argument("--pdf", help="Benchmark an existing PDF instead of a synthetic one")
+    args = parser.parse_args()
+
+    pdf_path = args.pdf
+    tmp_dir = None
+    if not pdf_path:
+        tmp_dir = tempfile.TemporaryDirectory()
+        pdf_path = os.path.join(tmp_dir.name, "synthetic.pdf")
+        print(f"Generating {args.pages}-page synthetic PDF...")
+        build_synthetic_pdf(pdf_path, args.pages)
+    print(f"PDF size: {os.path.getsize(pdf_path) / 1e6:.1f} MB\n")
+
+    # Spawn a fresh interpreter per mode so peak RSS is not shared between runs
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    print(f"{'mode':<16}{'chunks':>8}{'time (s)':>10}{'peak heap (MB)':>16}{'peak RSS (MB)':>15}")
+    for mode in MODES:
+        proc = ctx.Process(target=_measure, args=(mode, pdf_path, results))
+        proc.start()
+        mode, chunks, elapsed, peak_heap, peak_rss = results.get()
+        proc.join()
+        print(f"{mode:<16}{chunks:>8}{elapsed:>10.2f}{peak_heap / 1e6:>16.1f}{peak_rss / 1e6:>15.1f}")
+
+    if tmp_dir:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
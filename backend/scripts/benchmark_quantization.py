@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Compare recall and search latency of quantized collections against float32.
+
+Loads the same synthetic, clustered embeddings into one temporary collection
+per storage variant on a running Qdrant server (quantization is not
+available in the client's local mode), waits for indexing, then runs the
+same queries against each. Recall@k is measured against exact brute-force
+top-k computed with numpy; the memory column is the estimated RAM taken by
+the vectors searched first.
+
+Usage:
+    python scripts/benchmark_quantization.py --points 100000 --queries 200
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+VARIANTS = {
+    "float32": dict(quantization=None, search=None),
+    "scalar": dict(
+        quantization=models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True
+            )
+        ),
+        search=models.QuantizationSearchParams(rescore=False),
+    ),
+    "scalar+rescore": dict(
+        quantization="scalar",
+        search=models.QuantizationSearchParams(rescore=True, oversampling=2.0),
+    ),
+    "binary": dict(
+        quantization=models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=True)
+        ),
+        search=models.QuantizationSearchParams(rescore=False),
+    ),
+    "binary+rescore": dict(
+        quantization="binary",
+        search=models.QuantizationSearchParams(rescore=True, oversampling=3.0),
+    ),
+}
+
+# Bytes per dimension of the vectors held in RAM for the first search pass
+BYTES_PER_DIM = {None: 4.0, "scalar": 1.0, "binary": 1 / 8}
+
+
+def synthetic_embeddings(count, dim, seed=0):
+    """Unit vectors drawn around a few hundred topic centroids, like chunk embeddings"""
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((256, dim)).astype(np.float32)
+    vectors = centroids[rng.integers(0, len(centroids), count)]
+    vectors += 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def create_collection(client, name, dim, quantization, on_disk):
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(
+            size=dim, distance=models.Distance.COSINE, on_disk=on_disk
+        ),
+        quantization_config=quantization,
+        # Index right away so every variant is searched through HNSW
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1000),
+    )
+
+
+def upload(client, name, vectors, batch_size=1024):
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        client.upsert(
+            collection_name=name,
+            points=models.Batch(
+                ids=list(range(start, start + len(batch))), vectors=batch.tolist()
+            ),
+            wait=False,
+        )
+    while client.get_collection(name).status != models.CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def run_queries(client, name, queries, top_k, search_params):
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = client.search(
+            collection_name=name,
+            query_vector=query.tolist(),
+            limit=top_k,
+            search_params=search_params,
+        )
+        latencies.append(time.perf_counter() - start)
+        found.append([hit.id for hit in hits])
+    return found, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant vector quantization")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6333)
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=40)
+    parser.add_argument("--on-disk", action="store_true", help="Keep original vectors on disk")
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.host, port=args.port)
+    vectors = synthetic_embeddings(args.points, args.dim)
+    queries = synthetic_embeddings(args.queries, args.dim, seed=1)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+
+    print(f"{args.points} points, {args.dim} dims, {args.queries} queries, top {args.top_k}\n")
+    print(f"{'variant':<16}{'recall':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'RAM (MB)':>10}")
+    prefix = f"bench_quantization_{uuid.uuid4().hex[:8]}"
+    loaded = {}
+    try:
+        for variant, settings in VARIANTS.items():
+            quantization = settings["quantization"]
+            if isinstance(quantization, str):
+                # Rescoring variants search the collection of their base variant
+                name = loaded[quantization]
+                kind = quantization
+            else:
+                name = f"{prefix}_{variant}"
+                kind = variant if quantization is not None else None
+                create_collection(client, name, args.dim, quantization, args.on_disk)
+                upload(client, name, vectors)
+                loaded[variant] = name
+
+            search_params = (
+                models.SearchParams(quantization=settings["search"])
+                if settings["search"]
+                else None
+            )
+            found, latencies = run_queries(client, name, queries, args.top_k, search_params)
+            recall = np.mean(
+                [len(set(ids) & set(truth.tolist())) / args.top_k for ids, truth in zip(found, exact)]
+            )
+            ram = args.points * args.dim * BYTES_PER_DIM[kind] / 1e6
+            print(
+                f"{variant:<16}{recall:>8.3f}{np.percentile(latencies, 50) * 1000:>10.2f}"
+                f"{np.percentile(latencies, 95) * 1000:>10.2f}{ram:>10.1f}"
+            )
+    finally:
+        for name in loaded.values():
+            client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
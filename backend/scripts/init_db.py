@@ -16,6 +16,7 @@ from src.models.base import Base
 from src.utils.database import engine
 # Import all models to ensure they're registered with SQLAlchemy
 import src.models.highlight
+import src.models.job
 import src.models.pdf
 import src.models.user
 # Import any other models you have
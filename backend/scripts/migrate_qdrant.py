@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Copy the embeddings collection between embedded Qdrant and a Qdrant server.
+
+The target collection is created (or updated) with the settings from
+EmbeddingConfig, then every point is copied with its id, vector and payload,
+so the copy can replace the source as is. Stop the API and ingestion
+workers first: embedded Qdrant can only be opened by one process.
+
+Usage:
+    # Embedded -> server
+    python scripts/migrate_qdrant.py --to-server --path ./instance/qdrant --host localhost
+    # Server -> embedded
+    python scripts/migrate_qdrant.py --to-embedded --path ./instance/qdrant --host localhost
+"""
+import argparse
+import logging
+import os
+import sys
+
+from qdrant_client.http import models
+
+# Add the parent directory to the Python path so we can import from src
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+from src.config import config  # noqa: E402
+from src.rag.index.store.embeddings import VectorDB  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def migrate(source: VectorDB, target: VectorDB, batch_size: int) -> int:
+    """Copy every point of the source collection to the target collection"""
+    copied = 0
+    offset = None
+    while True:
+        records, offset = source.client.scroll(
+            collection_name=source.collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            target.upsert_points(
+                [
+                    models.PointStruct(id=record.id, vector=record.vector, payload=record.payload)
+                    for record in records
+                ]
+            )
+            copied += len(records)
+            logger.info(f"Copied {copied} points")
+        if offset is None:
+            return copied
+
+
+def main():
+    embedding_config = config.embedding_config
+    parser = argparse.ArgumentParser(
+        description="Migrate vectors between embedded Qdrant and a server"
+    )
+    direction = parser.add_mutually_exclusive_group(required=True)
+    direction.add_argument("--to-server", action="store_true", help="Copy embedded -> server")
+    direction.add_argument("--to-embedded", action="store_true", help="Copy server -> embedded")
+    parser.add_argument(
+        "--path", default=embedding_config.qdrant_path, help="Embedded Qdrant directory"
+    )
+    parser.add_argument("--host", default=embedding_config.qdrant_host)
+    parser.add_argument("--port", type=int, default=embedding_config.qdrant_port)
+    parser.add_argument("--collection", default=embedding_config.qdrant_collection_name)
+    parser.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args()
+
+    if not args.path:
+        parser.error("--path (or QDRANT_PATH) is required")
+
+    embedded = VectorDB(path=args.path, collection_name=args.collection)
+    server = VectorDB(host=args.host, port=args.port, collection_name=args.collection)
+    source, target = (embedded, server) if args.to_server else (server, embedded)
+
+    source_count = source.client.count(source.collection_name, exact=True).count
+    logger.info(f"Migrating {source_count} points of collection {args.collection}")
+    copied = migrate(source, target, args.batch_size)
+
+    target_count = target.client.count(target.collection_name, exact=True).count
+    if target_count < source_count:
+        logger.error(f"Target has {target_count} points, expected at least {source_count}")
+        sys.exit(1)
+    logger.info(f"Migrated {copied} points; target collection holds {target_count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Dict, Optional
 import os
 
 
@@ -10,12 +11,109 @@ class PDFChunkConfig(BaseModel):
 class EmbeddingConfig(BaseModel):
     batch_size: int = 100
     cache_capacity: int = 10000
+    cache_dtype: str = "float32"  # or "float16" to halve in-memory cache size
+    # Embeddings of search queries, reused across chats of the API process
+    query_cache_capacity: int = 2048
+    query_cache_ttl_seconds: float = 3600.0
+    # Search results (up to top_k chunk texts each) per PDF, index version and
+    # query; a re-index or delete of the PDF drops its results
+    retrieval_cache_capacity: int = 256
+    retrieval_cache_ttl_seconds: float = 600.0
     vector_size: int = 768
+    # "qdrant", or "local" for exact search over per-PDF memory-mapped .npy
+    # files in local_vector_path (single node, no external service)
+    vector_backend: str = os.environ.get("VECTOR_BACKEND", "qdrant")
+    local_vector_path: str = os.environ.get("LOCAL_VECTOR_PATH", "./uploads/vectors")
+    # Embedded Qdrant: run qdrant_client in local persistent mode from this
+    # directory instead of connecting to qdrant_host. Only one process can
+    # open it, so keep ingestion in the API process (INGESTION_IN_API=true).
+    # Migrate with scripts/migrate_qdrant.py
+    qdrant_path: str = os.environ.get("QDRANT_PATH", "")
     qdrant_host: str = "localhost"
     qdrant_port: int = 6333
+    # With QDRANT_PREFER_GRPC=true the async chat path talks to Qdrant over
+    # gRPC, which has less per-request overhead than REST. Off by default as
+    # the gRPC port must be exposed; searches fall back to REST if it is not
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = os.environ.get("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    # Connections kept open by the shared REST client (ingestion uploads and
+    # deletes run on it concurrently)
+    qdrant_pool_size: int = 16
+    # How often the shared client checks Qdrant and its collection, reopening
+    # the connection and recreating the collection when either is gone
+    qdrant_health_check_seconds: float = 30.0
     qdrant_collection_name: str = "document_embeddings"
+    # Multi-tenant layout: every search is scoped to one PDF, so pdf_id becomes
+    # a tenant index (points of a PDF stored together) and HNSW builds one graph
+    # per PDF (payload_m) instead of a global one (m=0). Filtered search then
+    # stays flat as the collection grows, but unfiltered search scans everything
+    qdrant_tenant_layout: bool = False
+    qdrant_payload_m: int = 16
+    # Memory footprint. Quantized vectors ("scalar" int8 = 4x smaller, "binary"
+    # = 32x smaller; binary suits >= 768-dim embeddings) are searched first and
+    # the top oversampling * top_k candidates rescored with the originals, which
+    # can then live on disk. Applied when the collection is created or opened
+    qdrant_quantization: str = "none"  # none, scalar, binary
+    qdrant_quantization_always_ram: bool = True
+    qdrant_scalar_quantile: float = 0.99
+    qdrant_rescore: bool = True
+    qdrant_oversampling: float = 2.0
+    qdrant_vectors_on_disk: bool = False  # original float32 vectors mmap'd
+    qdrant_hnsw_on_disk: bool = False  # HNSW graph mmap'd
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 100
+    qdrant_hnsw_ef: Optional[int] = None  # search-time beam width, None for Qdrant's default
     embedding_provider: str = "gemini"
     num_threads: int = 4
+    # Staged ingestion. Extraction and chunking each run on one thread (PyMuPDF
+    # is not thread-safe and chunk overlap depends on page order). Embedding
+    # runs on one asyncio thread with this many chunk batches in flight; the
+    # provider's own request concurrency limit applies on top
+    embed_concurrency: int = 8
+    # Vectors are buffered and uploaded in bulk without waiting for Qdrant to
+    # apply them, with up to upsert_workers uploads in flight. A buffer is sent
+    # once it holds upsert_flush_points points or its oldest point is
+    # upsert_flush_seconds old
+    upsert_workers: int = 2
+    upsert_flush_points: int = 1024
+    upsert_flush_seconds: float = 2.0
+    page_queue_size: int = 64  # extracted pages buffered ahead of the chunker
+    stage_queue_size: int = 8  # chunk batches buffered between later stages
+    # Persistent embedding cache shared by every process; empty path disables it
+    disk_cache_path: str = os.environ.get(
+        "EMBEDDING_CACHE_PATH", "./instance/embedding_cache.db"
+    )
+    disk_cache_max_mb: int = 1024
+
+
+class IngestionConfig(BaseModel):
+    num_workers: int = 2  # PDFs ingested concurrently
+    # Run ingestion workers inside the API process. Turn off when the API runs
+    # several processes and ingestion is done by `python -m src.rag.index.worker`
+    run_in_api: bool = os.environ.get("INGESTION_IN_API", "true").lower() == "true"
+    lease_seconds: int = 600  # how long a claimed job stays invisible to other workers
+    max_attempts: int = 3  # claims allowed before a repeatedly crashing job is failed
+    poll_interval: float = 5.0
+    cancel_check_interval: float = 2.0  # how often a running job checks for cancellation
+    cancel_timeout: float = 30.0  # how long deleting a PDF waits for its job to stop
+    # Re-index PDFs built under another chunker/embedding model config on startup
+    auto_reindex: bool = True
+    # Scheduling: a job's place in its user's queue is enqueue time plus this
+    # many seconds per page, so short documents go first but long ones age in
+    seconds_per_page: float = 2.0
+    # Relative share of the workers per user id (default 1.0)
+    user_weights: Dict[int, float] = {}
+    # Admission control: uploads beyond these limits are rejected with 429
+    max_queue_depth: int = 500  # queued jobs across all users
+    max_pending_per_user: int = 20  # queued or running jobs of one user
+    # Throughput used for Retry-After and ready-time estimates is measured over
+    # jobs completed in this window; until there are any, this rate is assumed
+    throughput_window_seconds: int = 3600
+    default_seconds_per_page: float = 0.5
+    # Completed, failed and cancelled jobs are deleted this long after they
+    # finished, checked at most once per purge interval
+    finished_job_retention_seconds: int = 7 * 24 * 3600
+    finished_job_purge_interval_seconds: int = 3600
 
 
 class LLMConfig(BaseModel):
@@ -31,6 +129,7 @@ class LLMConfig(BaseModel):
 class Config(BaseModel):
     pdf_chunk_config: PDFChunkConfig = PDFChunkConfig()
     embedding_config: EmbeddingConfig = EmbeddingConfig()
+    ingestion_config: IngestionConfig = IngestionConfig()
     llm_config: LLMConfig = LLMConfig()
     mistral_api_key: str = os.environ.get("MISTRAL_API_KEY", "")
 
@@ -2,8 +2,10 @@ from .routes.v1 import auth, highlights, pdf, rag, users
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from .utils.database import engine
+from .utils.database import engine, upgrade_schema
 from .models.base import Base
+from .config import config
+from .rag.index.store.factory import close_async_vector_db, get_vector_db
 import os
 from dotenv import load_dotenv
 import logging
@@ -23,8 +25,9 @@ if missing_vars:
         f"Missing required environment variables: {', '.join(missing_vars)}"
     )
 
-# Create database tables
+# Create database tables, and add columns and indexes newer than existing ones
 Base.metadata.create_all(bind=engine)
+upgrade_schema(Base.metadata, engine)
 
 # Get the absolute path to the application root directory
 app_root = os.path.dirname(os.path.abspath(__file__))
@@ -59,12 +62,23 @@ app.include_router(users.router, prefix="/api/users", tags=["User Management"])
 # Setup logging
 logger = logging.getLogger(__name__)
 
+# Ingestion pipeline run inside this process, if enabled
+pdf_pipeline = None
+
 @app.on_event("startup")
 async def startup_event():
     """Start the PDF embedding pipeline when the application starts"""
-    from .routes.v1.pdf import pdf_pipeline
-    
+    global pdf_pipeline
+    # Open the shared vector store and check its collection once, up front
+    get_vector_db()
+    if not config.ingestion_config.run_in_api:
+        logger.info("In-process ingestion disabled; PDFs are ingested by standalone workers")
+        return
+
+    from .rag.index.worker import PDFEmbeddingPipeline
+
     logger.info("Starting PDF embedding pipeline...")
+    pdf_pipeline = PDFEmbeddingPipeline()
     started = pdf_pipeline.start()
     if started:
         logger.info("PDF embedding pipeline started successfully")
@@ -74,12 +88,13 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Stop the PDF embedding pipeline when the application shuts down"""
-    from .routes.v1.pdf import pdf_pipeline
-    
+    await close_async_vector_db()
+    if pdf_pipeline is None:
+        return
+
     logger.info("Stopping PDF embedding pipeline...")
     stopped = pdf_pipeline.stop()
     if stopped:
         logger.info("PDF embedding pipeline stopped successfully")
     else:
         logger.warning("PDF embedding pipeline was not running or failed to stop")
-
@@ -0,0 +1,93 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, Index
+from .base import Base
+
+
+class IngestionJob(Base):
+    """
+    Durable record of a PDF waiting for (or undergoing) embedding ingestion.
+
+    Workers claim jobs by moving them from ``queued`` to ``leased`` and must
+    keep extending ``lease_expires_at`` while they work. A lease that runs out
+    means the worker died, and the job becomes claimable again.
+
+    Which queued job is claimed next is decided per user (fair share), then by
+    ``priority`` and ``sched_key`` (shortest job first with aging).
+    """
+
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True)
+    pdf_id = Column(String(5), nullable=False)
+    pdf_path = Column(String(200), nullable=False)
+    kind = Column(String(20), nullable=False, default="ingest")  # ingest, reindex
+    # Already indexed PDF with identical content whose vectors can be cloned
+    source_pdf_id = Column(String(5), nullable=True)
+    status = Column(
+        String(20), nullable=False, default="queued"
+    )  # queued, leased, cancel_requested, completed, failed, cancelled
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Scheduling
+    user_id = Column(Integer, nullable=True)
+    total_pages = Column(Integer, nullable=True)
+    priority = Column(Integer, nullable=False, default=0)  # -1 background, 0 normal, 1 interactive
+    # Enqueue time plus a per-page cost; lower keys are claimed first
+    sched_key = Column(Float, nullable=False, default=0.0)
+    claimed_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Indexes
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_id", "status", "id"),
+        Index("ix_ingestion_jobs_status_lease", "status", "lease_expires_at"),
+        # Recently finished jobs (throughput) and expired ones (retention)
+        Index("ix_ingestion_jobs_status_updated", "status", "updated_at"),
+        Index("ix_ingestion_jobs_pdf_id", "pdf_id"),
+        # A user's most urgent queued job, and their top priority
+        Index(
+            "ix_ingestion_jobs_status_user_priority",
+            "status", "user_id", "priority", "sched_key",
+        ),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "pdf_id": self.pdf_id,
+            "pdf_path": self.pdf_path,
+            "kind": self.kind,
+            "source_pdf_id": self.source_pdf_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "worker_id": self.worker_id,
+            "user_id": self.user_id,
+            "priority": self.priority,
+            "added_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class IngestionUserQueue(Base):
+    """
+    Scheduling state of one user's ingestion jobs, so picking whose turn it
+    is reads one row per user instead of aggregating over every job.
+
+    ``top_priority`` (None when nothing is queued) and ``running`` are
+    recomputed from the user's own jobs on every transition; ``user_key`` is
+    the user id, or 0 for jobs without an owner.
+    """
+
+    __tablename__ = "ingestion_user_queues"
+
+    user_key = Column(Integer, primary_key=True, autoincrement=False)
+    top_priority = Column(Integer, nullable=True)
+    running = Column(Integer, nullable=False, default=0)
+    weight = Column(Float, nullable=False, default=1.0)
+    last_served_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingestion_user_queues_top_priority", "top_priority"),
+    )
@@ -35,6 +35,10 @@ class PDF(Base):
         String(20), default="pending"
     )  # pending, processing, processed, failed
     table_of_contents = Column(JSON, nullable=True)
+    # SHA-256 of the file, used to reuse the index of an identical upload
+    content_hash = Column(String(64), nullable=True, index=True)
+    # Index version (chunker config + embedding model) searches are served from
+    index_version = Column(String(16), nullable=True)
 
     # Relationships
     highlights = relationship(
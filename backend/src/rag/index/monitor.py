@@ -55,7 +55,6 @@ class PDFProcessingMonitor:
         try:
             progress = self.pipeline.get_detailed_progress()
             queue_status = progress["queue_status"]
-            current_progress = progress["current_progress"]
             
             # Current time
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -69,8 +68,6 @@ class PDFProcessingMonitor:
             # Queue information
             lines.append(f"\nQUEUE STATUS:")
             lines.append(f"  Items in queue: {queue_status['queue_size']}")
-            lines.append(f"  Total added: {queue_status['total_added']}")
-            lines.append(f"  Total processed: {queue_status['total_processed']}")
             
             # Status counts
             if 'status_counts' in queue_status and queue_status['status_counts']:
@@ -78,16 +75,18 @@ class PDFProcessingMonitor:
                 for status, count in queue_status['status_counts'].items():
                     lines.append(f"    - {status}: {count}")
             
-            # Current processing information
-            lines.append("\nCURRENT PROCESSING:")
-            if current_progress['current_pdf_id']:
-                lines.append(f"  PDF ID: {current_progress['current_pdf_id']}")
-                lines.append(f"  Chunks: {current_progress['processed_chunks']}/{current_progress['total_chunks']}")
-                
-                # Progress bar
-                progress_bar = self._format_progress_bar(current_progress['progress_percentage'])
-                lines.append(f"  Progress: {progress_bar}")
-            else:
+            # Current processing information, one entry per worker
+            lines.append(f"\nCURRENT PROCESSING ({progress['active_workers']}/{len(progress['workers'])} workers busy):")
+            for worker in progress["workers"]:
+                if worker['current_pdf_id']:
+                    lines.append(f"  Worker {worker['worker_id']}:")
+                    lines.append(f"    PDF ID: {worker['current_pdf_id']}")
+                    lines.append(f"    Chunks: {worker['processed_chunks']}/{worker['total_chunks']}")
+                    
+                    # Progress bar
+                    progress_bar = self._format_progress_bar(worker['progress_percentage'])
+                    lines.append(f"    Progress: {progress_bar}")
+            if not progress['active_workers']:
                 lines.append("  No PDF currently being processed")
             
             # Worker status
@@ -1,104 +1,777 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional, Tuple
 import logging
-import threading
-from datetime import datetime
+import math
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import func, exists, and_, or_, case
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ...models.pdf import PDF
+from ...models.job import IngestionJob, IngestionUserQueue
+from ...utils.database import SessionLocal
+from ...config import config
+
+# Job states that still hold a place in the queue
+ACTIVE_JOB_STATUSES = ("queued", "leased", "cancel_requested")
+FINISHED_JOB_STATUSES = ("completed", "failed", "cancelled")
+# Job states in which a worker holds the lease
+RUNNING_JOB_STATUSES = ("leased", "cancel_requested")
+
+# Job priorities, claimed highest first
+PRIORITY_BACKGROUND = -1  # re-indexing
+PRIORITY_NORMAL = 0
+PRIORITY_INTERACTIVE = 1  # the user has the PDF open
 
 
 class PDFQueue:
-    def __init__(self):
-        self.queue: List[Dict[str, Any]] = []
+    """
+    Durable PDF processing queue backed by the ``ingestion_jobs`` table.
+
+    Jobs survive restarts, and a worker only owns a job while its lease is
+    valid. Every operation is an indexed lookup, so the cost stays logarithmic
+    in the number of backlogged uploads.
+
+    Scheduling is fair-share across users: the next job goes to the user with
+    the fewest running jobs relative to their weight, ties going to the user
+    served least recently. Within a user, interactive jobs come first, then
+    the lowest ``sched_key`` (enqueue time plus a per-page cost), so short
+    documents overtake long ones without starving them. Each user's running
+    count, last claim and top priority are kept in ``ingestion_user_queues``,
+    updated on every job transition, so the pick reads one row per user.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
         logging.basicConfig(level=logging.INFO)
-        self.lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
-        self.total_added = 0
-        self.total_processed = 0
-
-    def add_to_queue(self, pdf_id: str, pdf_path: str, db: Session = None) -> None:
-        """Add a PDF to the processing queue"""
-        with self.lock:
-            queue_item = {
-                "pdf_id": pdf_id,
-                "pdf_path": pdf_path,
-                "status": "pending",
-                "added_at": datetime.utcnow().isoformat(),
-            }
-            # Add to the in-memory queue
-            self.queue.append(queue_item)
-            self.total_added += 1
-
-            # Update status in database if db session is provided
-            if db:
-                try:
-                    pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
-                    if pdf:
-                        pdf.processing_status = "pending"
-                        db.commit()
-                        self.logger.info(
-                            f"Updated PDF {pdf_id} status to 'pending' in database"
-                        )
-                except Exception as e:
-                    self.logger.error(
-                        f"Error updating PDF {pdf_id} status in database: {str(e)}"
+        self.session_factory = session_factory
+        self.lease_seconds = config.ingestion_config.lease_seconds
+        self.max_attempts = config.ingestion_config.max_attempts
+        self.seconds_per_page = config.ingestion_config.seconds_per_page
+        self.user_weights = config.ingestion_config.user_weights
+        self.max_queue_depth = config.ingestion_config.max_queue_depth
+        self.max_pending_per_user = config.ingestion_config.max_pending_per_user
+        self.throughput_window = config.ingestion_config.throughput_window_seconds
+        self.retention_seconds = config.ingestion_config.finished_job_retention_seconds
+        self.purge_interval = config.ingestion_config.finished_job_purge_interval_seconds
+        self.last_purge = 0.0
+
+    @contextmanager
+    def _session(self):
+        """Yield a short-lived session so queue calls are safe from any thread"""
+        db = self.session_factory()
+        try:
+            yield db
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _set_pdf_status(self, db: Session, pdf_id: str, status: str) -> None:
+        pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+        if pdf:
+            pdf.processing_status = status
+
+    @staticmethod
+    def _jobs_of_user(user_id: Optional[int]):
+        """Filter on the jobs of a user (or of no user)"""
+        if user_id is None:
+            return IngestionJob.user_id.is_(None)
+        return IngestionJob.user_id == user_id
+
+    def _refresh_user(
+        self, db: Session, user_id: Optional[int], served_at: datetime = None
+    ) -> None:
+        """
+        Recompute a user's scheduling row from their own queued and running
+        jobs, with indexed lookups that do not depend on the backlog size
+
+        Args:
+            user_id: User whose jobs changed state
+            served_at: Time one of their jobs was just claimed
+        """
+        db.flush()
+        user_jobs = self._jobs_of_user(user_id)
+        values = {
+            IngestionUserQueue.top_priority: (
+                db.query(func.max(IngestionJob.priority))
+                .filter(IngestionJob.status == "queued", user_jobs)
+                .scalar()
+            ),
+            IngestionUserQueue.running: (
+                db.query(func.count(IngestionJob.id))
+                .filter(IngestionJob.status.in_(RUNNING_JOB_STATUSES), user_jobs)
+                .scalar()
+            ),
+            IngestionUserQueue.weight: (
+                self.user_weights.get(user_id, 1.0) if user_id is not None else 1.0
+            ),
+        }
+        if served_at is not None:
+            values[IngestionUserQueue.last_served_at] = served_at
+
+        user_key = 0 if user_id is None else user_id
+        row = db.query(IngestionUserQueue).filter(IngestionUserQueue.user_key == user_key)
+        if row.update(values, synchronize_session=False):
+            return
+        try:
+            with db.begin_nested():
+                db.add(
+                    IngestionUserQueue(
+                        user_key=user_key,
+                        **{column.key: value for column, value in values.items()},
                     )
+                )
+        except IntegrityError:
+            # Another process created the row meanwhile
+            row.update(values, synchronize_session=False)
+
+    def _refresh_users_of_pdf(self, db: Session, pdf_id: str) -> None:
+        user_ids = {
+            user_id
+            for (user_id,) in db.query(IngestionJob.user_id)
+            .filter(IngestionJob.pdf_id == pdf_id)
+            .distinct()
+        }
+        for user_id in user_ids:
+            self._refresh_user(db, user_id)
+
+    def rebuild_user_queues(self) -> None:
+        """
+        Recompute the scheduling row of every user with unfinished jobs or a
+        stale row, e.g. for jobs queued before the table existed
+        """
+        with self._session() as db:
+            user_ids = {
+                user_id
+                for (user_id,) in db.query(IngestionJob.user_id)
+                .filter(IngestionJob.status.in_(ACTIVE_JOB_STATUSES))
+                .distinct()
+            }
+            for (user_key,) in db.query(IngestionUserQueue.user_key).filter(
+                or_(
+                    IngestionUserQueue.top_priority.isnot(None),
+                    IngestionUserQueue.running > 0,
+                )
+            ):
+                user_ids.add(None if user_key == 0 else user_key)
+            for user_id in user_ids:
+                self._refresh_user(db, user_id)
+            db.commit()
+
+    def _new_job(
+        self, db: Session, pdf: PDF, kind: str = "ingest", source_pdf_id: str = None
+    ) -> IngestionJob:
+        """Build a queued job for ``pdf`` with its scheduling fields filled in"""
+        # Cloning an identical PDF's index costs the same whatever the page count
+        pages = 0 if source_pdf_id else (pdf.total_pages or 0)
+        job = IngestionJob(
+            pdf_id=pdf.id,
+            pdf_path=pdf.file_path,
+            source_pdf_id=source_pdf_id,
+            kind=kind,
+            status="queued",
+            user_id=pdf.user_id,
+            total_pages=pdf.total_pages,
+            priority=PRIORITY_BACKGROUND if kind == "reindex" else PRIORITY_NORMAL,
+            sched_key=time.time() + self.seconds_per_page * pages,
+        )
+        db.add(job)
+        self._refresh_user(db, pdf.user_id)
+        return job
+
+    def add_to_queue(
+        self,
+        pdf_id: str,
+        pdf_path: str,
+        source_pdf_id: str = None,
+        kind: str = "ingest",
+    ) -> Dict[str, Any]:
+        """
+        Add a PDF to the processing queue
+
+        Args:
+            pdf_id: PDF identifier
+            pdf_path: Path of the uploaded file
+            source_pdf_id: Optional already processed PDF with the same content,
+                whose index the worker clones instead of re-embedding
+            kind: "ingest" for new uploads, "reindex" to rebuild the index of a
+                PDF that stays searchable on its current version meanwhile
+        """
+        with self._session() as db:
+            pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+            if pdf is None:
+                raise ValueError(f"PDF {pdf_id} not found")
+            job = self._new_job(db, pdf, kind, source_pdf_id)
+            job.pdf_path = pdf_path
+            if kind != "reindex":
+                self._set_pdf_status(db, pdf_id, "pending")
+            db.commit()
+            self.logger.info(f"Queued PDF {pdf_id} as job {job.id}")
+            return job.to_dict()
 
     def get_queue_status(self) -> dict:
-        """Get the current status of the processing queue"""
-        # Count items by status
-        status_counts = {}
-        for item in self.queue:
-            status = item.get("status", "unknown")
-            status_counts[status] = status_counts.get(status, 0) + 1
-
-        queue_status = {
-            "queue_size": len(self.queue), 
+        """
+        Get the current status of the processing queue. Only unfinished jobs
+        are counted, so the cost follows the backlog, not the job history
+        """
+        with self._session() as db:
+            rows = (
+                db.query(IngestionJob.status, func.count(IngestionJob.id))
+                .filter(IngestionJob.status.in_(ACTIVE_JOB_STATUSES))
+                .group_by(IngestionJob.status)
+                .all()
+            )
+
+        status_counts = {status: count for status, count in rows}
+        return {
+            "queue_size": sum(status_counts.values()),
             "status_counts": status_counts,
-            "total_added": self.total_added,
-            "total_processed": self.total_processed
         }
-        
-        return queue_status
-
-    def get_next_item(self, db: Session = None) -> Dict[str, Any]:
-        """Get the next item from the processing queue"""
-        if len(self.queue) == 0:
-            return None
-
-        # Update status to 'processing' in memory
-        with self.lock:
-            if len(self.queue) > 0:
-                self.queue[0]["status"] = "processing"
-
-                # Update status in database if db session is provided
-                pdf_id = self.queue[0].get("pdf_id")
-                if db and pdf_id:
-                    try:
-                        pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
-                        if pdf:
-                            pdf.processing_status = "processing"
-                            db.commit()
-                            self.logger.info(
-                                f"Updated PDF {pdf_id} status to 'processing' "
-                                f"in database"
-                            )
-                    except Exception as e:
-                        self.logger.error(
-                            f"Error updating PDF {pdf_id} status in database: {str(e)}"
-                        )
-                return self.queue[0]
+
+    def purge_finished_jobs(self, batch_size: int = 1000) -> int:
+        """
+        Delete jobs that finished more than finished_job_retention_seconds ago
+
+        Returns:
+            Number of jobs deleted
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention_seconds)
+        deleted = 0
+        while True:
+            with self._session() as db:
+                ids = [
+                    job_id
+                    for (job_id,) in db.query(IngestionJob.id)
+                    .filter(
+                        IngestionJob.status.in_(FINISHED_JOB_STATUSES),
+                        IngestionJob.updated_at < cutoff,
+                    )
+                    .limit(batch_size)
+                ]
+                if ids:
+                    db.query(IngestionJob).filter(IngestionJob.id.in_(ids)).delete(
+                        synchronize_session=False
+                    )
+                    db.commit()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+        if deleted:
+            self.logger.info(f"Deleted {deleted} finished jobs past retention")
+        return deleted
+
+    def _purge_if_due(self) -> None:
+        if time.time() - self.last_purge < self.purge_interval:
+            return
+        self.last_purge = time.time()
+        try:
+            self.purge_finished_jobs()
+        except Exception as e:
+            self.logger.error(f"Failed to purge finished jobs: {str(e)}")
+
+    def get_throughput(self) -> Dict[str, float]:
+        """
+        Measure ingestion speed from the jobs completed within the throughput
+        window (clones of already indexed PDFs excluded)
+
+        Returns:
+            Dict with the seconds a worker spends per page and the number of
+            workers seen processing jobs
+        """
+        since = datetime.utcnow() - timedelta(seconds=self.throughput_window)
+        with self._session() as db:
+            recent = (
+                db.query(
+                    IngestionJob.total_pages,
+                    IngestionJob.claimed_at,
+                    IngestionJob.updated_at,
+                    IngestionJob.worker_id,
+                )
+                .filter(
+                    IngestionJob.status == "completed",
+                    IngestionJob.updated_at >= since,
+                    IngestionJob.source_pdf_id.is_(None),
+                    IngestionJob.total_pages > 0,
+                    IngestionJob.claimed_at.isnot(None),
+                )
+                .order_by(IngestionJob.updated_at.desc())
+                .limit(200)
+                .all()
+            )
+            running_workers = [
+                worker_id
+                for (worker_id,) in db.query(IngestionJob.worker_id)
+                .filter(IngestionJob.status.in_(RUNNING_JOB_STATUSES))
+                .distinct()
+            ]
+
+        pages = sum(row.total_pages for row in recent)
+        busy = sum((row.updated_at - row.claimed_at).total_seconds() for row in recent)
+        workers = {row.worker_id for row in recent} | set(running_workers)
+        workers.discard(None)
+        return {
+            "seconds_per_page": (
+                busy / pages if pages and busy > 0
+                else config.ingestion_config.default_seconds_per_page
+            ),
+            "workers": len(workers) or config.ingestion_config.num_workers,
+        }
+
+    def _backlog(self, db: Session, user_id: int = None) -> Tuple[int, int]:
+        """Count unfinished jobs (re-indexing excluded) and their pages"""
+        query = db.query(
+            func.count(IngestionJob.id),
+            # Clones cost no per-page work
+            func.coalesce(
+                func.sum(
+                    case((IngestionJob.source_pdf_id.is_(None), IngestionJob.total_pages), else_=0)
+                ),
+                0,
+            ),
+        ).filter(
+            IngestionJob.status.in_(ACTIVE_JOB_STATUSES),
+            IngestionJob.kind != "reindex",
+        )
+        if user_id is not None:
+            query = query.filter(IngestionJob.user_id == user_id)
+        jobs, pages = query.one()
+        return jobs, int(pages)
+
+    def estimate_ready_seconds(self, total_pages: int = 0) -> float:
+        """
+        Estimate how long until a newly queued PDF is ready: the pages already
+        in the backlog plus its own, at the measured throughput
+
+        Args:
+            total_pages: Pages of the PDF (0 for a clone of an indexed PDF)
+        """
+        throughput = self.get_throughput()
+        with self._session() as db:
+            _, backlog_pages = self._backlog(db)
+        return round(
+            (backlog_pages + total_pages)
+            * throughput["seconds_per_page"]
+            / throughput["workers"],
+            1,
+        )
+
+    def check_admission(self, user_id: int) -> Optional[int]:
+        """
+        Decide whether another upload from ``user_id`` may be queued.
+
+        Returns:
+            None if it may; otherwise the number of seconds after which the
+            backlog should have drained below the exceeded limit
+        """
+        with self._session() as db:
+            queued = (
+                db.query(func.count(IngestionJob.id))
+                .filter(IngestionJob.status == "queued", IngestionJob.kind != "reindex")
+                .scalar()
+            )
+            if queued >= self.max_queue_depth:
+                excess = queued - self.max_queue_depth + 1
+                jobs, pages = self._backlog(db)
             else:
-                return None
+                jobs, pages = self._backlog(db, user_id)
+                if jobs < self.max_pending_per_user:
+                    return None
+                excess = jobs - self.max_pending_per_user + 1
+
+        throughput = self.get_throughput()
+        pages_per_job = pages / jobs if jobs else 0
+        seconds = (
+            excess * max(pages_per_job, 1) * throughput["seconds_per_page"]
+            / throughput["workers"]
+        )
+        retry_after = min(max(1, math.ceil(seconds)), self.throughput_window)
+        self.logger.warning(
+            f"Rejecting upload from user {user_id}: backlog full, retry after {retry_after}s"
+        )
+        return retry_after
+
+    def requeue_expired_leases(self) -> int:
+        """
+        Return jobs whose worker stopped renewing its lease to the queue.
+        Jobs that have already used up their attempts are failed instead, and
+        jobs that were being cancelled are marked cancelled.
+
+        Returns:
+            Number of jobs that were requeued or failed
+        """
+        now = datetime.utcnow()
+        with self._session() as db:
+            expired = (
+                db.query(IngestionJob)
+                .filter(
+                    IngestionJob.status.in_(RUNNING_JOB_STATUSES),
+                    IngestionJob.lease_expires_at < now,
+                )
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            for job in expired:
+                job.worker_id = None
+                job.lease_expires_at = None
+                if job.status == "cancel_requested":
+                    job.status = "cancelled"
+                    self.logger.info(f"Lease expired for cancelled job {job.id}")
+                    continue
+                # A failed re-index leaves the PDF on its previous, working index
+                touches_pdf = job.kind != "reindex"
+                if job.attempts >= self.max_attempts:
+                    job.status = "failed"
+                    job.error = f"Lease expired after {job.attempts} attempts"
+                    pdf = db.query(PDF).filter(PDF.id == job.pdf_id).first()
+                    if pdf and touches_pdf:
+                        pdf.processing_status = "failed"
+                        pdf.processing_error = job.error
+                    self.logger.error(f"Giving up on job {job.id} for PDF {job.pdf_id}")
+                else:
+                    job.status = "queued"
+                    if touches_pdf:
+                        self._set_pdf_status(db, job.pdf_id, "pending")
+                    self.logger.warning(
+                        f"Lease expired for job {job.id} (PDF {job.pdf_id}), requeued"
+                    )
+            for user_id in {job.user_id for job in expired}:
+                self._refresh_user(db, user_id)
+            db.commit()
+            return len(expired)
 
-    def pop_from_queue(self) -> Dict[str, Any]:
-        """Pop a PDF from the processing queue"""
-        with self.lock:
-            if len(self.queue) == 0:
+    def _pick_candidate(self, db: Session) -> Optional[int]:
+        """
+        Choose the id of the next job to claim: first the user whose turn it
+        is, then that user's most urgent job
+        """
+        for _ in range(3):
+            user_key = (
+                db.query(IngestionUserQueue.user_key)
+                .filter(IngestionUserQueue.top_priority.isnot(None))
+                .order_by(
+                    IngestionUserQueue.top_priority.desc(),
+                    IngestionUserQueue.running / IngestionUserQueue.weight,
+                    # Users never served before go first
+                    IngestionUserQueue.last_served_at.isnot(None),
+                    IngestionUserQueue.last_served_at,
+                    IngestionUserQueue.user_key,
+                )
+                .limit(1)
+                .scalar()
+            )
+            if user_key is None:
                 return None
-            
-            item = self.queue.pop(0)
-            self.total_processed += 1
-            pdf_id = item.get("pdf_id")
-            self.logger.info(f"Total PDFs added: {self.total_added}, Total processed: {self.total_processed}")
-            
-            return item
+
+            user_id = None if user_key == 0 else user_key
+            candidate = (
+                db.query(IngestionJob.id)
+                .filter(IngestionJob.status == "queued", self._jobs_of_user(user_id))
+                .order_by(
+                    IngestionJob.priority.desc(), IngestionJob.sched_key, IngestionJob.id
+                )
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar()
+            )
+            if candidate is not None:
+                return candidate
+            # The row was stale, or the user's jobs are all being claimed
+            self._refresh_user(db, user_id)
+        return None
+
+    def get_next_item(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim the next queued job for ``worker_id``, as chosen by the
+        fair-share scheduler.
+
+        The claim is a conditional UPDATE on the row's status, so two workers
+        racing for the same job cannot both win, even on SQLite where
+        ``SKIP LOCKED`` is unavailable.
+
+        Returns:
+            The claimed job as a dict, or None if the queue is empty
+        """
+        self.requeue_expired_leases()
+        self._purge_if_due()
+
+        with self._session() as db:
+            for _ in range(5):
+                candidate = self._pick_candidate(db)
+                if candidate is None:
+                    # Keeps scheduling rows corrected while picking
+                    db.commit()
+                    return None
+
+                now = datetime.utcnow()
+                claimed = (
+                    db.query(IngestionJob)
+                    .filter(IngestionJob.id == candidate, IngestionJob.status == "queued")
+                    .update(
+                        {
+                            IngestionJob.status: "leased",
+                            IngestionJob.worker_id: worker_id,
+                            IngestionJob.lease_expires_at: now
+                            + timedelta(seconds=self.lease_seconds),
+                            IngestionJob.attempts: IngestionJob.attempts + 1,
+                            IngestionJob.claimed_at: now,
+                            IngestionJob.updated_at: now,
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                if claimed != 1:
+                    # Another worker got there first, try the next job
+                    db.rollback()
+                    continue
+
+                job = db.query(IngestionJob).filter(IngestionJob.id == candidate).one()
+                if job.kind != "reindex":
+                    self._set_pdf_status(db, job.pdf_id, "processing")
+                self._refresh_user(db, job.user_id, served_at=now)
+                db.commit()
+                self.logger.info(
+                    f"Worker {worker_id} claimed job {job.id} for PDF {job.pdf_id}"
+                )
+                return job.to_dict()
+
+        return None
+
+    def boost(self, pdf_id: str) -> bool:
+        """
+        Move a PDF's queued job to the front of its user's queue, e.g. because
+        the user just opened it and is waiting to chat with it
+
+        Returns:
+            True if a queued job was boosted
+        """
+        with self._session() as db:
+            updated = (
+                db.query(IngestionJob)
+                .filter(
+                    IngestionJob.pdf_id == pdf_id,
+                    IngestionJob.status == "queued",
+                    IngestionJob.kind != "reindex",
+                    IngestionJob.priority < PRIORITY_INTERACTIVE,
+                )
+                .update(
+                    {IngestionJob.priority: PRIORITY_INTERACTIVE},
+                    synchronize_session=False,
+                )
+            )
+            if updated:
+                self._refresh_users_of_pdf(db, pdf_id)
+            db.commit()
+            if updated:
+                self.logger.info(f"Boosted queued job of PDF {pdf_id}")
+            return updated > 0
+
+    def extend_lease(self, job_id: int, worker_id: str) -> bool:
+        """
+        Push back the lease deadline of a job the worker is still processing
+        (or still winding down after a cancellation request).
+
+        Returns:
+            False if the worker no longer owns the job
+        """
+        now = datetime.utcnow()
+        with self._session() as db:
+            updated = (
+                db.query(IngestionJob)
+                .filter(
+                    IngestionJob.id == job_id,
+                    IngestionJob.worker_id == worker_id,
+                    IngestionJob.status.in_(RUNNING_JOB_STATUSES),
+                )
+                .update(
+                    {
+                        IngestionJob.lease_expires_at: now
+                        + timedelta(seconds=self.lease_seconds),
+                        IngestionJob.updated_at: now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            return updated == 1
+
+    def _finish(self, job_id: int, worker_id: str, status: str, error: str = None) -> bool:
+        with self._session() as db:
+            values = {
+                IngestionJob.status: status,
+                IngestionJob.error: error,
+                IngestionJob.lease_expires_at: None,
+                IngestionJob.updated_at: datetime.utcnow(),
+            }
+            owned = and_(IngestionJob.id == job_id, IngestionJob.worker_id == worker_id)
+            updated = (
+                db.query(IngestionJob)
+                .filter(owned, IngestionJob.status == "leased")
+                .update(values, synchronize_session=False)
+            )
+            if updated == 0:
+                # A job whose cancellation was requested ends as cancelled,
+                # however the worker finished it
+                values[IngestionJob.status] = "cancelled"
+                updated = (
+                    db.query(IngestionJob)
+                    .filter(owned, IngestionJob.status == "cancel_requested")
+                    .update(values, synchronize_session=False)
+                )
+            if updated:
+                self._refresh_user(
+                    db,
+                    db.query(IngestionJob.user_id).filter(IngestionJob.id == job_id).scalar(),
+                )
+            db.commit()
+            if updated != 1:
+                self.logger.warning(
+                    f"Worker {worker_id} no longer holds job {job_id}, "
+                    f"could not mark it {status}"
+                )
+            return updated == 1
+
+    def complete_job(self, job_id: int, worker_id: str) -> bool:
+        """Mark a leased job as successfully processed"""
+        return self._finish(job_id, worker_id, "completed")
+
+    def fail_job(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Mark a leased job as failed"""
+        return self._finish(job_id, worker_id, "failed", error)
+
+    def acknowledge_cancel(self, job_id: int, worker_id: str) -> bool:
+        """Record that the worker stopped a job after its cancellation was requested"""
+        return self._finish(job_id, worker_id, "cancelled")
+
+    def is_cancel_requested(self, job_id: int) -> bool:
+        """Check whether the job's cancellation was requested"""
+        with self._session() as db:
+            status = (
+                db.query(IngestionJob.status).filter(IngestionJob.id == job_id).scalar()
+            )
+            return status == "cancel_requested"
+
+    def cancel_jobs(self, pdf_id: str, timeout: float = 30.0) -> bool:
+        """
+        Cancel every unfinished job of a PDF. Queued jobs are cancelled at once;
+        running ones are asked to stop, and this waits for their workers to
+        acknowledge.
+
+        Args:
+            pdf_id: PDF whose jobs are cancelled
+            timeout: Seconds to wait for running jobs to stop
+
+        Returns:
+            True if no job of the PDF is running any more
+        """
+        now = datetime.utcnow()
+        with self._session() as db:
+            db.query(IngestionJob).filter(
+                IngestionJob.pdf_id == pdf_id, IngestionJob.status == "queued"
+            ).update(
+                {IngestionJob.status: "cancelled", IngestionJob.updated_at: now},
+                synchronize_session=False,
+            )
+            running = (
+                db.query(IngestionJob)
+                .filter(IngestionJob.pdf_id == pdf_id, IngestionJob.status == "leased")
+                .update(
+                    {IngestionJob.status: "cancel_requested", IngestionJob.updated_at: now},
+                    synchronize_session=False,
+                )
+            )
+            self._refresh_users_of_pdf(db, pdf_id)
+            db.commit()
+        if running:
+            self.logger.info(f"Requested cancellation of {running} running jobs for PDF {pdf_id}")
+
+        deadline = time.time() + timeout
+        while True:
+            with self._session() as db:
+                still_running = (
+                    db.query(func.count(IngestionJob.id))
+                    .filter(
+                        IngestionJob.pdf_id == pdf_id,
+                        IngestionJob.status.in_(RUNNING_JOB_STATUSES),
+                    )
+                    .scalar()
+                )
+            if not still_running:
+                return True
+            if time.time() >= deadline:
+                self.logger.warning(
+                    f"{still_running} jobs for PDF {pdf_id} did not stop within {timeout}s"
+                )
+                return False
+            time.sleep(0.2)
+
+    def enqueue_reindex(self, index_version: str) -> int:
+        """
+        Queue a re-index job for every processed PDF whose index was built
+        under a different index version (or before versioning existed)
+
+        Args:
+            index_version: Index version of the current configuration
+
+        Returns:
+            Number of PDFs queued for re-indexing
+        """
+        with self._session() as db:
+            has_active_job = exists().where(
+                and_(
+                    IngestionJob.pdf_id == PDF.id,
+                    IngestionJob.status.in_(ACTIVE_JOB_STATUSES),
+                )
+            )
+            stale = (
+                db.query(PDF)
+                .filter(
+                    PDF.processing_status == "completed",
+                    PDF.has_embeddings.is_(True),
+                    or_(PDF.index_version.is_(None), PDF.index_version != index_version),
+                    ~has_active_job,
+                )
+                .all()
+            )
+            for pdf in stale:
+                self._new_job(db, pdf, kind="reindex")
+                self.logger.info(
+                    f"Queued re-index of PDF {pdf.id} from version {pdf.index_version} to {index_version}"
+                )
+            db.commit()
+            return len(stale)
+
+    def reconcile(self) -> int:
+        """
+        Re-enqueue PDFs left in 'pending' or 'processing' without a live job,
+        e.g. because they were uploaded before the job table existed or the
+        process crashed between writing the PDF row and the job row.
+
+        Returns:
+            Number of PDFs that were re-enqueued
+        """
+        self.requeue_expired_leases()
+        self.rebuild_user_queues()
+
+        with self._session() as db:
+            has_active_job = exists().where(
+                and_(
+                    IngestionJob.pdf_id == PDF.id,
+                    IngestionJob.status.in_(ACTIVE_JOB_STATUSES),
+                )
+            )
+            orphans = (
+                db.query(PDF)
+                .filter(
+                    PDF.processing_status.in_(("pending", "processing")),
+                    ~has_active_job,
+                )
+                .all()
+            )
+            for pdf in orphans:
+                self._new_job(db, pdf)
+                pdf.processing_status = "pending"
+                self.logger.info(f"Re-enqueued orphaned PDF {pdf.id}")
+            db.commit()
+            return len(orphans)
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .store.base import VectorStore, chunk_point_id
+from .store.writer import BulkVectorWriter
+from .utils.batcher import EmbeddingBatcher
+from .utils.cancel import CancellationToken, IngestionCancelled
+from .utils.chunker import IncrementalChunker, iter_pdf_pages
+from ...config import config
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class StagedIngestion:
+    """
+    Streams a PDF through extract -> chunk -> embed -> upsert stages.
+
+    Every stage runs on its own thread(s) and hands work to the next stage
+    through a bounded queue. Pages are chunked as soon as they are extracted,
+    so all four stages overlap, a slow stage applies backpressure instead of
+    letting work pile up in memory, and the wall-clock time approaches that of
+    the slowest stage rather than the sum of all of them. Memory stays bounded
+    by the queue sizes, whatever the page count.
+    """
+
+    def __init__(
+        self,
+        embedding_batcher: EmbeddingBatcher,
+        vector_db: VectorStore,
+        chunker: Optional[IncrementalChunker] = None,
+        progress_callback: Optional[Callable[[str, int], None]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        resume: bool = False,
+    ):
+        """
+        Args:
+            embedding_batcher: Batcher used to embed chunks (and consult its cache)
+            vector_db: Vector database the embeddings are stored in
+            chunker: Incremental chunker for the page stream (built from the
+                chunk config if omitted)
+            progress_callback: Called with ("chunk", n) when n chunks are created
+                and ("upsert", n) when n chunks are stored or found already stored
+            cancel_token: Checked between pages and batches; once cancelled,
+                every stage stops and run() raises IngestionCancelled
+            resume: Skip chunks whose points an earlier, interrupted run of the
+                same PDF and index version already stored
+        """
+        self.embedding_batcher = embedding_batcher
+        self.vector_db = vector_db
+        self.chunker = chunker or IncrementalChunker()
+        self.progress_callback = progress_callback
+        self.cancel_token = cancel_token or CancellationToken()
+        self.resume = resume
+        self.logger = logging.getLogger(__name__)
+
+        self.batch_size = config.embedding_config.batch_size
+        self.embed_concurrency = max(1, config.embedding_config.embed_concurrency)
+        self.writer: Optional[BulkVectorWriter] = None
+        self.page_queue = queue.Queue(maxsize=config.embedding_config.page_queue_size)
+        self.embed_queue = queue.Queue(maxsize=config.embedding_config.stage_queue_size)
+        self.upsert_queue = queue.Queue(maxsize=config.embedding_config.stage_queue_size)
+
+        self._abort = threading.Event()
+        self._lock = threading.Lock()
+        self.error: Optional[BaseException] = None
+        self.stats = {"pages": 0, "chunks": 0, "stored": 0, "skipped": 0, "cache_hits": 0}
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        """Put an item on a bounded queue, giving up if the run was aborted"""
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        """Take the next item off a queue, or _DONE once the run was aborted"""
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _record(self, stat: str, count: int) -> None:
+        with self._lock:
+            self.stats[stat] += count
+            if self.progress_callback and stat in ("chunks", "stored", "skipped"):
+                self.progress_callback("chunk" if stat == "chunks" else "upsert", count)
+
+    def _start_stage(
+        self,
+        name: str,
+        target: Callable[..., None],
+        workers: int,
+        output: Optional[queue.Queue] = None,
+        consumers: int = 0,
+    ) -> List[threading.Thread]:
+        """
+        Start ``workers`` threads running ``target`` and a closer thread that,
+        once they have all finished, sends one end marker per downstream consumer.
+        """
+
+        def guarded():
+            try:
+                target()
+            except IngestionCancelled as e:
+                with self._lock:
+                    if self.error is None:
+                        self.error = e
+                self._abort.set()
+            except BaseException as e:
+                with self._lock:
+                    if self.error is None:
+                        self.error = e
+                self.logger.error(f"{name} stage failed: {str(e)}")
+                self._abort.set()
+
+        threads = [
+            threading.Thread(target=guarded, name=f"ingest-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+        def close():
+            for thread in threads:
+                thread.join()
+            for _ in range(consumers):
+                self._put(output, _DONE)
+
+        closer = threading.Thread(target=close, name=f"ingest-{name}-closer", daemon=True)
+        for thread in threads:
+            thread.start()
+        closer.start()
+        return threads + [closer]
+
+    def _extract(self, pdf_path: str) -> None:
+        pages = iter_pdf_pages(pdf_path)
+        try:
+            for page_text in pages:
+                self.cancel_token.raise_if_cancelled()
+                if not self._put(self.page_queue, page_text):
+                    return
+                self._record("pages", 1)
+        finally:
+            pages.close()
+
+    def _drop_stored(
+        self, batch: List[Dict[str, Any]], pdf_id: str, index_version: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """Remove the chunks whose points are already in the vector DB"""
+        point_ids = [
+            chunk_point_id(pdf_id, index_version, chunk["chunk_index"]) for chunk in batch
+        ]
+        stored = self.vector_db.existing_point_ids(pdf_id, index_version, point_ids)
+        if stored:
+            self._record("skipped", len(stored))
+        return [chunk for chunk, point_id in zip(batch, point_ids) if point_id not in stored]
+
+    def _emit_batch(
+        self, batch: List[Dict[str, Any]], pdf_id: str, index_version: Optional[str]
+    ) -> bool:
+        self._record("chunks", len(batch))
+        if self.resume:
+            batch = self._drop_stored(batch, pdf_id, index_version)
+            if not batch:
+                return True
+        return self._put(self.embed_queue, batch)
+
+    def _chunk(self, pdf_id: str, index_version: Optional[str]) -> None:
+        batch = []
+        while True:
+            page_text = self._get(self.page_queue)
+            if page_text is _DONE:
+                break
+            self.cancel_token.raise_if_cancelled()
+            batch.extend(self.chunker.add_page(page_text))
+            while len(batch) >= self.batch_size:
+                if not self._emit_batch(batch[:self.batch_size], pdf_id, index_version):
+                    return
+                batch = batch[self.batch_size:]
+        if self._abort.is_set():
+            return
+
+        batch.extend(self.chunker.finish())
+        for i in range(0, len(batch), self.batch_size):
+            if not self._emit_batch(batch[i:i + self.batch_size], pdf_id, index_version):
+                return
+
+    def _embed(self) -> None:
+        asyncio.run(self._embed_async())
+
+    async def _embed_async(self) -> None:
+        """
+        Keep up to ``embed_concurrency`` batches being embedded at once. Queue
+        hand-offs block, so they run in the default executor off the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        in_flight = set()
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, self._get, self.embed_queue)
+                if batch is _DONE:
+                    break
+                self.cancel_token.raise_if_cancelled()
+                in_flight.add(asyncio.create_task(self._embed_one(batch)))
+                if len(in_flight) >= self.embed_concurrency:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        task.result()
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def _embed_one(self, batch: List[Dict[str, Any]]) -> None:
+        chunks, embeddings, cache_hits = await self.embedding_batcher.aembed_batch(batch)
+        self._record("cache_hits", cache_hits)
+        # A PDF missing chunks must not be marked complete or replace a live index
+        if len(chunks) < len(batch):
+            raise RuntimeError(
+                f"Only {len(chunks)} of {len(batch)} chunks in batch were embedded"
+            )
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._put, self.upsert_queue, (chunks, embeddings)
+        )
+
+    def _upsert(self) -> None:
+        # The writer uploads in bulk on its own threads; this only feeds it
+        while True:
+            item = self._get(self.upsert_queue)
+            if item is _DONE:
+                return
+            chunks, embeddings = item
+            self.cancel_token.raise_if_cancelled()
+            self.writer.add(chunks, embeddings)
+
+    def run(
+        self,
+        pdf_path: str,
+        pdf_id: str,
+        on_tick: Optional[Callable[[], None]] = None,
+        index_version: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Ingest a PDF and block until every stage has drained.
+
+        Args:
+            pdf_path: Path of the PDF file
+            pdf_id: PDF identifier stored with each vector
+            on_tick: Called about once a second from the calling thread while
+                the stages run, e.g. to renew the job lease
+            index_version: Index version stored with each vector
+            embedding_model: Embedding model id stored with each vector
+            user_id: Owner of the PDF, stored with each vector
+
+        Returns:
+            Counts of pages extracted, chunks created, chunks stored, chunks
+            skipped because a previous run stored them, and cache hits
+
+        Raises:
+            IngestionCancelled: If the cancel token was set during the run
+            RuntimeError: If any chunk could not be embedded or stored
+            The first exception raised by any stage otherwise
+        """
+        self.writer = BulkVectorWriter(
+            self.vector_db,
+            pdf_id,
+            index_version,
+            embedding_model,
+            on_written=lambda count: self._record("stored", count),
+            user_id=user_id,
+        )
+        threads = []
+        threads += self._start_stage(
+            "extract", lambda: self._extract(pdf_path), 1, self.page_queue, 1
+        )
+        threads += self._start_stage(
+            "chunk", lambda: self._chunk(pdf_id, index_version), 1, self.embed_queue, 1
+        )
+        threads += self._start_stage(
+            "embed", self._embed, 1, self.upsert_queue, 1
+        )
+        threads += self._start_stage("upsert", self._upsert, 1)
+
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1.0)
+                if on_tick:
+                    on_tick()
+
+        if self.error is not None:
+            self.writer.abort()
+            raise self.error
+        # Cancelled after the last check of every stage
+        if self.cancel_token.cancelled:
+            self.writer.abort()
+            self.cancel_token.raise_if_cancelled()
+
+        # Barrier: every chunk is stored before the PDF can be marked complete
+        self.writer.close(expected=self.stats["chunks"])
+
+        self.logger.info(
+            f"Ingested PDF {pdf_id}: {self.stats['pages']} pages, "
+            f"{self.stats['stored']}/{self.stats['chunks']} chunks stored, "
+            f"{self.stats['skipped']} already stored, "
+            f"{self.stats['cache_hits']} cache hits"
+        )
+        return dict(self.stats)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import grpc
+from qdrant_client import AsyncQdrantClient
+
+from .base import VectorStore, format_search_result
+from .embeddings import _search_filter, _search_params
+from ....config import config
+
+
+class AsyncVectorDB:
+    """
+    Async search on the Qdrant collection, for the chat path.
+
+    Built on ``AsyncQdrantClient``, so a search awaits the server instead of
+    blocking the event loop that streams every other chat. If gRPC is
+    preferred but its port cannot be reached, the client switches to REST for
+    good. Only searches: the collection is created and written by the sync
+    ``VectorDB`` of the ingestion pipeline.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        grpc_port: Optional[int] = None,
+        collection_name: Optional[str] = None,
+        prefer_grpc: Optional[bool] = None,
+    ):
+        """
+        Args:
+            host: Qdrant server (default: embedding_config.qdrant_host)
+            port: REST port (default: embedding_config.qdrant_port)
+            grpc_port: gRPC port (default: embedding_config.qdrant_grpc_port)
+            collection_name: Collection to search
+                (default: embedding_config.qdrant_collection_name)
+            prefer_grpc: Use gRPC over REST
+                (default: embedding_config.qdrant_prefer_grpc)
+        """
+        embedding_config = config.embedding_config
+        self.logger = logging.getLogger(__name__)
+        self.host = host or embedding_config.qdrant_host
+        self.port = port or embedding_config.qdrant_port
+        self.grpc_port = grpc_port or embedding_config.qdrant_grpc_port
+        self.prefer_grpc = (
+            embedding_config.qdrant_prefer_grpc if prefer_grpc is None else prefer_grpc
+        )
+        self.client = self._connect()
+        self.collection_name = collection_name or embedding_config.qdrant_collection_name
+
+    def _connect(self) -> AsyncQdrantClient:
+        return AsyncQdrantClient(
+            host=self.host,
+            port=self.port,
+            grpc_port=self.grpc_port,
+            prefer_grpc=self.prefer_grpc,
+        )
+
+    async def _fall_back_to_rest(self, failed: AsyncQdrantClient, error: grpc.aio.AioRpcError) -> None:
+        """Replace a gRPC client whose port is unreachable with a REST one"""
+        if self.client is not failed:
+            return  # Another search already switched
+        self.logger.warning(
+            f"Qdrant gRPC port {self.host}:{self.grpc_port} is unreachable "
+            f"({error.code().name}); searching over REST on port {self.port} instead. "
+            f"Expose the gRPC port or set QDRANT_PREFER_GRPC=false"
+        )
+        self.prefer_grpc = False
+        self.client = self._connect()
+        await failed.close()
+
+    async def _search(
+        self,
+        client: AsyncQdrantClient,
+        pdf_id: str,
+        query_embedding: List[float],
+        top_k: int,
+        page_range: Optional[Tuple[int, Optional[int]]],
+        index_version: Optional[str],
+    ) -> list:
+        return await client.search(
+            collection_name=self.collection_name,
+            query_vector=query_embedding,
+            limit=top_k,
+            query_filter=_search_filter(pdf_id, page_range, index_version),
+            search_params=_search_params(),
+        )
+
+    async def search_embeddings(
+        self,
+        pdf_id: str,
+        query_embedding: List[float],
+        top_k: int = 40,
+        page_range: Optional[Tuple[int, Optional[int]]] = None,
+        index_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Async counterpart of VectorStore.search_embeddings"""
+        try:
+            client, used_grpc = self.client, self.prefer_grpc
+            args = (pdf_id, query_embedding, top_k, page_range, index_version)
+            try:
+                search_results = await self._search(client, *args)
+            except grpc.aio.AioRpcError as e:
+                if not used_grpc or e.code() != grpc.StatusCode.UNAVAILABLE:
+                    raise
+                await self._fall_back_to_rest(client, e)
+                search_results = await self._search(self.client, *args)
+            return {
+                "status": "success",
+                "results": [
+                    format_search_result(result.payload, result.score)
+                    for result in search_results
+                ],
+            }
+
+        except Exception as e:
+            self.logger.error(f"Search error: {str(e)}")
+            return {"status": "error", "message": str(e)}
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class ThreadedVectorDB:
+    """
+    Async search on a sync vector store, run in a worker thread.
+
+    For the backends without an async client: embedded Qdrant, whose
+    directory the sync client of the process already holds, and the local
+    numpy store.
+    """
+
+    def __init__(self, vector_db: VectorStore):
+        self.vector_db = vector_db
+
+    async def search_embeddings(
+        self,
+        pdf_id: str,
+        query_embedding: List[float],
+        top_k: int = 40,
+        page_range: Optional[Tuple[int, Optional[int]]] = None,
+        index_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Async counterpart of VectorStore.search_embeddings"""
+        return await asyncio.to_thread(
+            self.vector_db.search_embeddings,
+            pdf_id,
+            query_embedding,
+            top_k,
+            page_range,
+            index_version,
+        )
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,262 @@
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from qdrant_client.http import models
+
+# Namespace of chunk point ids; changing it orphans every point already stored
+POINT_ID_NAMESPACE = uuid.UUID("6f1d3c9e-5b7a-4f0e-9c2d-8a4b1e7f3d20")
+
+
+def chunk_text(chunk: Union[str, Dict[str, Any]]) -> str:
+    """Return the text of a chunk given either as a string or a chunk dict"""
+    return chunk["text"] if isinstance(chunk, dict) else chunk
+
+
+def chunk_point_id(pdf_id: str, index_version: Optional[str], chunk_index: int) -> str:
+    """
+    Deterministic point id of a chunk, so storing the same chunk again
+    overwrites its point instead of adding a duplicate
+    """
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{pdf_id}:{index_version or ''}:{chunk_index}"))
+
+
+def point_id_for(payload: Dict[str, Any], pdf_id: str, index_version: Optional[str]) -> str:
+    """Point id for a chunk payload; chunks without an ordinal get a random id"""
+    chunk_index = payload.get("chunk_index")
+    if chunk_index is None:
+        return str(uuid.uuid4())
+    return chunk_point_id(pdf_id, index_version, chunk_index)
+
+
+def format_search_result(payload: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """Search result dict returned by every backend for a matching point"""
+    return {
+        "text": payload["text"],
+        "similarity": score,
+        # Chunks stored before page tracking have no page metadata
+        "start_page": payload.get("start_page"),
+        "end_page": payload.get("end_page"),
+        "chunk_index": payload.get("chunk_index"),
+    }
+
+
+class VectorStore(ABC):
+    """
+    Interface of the stores chunk embeddings are kept and searched in.
+
+    Points are Qdrant ``PointStruct``/``Record`` objects whatever the backend:
+    an id, the vector, and a payload holding the chunk text and metadata plus
+    ``pdf_id``, ``index_version``, ``embedding_model`` and ``user_id``. Backends
+    implement the storage primitives; storing, copying and point building
+    are shared.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    @abstractmethod
+    def upsert_points(self, points: List[models.PointStruct], wait: bool = True) -> None:
+        """
+        Write points in one request
+
+        Args:
+            points: Points to insert or overwrite
+            wait: Return only once the write is applied; with False it may
+                return as soon as the write is queued
+        """
+
+    @abstractmethod
+    def count_embeddings(self, pdf_id: str, index_version: Optional[str] = None) -> int:
+        """Exact number of stored points of a PDF, optionally of one index version"""
+
+    @abstractmethod
+    def existing_point_ids(
+        self, pdf_id: str, index_version: Optional[str], point_ids: List[str]
+    ) -> Set[str]:
+        """Return the subset of ``point_ids`` (of one PDF and version) already stored"""
+
+    @abstractmethod
+    def iter_embeddings(
+        self, pdf_id: str, index_version: Optional[str] = None, batch_size: int = 256
+    ) -> Iterator[List[models.Record]]:
+        """
+        Read the stored points of a PDF, vectors included
+
+        Args:
+            pdf_id: PDF whose points are read
+            index_version: Only read points of this index version
+            batch_size: Points per yielded list
+
+        Yields:
+            Lists of up to batch_size records
+        """
+
+    @abstractmethod
+    def delete_embeddings(
+        self, pdf_id: str, index_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Delete embeddings for a specific PDF
+
+        Args:
+            pdf_id: PDF identifier to delete embeddings for
+            index_version: Only delete the points of this index version
+
+        Returns:
+            Dict with operation status
+        """
+
+    @abstractmethod
+    def delete_stale_versions(self, pdf_id: str, index_version: str) -> None:
+        """
+        Delete the points of a PDF that do not belong to ``index_version``,
+        including points stored before versioning existed
+        """
+
+    @abstractmethod
+    def search_embeddings(
+        self,
+        pdf_id: str,
+        query_embedding: List[float],
+        top_k: int = 40,
+        page_range: Optional[Tuple[int, Optional[int]]] = None,
+        index_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Search for similar embeddings
+
+        Args:
+            query_embedding: Query vector to search with
+            pdf_id: Optional PDF ID to filter search results
+            top_k: Number of results to return
+            page_range: Optional (first_page, last_page) window; only chunks
+                overlapping it are returned. A last_page of None leaves the
+                window open-ended
+            index_version: Only search points of this index version, so a
+                re-index in progress does not mix with the live one
+
+        Returns:
+            Dict containing search results with metadata
+        """
+
+    def compact(self, pdf_id: str, index_version: Optional[str] = None) -> None:
+        """
+        Reorganize the stored points of a PDF after a bulk write. Backends
+        that keep no per-write files have nothing to do
+        """
+
+    def ensure_healthy(self) -> None:
+        """
+        Reconnect if the backing service stopped answering. Backends without
+        a connection have nothing to check
+        """
+
+    def store_embeddings(
+        self,
+        chunks: List[Union[str, Dict[str, Any]]],
+        embeddings: List[List[float]],
+        pdf_id: str,
+        index_version: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ):
+        """
+        Store embeddings. Chunk dicts get point ids derived from
+        (pdf_id, index_version, chunk_index), so re-storing a chunk after a
+        retry or crash overwrites its point.
+
+        Args:
+            chunks: List of text chunks, either strings or chunk dicts whose
+                page and offset metadata is stored in the payload
+            embeddings: List of embedding vectors
+            pdf_id: PDF identifier for filtering
+            index_version: Index version the vectors belong to
+            embedding_model: Id of the model that produced the vectors, so they
+                can be reused when only the chunking changes
+            user_id: Owner of the PDF
+        """
+        try:
+            points = self.build_points(
+                chunks, embeddings, pdf_id, index_version, embedding_model, user_id
+            )
+            self.upsert_points(points)
+        except Exception as e:
+            self.logger.error(f"Error storing embeddings for PDF {pdf_id}: {str(e)}")
+            raise
+
+    def build_points(
+        self,
+        chunks: List[Union[str, Dict[str, Any]]],
+        embeddings: List[List[float]],
+        pdf_id: str,
+        index_version: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        user_id: Optional[int] = None,
+    ) -> List[models.PointStruct]:
+        """Build the points store_embeddings would write, without writing them"""
+        points = []
+        for chunk, embedding in zip(chunks, embeddings):
+            payload = dict(chunk) if isinstance(chunk, dict) else {"text": chunk}
+            payload["pdf_id"] = pdf_id
+            if index_version:
+                payload["index_version"] = index_version
+            if embedding_model:
+                payload["embedding_model"] = embedding_model
+            if user_id is not None:
+                payload["user_id"] = user_id
+            points.append(
+                models.PointStruct(
+                    id=point_id_for(payload, pdf_id, index_version),
+                    vector=embedding,
+                    payload=payload,
+                )
+            )
+        return points
+
+    def copy_embeddings(
+        self,
+        source_pdf_id: str,
+        target_pdf_id: str,
+        batch_size: int = 256,
+        index_version: Optional[str] = None,
+        user_id: Optional[int] = None,
+        on_batch: Optional[Callable[[], None]] = None,
+    ) -> int:
+        """
+        Copy every vector of one PDF to another PDF id without re-embedding
+
+        Args:
+            source_pdf_id: PDF whose vectors are copied
+            target_pdf_id: PDF the copies are stored under
+            batch_size: Points read and written per round trip
+            index_version: Only copy points of this index version
+            user_id: Owner of the target PDF, stored in place of the source's
+            on_batch: Called before each batch is copied; may raise to stop
+
+        Returns:
+            Number of points copied
+        """
+        copied = 0
+        owner = {"user_id": user_id} if user_id is not None else {}
+        for records in self.iter_embeddings(source_pdf_id, index_version, batch_size):
+            if on_batch:
+                on_batch()
+            points = [
+                models.PointStruct(
+                    id=point_id_for(
+                        record.payload, target_pdf_id, record.payload.get("index_version")
+                    ),
+                    vector=record.vector,
+                    payload={**record.payload, "pdf_id": target_pdf_id, **owner},
+                )
+                for record in records
+            ]
+            self.upsert_points(points)
+            copied += len(points)
+
+        self.logger.info(
+            f"Copied {copied} embeddings from PDF {source_pdf_id} to {target_pdf_id}"
+        )
+        return copied
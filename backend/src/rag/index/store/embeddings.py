@@ -1,21 +1,194 @@
-import logging
-from typing import List, Dict, Any
+import os
+import threading
+import time
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple, Union
+import httpx
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
+from .base import VectorStore, format_search_result
 from ....config import config
-import uuid
 
+# Payload fields every search, scroll and delete filters on, plus the chunk
+# metadata written by the chunker. Without an index Qdrant checks the payload
+# of every candidate point during filtered search
+CHUNK_PAYLOAD_INDEXES = {
+    "pdf_id": models.PayloadSchemaType.KEYWORD,
+    "user_id": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=True, range=False
+    ),
+    "index_version": models.PayloadSchemaType.KEYWORD,
+    # Only ever matched by page window
+    "start_page": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=False, range=True
+    ),
+    "end_page": models.IntegerIndexParams(
+        type=models.IntegerIndexType.INTEGER, lookup=False, range=True
+    ),
+    "chunk_index": models.PayloadSchemaType.INTEGER,
+}
 
-class VectorDB:
-    def __init__(self):
-        self.client = QdrantClient(
-            host=config.embedding_config.qdrant_host,
-            port=config.embedding_config.qdrant_port,
+# Embedded Qdrant locks its directory, so every VectorDB of a process opened
+# on the same path shares one client
+_embedded_clients: Dict[str, QdrantClient] = {}
+_embedded_clients_lock = threading.Lock()
+
+# Collections whose payload indexes were already checked by this process
+_indexed_collections = set()
+_indexed_collections_lock = threading.Lock()
+
+
+def _embedded_client(path: str) -> QdrantClient:
+    """The process-wide client of the embedded Qdrant stored at ``path``"""
+    path = os.path.abspath(path)
+    with _embedded_clients_lock:
+        if path not in _embedded_clients:
+            _embedded_clients[path] = QdrantClient(path=path)
+        return _embedded_clients[path]
+
+
+def _pdf_filter(pdf_id: str, index_version: Optional[str] = None) -> models.Filter:
+    """Filter matching the points of a PDF, optionally of one index version only"""
+    conditions = [
+        models.FieldCondition(key="pdf_id", match=models.MatchValue(value=pdf_id))
+    ]
+    if index_version:
+        conditions.append(
+            models.FieldCondition(
+                key="index_version", match=models.MatchValue(value=index_version)
+            )
+        )
+    return models.Filter(must=conditions)
+
+
+def _search_filter(
+    pdf_id: Optional[str],
+    page_range: Optional[Tuple[int, Optional[int]]] = None,
+    index_version: Optional[str] = None,
+) -> Optional[models.Filter]:
+    """Filter of a search: PDF, index version and page window, each optional"""
+    conditions = []
+    if pdf_id:
+        conditions.append(
+            models.FieldCondition(key="pdf_id", match=models.MatchValue(value=pdf_id))
+        )
+    if index_version:
+        conditions.append(
+            models.FieldCondition(
+                key="index_version", match=models.MatchValue(value=index_version)
+            )
         )
-        self.logger = logging.getLogger(__name__)
-        self.collection_name = config.embedding_config.qdrant_collection_name
+    if page_range:
+        first_page, last_page = page_range
+        if last_page is not None:
+            conditions.append(
+                models.FieldCondition(key="start_page", range=models.Range(lte=last_page))
+            )
+        conditions.append(
+            models.FieldCondition(key="end_page", range=models.Range(gte=first_page))
+        )
+    return models.Filter(must=conditions) if conditions else None
+
+
+def _search_params() -> Optional[models.SearchParams]:
+    """Search-time HNSW beam width and quantization rescoring"""
+    embedding_config = config.embedding_config
+    quantization = None
+    if embedding_config.qdrant_quantization in ("scalar", "binary"):
+        quantization = models.QuantizationSearchParams(
+            rescore=embedding_config.qdrant_rescore,
+            oversampling=embedding_config.qdrant_oversampling,
+        )
+    if quantization is None and embedding_config.qdrant_hnsw_ef is None:
+        return None
+    return models.SearchParams(
+        hnsw_ef=embedding_config.qdrant_hnsw_ef, quantization=quantization
+    )
+
+
+class VectorDB(VectorStore):
+    """Vector store on a Qdrant collection shared by every PDF"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        collection_name: Optional[str] = None,
+    ):
+        """
+        Connects to the configured Qdrant server, or opens embedded Qdrant if
+        embedding_config.qdrant_path is set.
+
+        Args:
+            path: Open embedded Qdrant stored in this directory (":memory:"
+                for a throwaway in-process instance) instead
+            host: Connect to this server instead
+            port: Port of ``host`` (default: embedding_config.qdrant_port)
+            collection_name: Collection to use
+                (default: embedding_config.qdrant_collection_name)
+        """
+        super().__init__()
+        embedding_config = config.embedding_config
+        if path is None and host is None:
+            path = embedding_config.qdrant_path or None
+        self.host = host or embedding_config.qdrant_host
+        self.port = port or embedding_config.qdrant_port
+        if path == ":memory:":
+            self.client = QdrantClient(location=":memory:")
+        elif path:
+            self.client = _embedded_client(path)
+        else:
+            self.client = self._connect()
+        # Embedded Qdrant searches exactly and has no payload indexes,
+        # quantization or HNSW settings
+        self.embedded = bool(path)
+        self.collection_name = collection_name or embedding_config.qdrant_collection_name
+        self._health_lock = threading.Lock()
+        self._health_checked_at = time.monotonic()
         self._ensure_collection_exists()
 
+    def _connect(self) -> QdrantClient:
+        """Client of the Qdrant server with a pool of reusable connections"""
+        pool_size = config.embedding_config.qdrant_pool_size
+        return QdrantClient(
+            host=self.host,
+            port=self.port,
+            # The client disables keep-alive for localhost unless limits are given
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+        )
+
+    def ensure_healthy(self) -> None:
+        """
+        Reopen the connection if Qdrant stopped answering, and recreate the
+        collection if it is gone, checking at most every
+        qdrant_health_check_seconds
+        """
+        if self.embedded:
+            return
+        with self._health_lock:
+            now = time.monotonic()
+            if now - self._health_checked_at < config.embedding_config.qdrant_health_check_seconds:
+                return
+            self._health_checked_at = now
+            try:
+                if self.client.collection_exists(self.collection_name):
+                    return
+                self.logger.warning(f"Collection {self.collection_name} is gone, recreating it")
+            except Exception as e:
+                self.logger.warning(f"Qdrant health check failed, reconnecting: {str(e)}")
+
+            try:
+                # Requests still running on the old client finish or fail on their own
+                self.client = self._connect()
+                with _indexed_collections_lock:
+                    _indexed_collections.discard(self.collection_name)
+                self._ensure_collection_exists()
+                self.logger.info(f"Reconnected to Qdrant at {self.host}:{self.port}")
+            except Exception as e:
+                self.logger.error(f"Reconnecting to Qdrant failed: {str(e)}")
+
     def _ensure_collection_exists(self):
         """Ensure the collection exists, create it if it doesn't"""
         collections = self.client.get_collections().collections
@@ -28,67 +201,185 @@ class VectorDB:
                 vectors_config=models.VectorParams(
                     size=config.embedding_config.vector_size,  # Adjust based on your embedding model
                     distance=models.Distance.COSINE,
+                    on_disk=config.embedding_config.qdrant_vectors_on_disk,
                 ),
+                hnsw_config=self._hnsw_config(),
+                quantization_config=self._quantization_config(),
             )
             self.logger.info(f"Created collection: {self.collection_name}")
 
-    def store_embeddings(
-        self, chunks: List[str], embeddings: List[List[float]], pdf_id: str
-    ):
-        """
-        Store embeddings in Qdrant
+        self._ensure_payload_indexes()
 
-        Args:
-            chunks: List of text chunks
-            embeddings: List of embedding vectors
-            pdf_id: PDF identifier for filtering
+    def _hnsw_config(self) -> models.HnswConfigDiff:
         """
-        try:
-            # Prepare points for batch upload
-            points = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                # Generate a unique ID for the point
-                point_id = str(uuid.uuid4())
-                points.append(
-                    models.PointStruct(
-                        id=point_id,
-                        vector=embedding,
-                        payload={"text": chunk, "pdf_id": pdf_id},
-                    )
+        HNSW settings from the config. The tenant layout builds one graph per
+        PDF and no global graph
+        """
+        embedding_config = config.embedding_config
+        if embedding_config.qdrant_tenant_layout:
+            m, payload_m = 0, embedding_config.qdrant_payload_m
+        else:
+            m, payload_m = embedding_config.qdrant_hnsw_m, None
+        return models.HnswConfigDiff(
+            m=m,
+            payload_m=payload_m,
+            ef_construct=embedding_config.qdrant_hnsw_ef_construct,
+            on_disk=embedding_config.qdrant_hnsw_on_disk,
+        )
+
+    def _quantization_config(
+        self,
+    ) -> Optional[Union[models.ScalarQuantization, models.BinaryQuantization]]:
+        """Quantization settings from the config, or None to keep full vectors only"""
+        embedding_config = config.embedding_config
+        mode = embedding_config.qdrant_quantization
+        if mode == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=embedding_config.qdrant_scalar_quantile,
+                    always_ram=embedding_config.qdrant_quantization_always_ram,
                 )
+            )
+        if mode == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(
+                    always_ram=embedding_config.qdrant_quantization_always_ram,
+                )
+            )
+        if mode != "none":
+            self.logger.warning(f"Unknown quantization mode {mode!r}, storing full vectors only")
+        return None
 
-            # Upload points in batch
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points,
+    def _payload_indexes(self) -> Dict[str, Any]:
+        """Index schema per payload field for the configured layout"""
+        indexes = dict(CHUNK_PAYLOAD_INDEXES)
+        if config.embedding_config.qdrant_tenant_layout:
+            indexes["pdf_id"] = models.KeywordIndexParams(
+                type=models.KeywordIndexType.KEYWORD, is_tenant=True
             )
-        except Exception as e:
-            self.logger.error(f"Error storing embeddings for PDF {pdf_id}: {str(e)}")
-            raise
+        return indexes
 
-    def delete_embeddings(self, pdf_id: str) -> Dict[str, Any]:
+    def _ensure_payload_indexes(self):
+        """
+        Create any missing payload indexes and bring the storage settings of an
+        existing collection in line with the config, once per collection per
+        process
         """
-        Delete embeddings for a specific PDF
+        if self.embedded:
+            return
+        with _indexed_collections_lock:
+            if self.collection_name in _indexed_collections:
+                return
+            info = self.client.get_collection(self.collection_name)
+            for field_name, field_schema in self._payload_indexes().items():
+                if field_name not in info.payload_schema:
+                    self.client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field_name,
+                        field_schema=field_schema,
+                    )
+                    self.logger.info(f"Created payload index on {field_name}")
 
-        Args:
-            pdf_id: PDF identifier to delete embeddings for
+            if config.embedding_config.qdrant_tenant_layout:
+                pdf_index = info.payload_schema.get("pdf_id")
+                if pdf_index and not getattr(pdf_index.params, "is_tenant", False):
+                    self.logger.warning(
+                        "pdf_id payload index predates the tenant layout; recreate it "
+                        "to store the points of each PDF together"
+                    )
+            self._sync_collection_config(info.config)
+            _indexed_collections.add(self.collection_name)
+
+    def _sync_collection_config(self, current: models.CollectionConfig) -> None:
+        """
+        Update the HNSW, quantization and on-disk settings of the collection
+        where they differ from the config. Qdrant rebuilds the affected
+        segments in the background
+        """
+        changes = {}
+        hnsw_config = self._hnsw_config()
+        current_hnsw = current.hnsw_config
+        if (
+            current_hnsw.m != hnsw_config.m
+            or current_hnsw.ef_construct != hnsw_config.ef_construct
+            or bool(current_hnsw.on_disk) != hnsw_config.on_disk
+            or (hnsw_config.payload_m is not None and current_hnsw.payload_m != hnsw_config.payload_m)
+        ):
+            changes["hnsw_config"] = hnsw_config
+
+        quantization_config = self._quantization_config()
+        if current.quantization_config != quantization_config:
+            changes["quantization_config"] = quantization_config or models.Disabled.DISABLED
 
-        Returns:
-            Dict with operation status
+        vectors = current.params.vectors
+        on_disk = config.embedding_config.qdrant_vectors_on_disk
+        if isinstance(vectors, models.VectorParams) and bool(vectors.on_disk) != on_disk:
+            # The unnamed default vector is addressed by the empty name
+            changes["vectors_config"] = {"": models.VectorParamsDiff(on_disk=on_disk)}
+
+        if changes:
+            self.client.update_collection(collection_name=self.collection_name, **changes)
+            self.logger.info(
+                f"Updated {', '.join(changes)} of collection {self.collection_name}"
+            )
+
+    def upsert_points(self, points: List[models.PointStruct], wait: bool = True) -> None:
         """
+        Write points in one request; with wait=False Qdrant acknowledges the
+        write as soon as it is queued on the server
+        """
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+
+    def count_embeddings(self, pdf_id: str, index_version: Optional[str] = None) -> int:
+        return self.client.count(
+            collection_name=self.collection_name,
+            count_filter=_pdf_filter(pdf_id, index_version),
+            exact=True,
+        ).count
+
+    def iter_embeddings(
+        self, pdf_id: str, index_version: Optional[str] = None, batch_size: int = 256
+    ) -> Iterator[List[models.Record]]:
+        """Scroll through the stored points of a PDF, batch_size per round trip"""
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=_pdf_filter(pdf_id, index_version),
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if records:
+                yield records
+            if offset is None:
+                break
+
+    def existing_point_ids(
+        self, pdf_id: str, index_version: Optional[str], point_ids: List[str]
+    ) -> Set[str]:
+        # Chunk point ids already encode the PDF and index version
+        if not point_ids:
+            return set()
+        records = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=point_ids,
+            with_payload=False,
+            with_vectors=False,
+        )
+        return {str(record.id) for record in records}
+
+    def delete_embeddings(
+        self, pdf_id: str, index_version: Optional[str] = None
+    ) -> Dict[str, Any]:
         try:
-            # Delete all entries with matching pdf_id
+            # Delete all entries with matching pdf_id (and version)
             self.client.delete(
                 collection_name=self.collection_name,
                 points_selector=models.FilterSelector(
-                    filter=models.Filter(
-                        must=[
-                            models.FieldCondition(
-                                key="pdf_id",
-                                match=models.MatchValue(value=pdf_id),
-                            )
-                        ]
-                    )
+                    filter=_pdf_filter(pdf_id, index_version)
                 ),
             )
 
@@ -102,56 +393,52 @@ class VectorDB:
             self.logger.error(f"Error deleting embeddings for PDF {pdf_id}: {str(e)}")
             return {"status": "error", "message": str(e)}
 
-    def search_embeddings(
-        self, pdf_id: str, query_embedding: List[float], top_k: int = 40
-    ) -> Dict[str, Any]:
-        """
-        Search for similar embeddings
-
-        Args:
-            query_embedding: Query vector to search with
-            pdf_id: Optional PDF ID to filter search results
-            top_k: Number of results to return
-
-        Returns:
-            Dict containing search results with metadata
-        """
-        try:
-            # Prepare filter if pdf_id is provided
-            filter_condition = None
-            if pdf_id:
-                filter_condition = models.Filter(
+    def delete_stale_versions(self, pdf_id: str, index_version: str) -> None:
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(
                     must=[
                         models.FieldCondition(
-                            key="pdf_id",
-                            match=models.MatchValue(value=pdf_id),
+                            key="pdf_id", match=models.MatchValue(value=pdf_id)
+                        )
+                    ],
+                    must_not=[
+                        models.FieldCondition(
+                            key="index_version",
+                            match=models.MatchValue(value=index_version),
                         )
-                    ]
+                    ],
                 )
+            ),
+        )
+        self.logger.info(f"Deleted embeddings of PDF {pdf_id} outside index version {index_version}")
 
+    def search_embeddings(
+        self,
+        pdf_id: str,
+        query_embedding: List[float],
+        top_k: int = 40,
+        page_range: Optional[Tuple[int, Optional[int]]] = None,
+        index_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        try:
             # Perform search
             search_results = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embedding,
                 limit=top_k,
-                query_filter=filter_condition,
+                query_filter=_search_filter(pdf_id, page_range, index_version),
+                search_params=_search_params(),
             )
 
             # Format results
-            formatted_results = []
-            for result in search_results:
-                formatted_results.append(
-                    {
-                        "text": result.payload["text"],
-                        "similarity": result.score,
-                    }
-                )
+            formatted_results = [
+                format_search_result(result.payload, result.score)
+                for result in search_results
+            ]
             return {"status": "success", "results": formatted_results}
 
         except Exception as e:
             self.logger.error(f"Search error: {str(e)}")
             return {"status": "error", "message": str(e)}
-
-
-def get_vector_db() -> VectorDB:
-    return VectorDB()
\ No newline at end of file
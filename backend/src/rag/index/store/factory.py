@@ -0,0 +1,68 @@
+import threading
+from typing import TYPE_CHECKING, Union
+
+from .base import VectorStore
+from ....config import config
+
+if TYPE_CHECKING:
+    from .async_embeddings import AsyncVectorDB, ThreadedVectorDB
+
+# Stores shared by everything in the process, created on first use
+_vector_db = None
+_vector_db_lock = threading.Lock()
+_async_vector_db = None
+
+
+def get_vector_db() -> VectorStore:
+    """
+    The process-wide vector store of the configured backend. It is created,
+    and its collection checked, on the first call; later calls return it
+    after a health check that runs at most every qdrant_health_check_seconds
+    """
+    global _vector_db
+    with _vector_db_lock:
+        if _vector_db is None:
+            _vector_db = create_vector_db()
+            return _vector_db
+    _vector_db.ensure_healthy()
+    return _vector_db
+
+
+def create_vector_db() -> VectorStore:
+    """Create a new store of the backend selected by ``embedding_config.vector_backend``"""
+    backend = config.embedding_config.vector_backend
+    if backend == "local":
+        from .local import LocalVectorDB
+
+        return LocalVectorDB()
+    if backend == "qdrant":
+        from .embeddings import VectorDB
+
+        return VectorDB()
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+def get_async_vector_db() -> Union["AsyncVectorDB", "ThreadedVectorDB"]:
+    """
+    The process-wide async store of the configured backend, for the chat path.
+    A Qdrant server is searched through AsyncQdrantClient; embedded Qdrant
+    and the local store are searched in a worker thread.
+    """
+    global _async_vector_db
+    if _async_vector_db is None:
+        from .async_embeddings import AsyncVectorDB, ThreadedVectorDB
+
+        embedding_config = config.embedding_config
+        if embedding_config.vector_backend == "qdrant" and not embedding_config.qdrant_path:
+            _async_vector_db = AsyncVectorDB()
+        else:
+            _async_vector_db = ThreadedVectorDB(get_vector_db())
+    return _async_vector_db
+
+
+async def close_async_vector_db() -> None:
+    """Close the connections of the async store, if one was created"""
+    global _async_vector_db
+    vector_db, _async_vector_db = _async_vector_db, None
+    if vector_db is not None:
+        await vector_db.close()
@@ -0,0 +1,412 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+import numpy as np
+from qdrant_client.http import models
+
+from .base import VectorStore, format_search_result
+from ....config import config
+
+# Segment name of points stored without an index version
+_UNVERSIONED = "_unversioned"
+
+
+class _Part:
+    """One immutable file pair of a segment: point ids and payloads, and their vectors"""
+
+    def __init__(self, ids: List[str], payloads: List[Dict[str, Any]], vectors: np.ndarray):
+        self.ids = ids
+        self.payloads = payloads
+        self.vectors = vectors
+
+
+class _Segment:
+    """The points of one PDF and index version, merged from its parts"""
+
+    def __init__(self, parts: List[_Part]):
+        ids: List[str] = []
+        payloads: List[Dict[str, Any]] = []
+        positions: Dict[str, int] = {}
+        rows: List[int] = []
+        offset = 0
+        # Later parts were written later, so their points replace earlier ones
+        for part in parts:
+            for row, (point_id, payload) in enumerate(zip(part.ids, part.payloads)):
+                position = positions.get(point_id)
+                if position is None:
+                    positions[point_id] = len(ids)
+                    ids.append(point_id)
+                    payloads.append(payload)
+                    rows.append(offset + row)
+                else:
+                    payloads[position] = payload
+                    rows[position] = offset + row
+            offset += len(part.ids)
+
+        non_empty = [part.vectors for part in parts if len(part.ids)]
+        if len(non_empty) == 1 and len(ids) == offset:
+            vectors = non_empty[0]
+        elif non_empty:
+            vectors = np.concatenate(non_empty)
+            if len(ids) < offset:
+                vectors = vectors[np.array(rows)]
+        else:
+            vectors = np.zeros((0, 0), dtype=np.float32)
+
+        self.part_count = len(parts)
+        self.ids = ids
+        self.payloads = payloads
+        self.vectors = vectors
+        self.positions = positions
+        # NaN for chunks without page metadata, so page windows never match them
+        self.start_pages = np.array(
+            [payload.get("start_page", np.nan) for payload in payloads], dtype=np.float64
+        )
+        self.end_pages = np.array(
+            [payload.get("end_page", np.nan) for payload in payloads], dtype=np.float64
+        )
+
+
+class LocalVectorDB(VectorStore):
+    """
+    Vector store in local files, searched exactly with numpy.
+
+    Each PDF gets a directory with, per index version, a manifest listing the
+    segment's parts. A part is a float32 ``.npy`` matrix of L2-normalized
+    vectors plus a JSON file with their point ids and payloads, and is never
+    changed once written: upserts append a part, so a flush costs as much as
+    the points it writes, and later parts override earlier points on read.
+    ``compact`` (called by the bulk writer's ``close``) merges the parts into
+    one. Searches memory-map the matrix and score every chunk with one
+    matrix-vector product, which for documents of a few thousand chunks takes
+    well under a millisecond and needs no external service.
+
+    The manifest is replaced atomically, and changes to a PDF's files hold an
+    exclusive ``flock`` on its lock file, so processes sharing the directory
+    neither lose each other's parts nor read a half-compacted segment.
+    """
+
+    # Parts a segment may grow to before a write compacts it
+    max_parts = 64
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Root directory of the vector files
+                (default: embedding_config.local_vector_path)
+        """
+        super().__init__()
+        self.path = path or config.embedding_config.local_vector_path
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        # (pdf_id, segment name) -> (manifest file identity, segment)
+        self._segments: Dict[Tuple[str, str], Tuple[Tuple[int, int, int], _Segment]] = {}
+        # (pdf_id, part file name) -> part; parts never change once written
+        self._parts: Dict[Tuple[str, str], _Part] = {}
+
+    def _pdf_dir(self, pdf_id: str) -> str:
+        return os.path.join(self.path, pdf_id)
+
+    def _manifest_path(self, pdf_id: str, name: str) -> str:
+        return os.path.join(self._pdf_dir(pdf_id), f"{name}.json")
+
+    @contextmanager
+    def _file_lock(self, pdf_id: str, exclusive: bool = True) -> Iterator[None]:
+        """Lock a PDF's files against other processes (no-op without fcntl)"""
+        pdf_dir = self._pdf_dir(pdf_id)
+        if fcntl is None or (not exclusive and not os.path.isdir(pdf_dir)):
+            yield
+            return
+        os.makedirs(pdf_dir, exist_ok=True)
+        with open(os.path.join(pdf_dir, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _segment_names(self, pdf_id: str, index_version: Optional[str] = None) -> List[str]:
+        """Segments of a PDF, or only the one of ``index_version``"""
+        if index_version:
+            return [index_version]
+        try:
+            files = os.listdir(self._pdf_dir(pdf_id))
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name[:-5] for name in files if name.endswith(".json") and not name.endswith(".ids.json")
+        )
+
+    def _manifest_identity(self, pdf_id: str, name: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._manifest_path(pdf_id, name))
+        except FileNotFoundError:
+            return None
+        # Every write replaces the manifest with a new file
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read_manifest(self, pdf_id: str, name: str) -> List[str]:
+        """Part file stems of a segment, oldest first"""
+        with open(self._manifest_path(pdf_id, name)) as f:
+            return json.load(f)["parts"]
+
+    def _load_part(self, pdf_id: str, stem: str) -> _Part:
+        part = self._parts.get((pdf_id, stem))
+        if part is None:
+            pdf_dir = self._pdf_dir(pdf_id)
+            with open(os.path.join(pdf_dir, f"{stem}.ids.json")) as f:
+                sidecar = json.load(f)
+            vectors = np.load(os.path.join(pdf_dir, f"{stem}.npy"), mmap_mode="r")
+            part = _Part(sidecar["ids"], sidecar["payloads"], vectors)
+            self._parts[(pdf_id, stem)] = part
+        return part
+
+    def _load(self, pdf_id: str, name: str, locked: bool = False) -> Optional[_Segment]:
+        """Segment as last written, reloaded only when its manifest changed"""
+        identity = self._manifest_identity(pdf_id, name)
+        if identity is None:
+            self._segments.pop((pdf_id, name), None)
+            return None
+        cached = self._segments.get((pdf_id, name))
+        if cached and cached[0] == identity:
+            return cached[1]
+
+        # A compaction in another process deletes the parts it merged, so
+        # read the manifest and its parts under a shared lock
+        with nullcontext() if locked else self._file_lock(pdf_id, exclusive=False):
+            identity = self._manifest_identity(pdf_id, name)
+            if identity is None:
+                self._segments.pop((pdf_id, name), None)
+                return None
+            stems = self._read_manifest(pdf_id, name)
+            segment = _Segment([self._load_part(pdf_id, stem) for stem in stems])
+        self._segments[(pdf_id, name)] = (identity, segment)
+        self._forget_parts(pdf_id, name, keep=set(stems))
+        return segment
+
+    def _load_all(self, pdf_id: str, index_version: Optional[str] = None) -> List[_Segment]:
+        with self._lock:
+            segments = [
+                self._load(pdf_id, name) for name in self._segment_names(pdf_id, index_version)
+            ]
+        return [segment for segment in segments if segment is not None]
+
+    def _forget_parts(self, pdf_id: str, name: str, keep: Set[str] = frozenset()) -> None:
+        prefix = f"{name}."
+        for key in [
+            key for key in self._parts
+            if key[0] == pdf_id and key[1].startswith(prefix) and key[1] not in keep
+        ]:
+            del self._parts[key]
+
+    def _write_part(
+        self,
+        pdf_id: str,
+        name: str,
+        ids: List[str],
+        payloads: List[Dict[str, Any]],
+        vectors: np.ndarray,
+    ) -> str:
+        """Write a new part file pair and return its stem"""
+        pdf_dir = self._pdf_dir(pdf_id)
+        os.makedirs(pdf_dir, exist_ok=True)
+        stem = f"{name}.{uuid.uuid4().hex[:12]}"
+        np.save(
+            os.path.join(pdf_dir, f"{stem}.npy"),
+            np.ascontiguousarray(vectors, dtype=np.float32),
+        )
+        with open(os.path.join(pdf_dir, f"{stem}.ids.json"), "w") as f:
+            json.dump({"ids": ids, "payloads": payloads}, f)
+        return stem
+
+    def _write_manifest(self, pdf_id: str, name: str, stems: List[str]) -> None:
+        manifest_path = self._manifest_path(pdf_id, name)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"parts": stems}, f)
+        os.replace(tmp_path, manifest_path)
+
+    def _part_files(self, pdf_id: str, name: str) -> List[str]:
+        return [
+            file_name
+            for file_name in os.listdir(self._pdf_dir(pdf_id))
+            if file_name.startswith(f"{name}.")
+            and (file_name.endswith(".npy") or file_name.endswith(".ids.json"))
+        ]
+
+    def _remove_parts_except(self, pdf_id: str, name: str, keep: Set[str]) -> None:
+        # Open memory maps of removed files stay valid after unlinking
+        pdf_dir = self._pdf_dir(pdf_id)
+        for file_name in self._part_files(pdf_id, name):
+            stem = file_name[:-4] if file_name.endswith(".npy") else file_name[:-9]
+            if stem not in keep:
+                os.remove(os.path.join(pdf_dir, file_name))
+
+    def _remove(self, pdf_id: str, name: str) -> None:
+        manifest_path = self._manifest_path(pdf_id, name)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        self._remove_parts_except(pdf_id, name, keep=set())
+        self._segments.pop((pdf_id, name), None)
+        self._forget_parts(pdf_id, name)
+
+    def _compact(self, pdf_id: str, name: str) -> None:
+        """Rewrite a segment as a single part; the caller holds both locks"""
+        segment = self._load(pdf_id, name, locked=True)
+        if segment is None or segment.part_count <= 1:
+            return
+        stem = self._write_part(pdf_id, name, segment.ids, segment.payloads, segment.vectors)
+        self._write_manifest(pdf_id, name, [stem])
+        self._remove_parts_except(pdf_id, name, keep={stem})
+        self.logger.info(
+            f"Compacted {segment.part_count} parts of PDF {pdf_id} ({name}) into one"
+        )
+
+    def upsert_points(self, points: List[models.PointStruct], wait: bool = True) -> None:
+        # Writes are synchronous, so wait makes no difference
+        groups: Dict[Tuple[str, str], List[models.PointStruct]] = {}
+        for point in points:
+            key = (point.payload["pdf_id"], point.payload.get("index_version") or _UNVERSIONED)
+            groups.setdefault(key, []).append(point)
+
+        with self._lock:
+            for (pdf_id, name), group in groups.items():
+                # The last write of a point within one call wins
+                latest = {str(point.id): point for point in group}
+                vectors = np.array([point.vector for point in latest.values()], dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors /= np.where(norms > 0, norms, 1.0)
+                ids = list(latest)
+                payloads = [point.payload for point in latest.values()]
+
+                with self._file_lock(pdf_id):
+                    stem = self._write_part(pdf_id, name, ids, payloads, vectors)
+                    identity = self._manifest_identity(pdf_id, name)
+                    stems = self._read_manifest(pdf_id, name) if identity else []
+                    self._write_manifest(pdf_id, name, stems + [stem])
+                    if len(stems) + 1 > self.max_parts:
+                        self._compact(pdf_id, name)
+
+    def compact(self, pdf_id: str, index_version: Optional[str] = None) -> None:
+        with self._lock:
+            for name in self._segment_names(pdf_id, index_version):
+                with self._file_lock(pdf_id):
+                    self._compact(pdf_id, name)
+
+    def count_embeddings(self, pdf_id: str, index_version: Optional[str] = None) -> int:
+        return sum(len(segment.ids) for segment in self._load_all(pdf_id, index_version))
+
+    def existing_point_ids(
+        self, pdf_id: str, index_version: Optional[str], point_ids: List[str]
+    ) -> Set[str]:
+        with self._lock:
+            segment = self._load(pdf_id, index_version or _UNVERSIONED)
+        if segment is None:
+            return set()
+        return {point_id for point_id in point_ids if point_id in segment.positions}
+
+    def iter_embeddings(
+        self, pdf_id: str, index_version: Optional[str] = None, batch_size: int = 256
+    ) -> Iterator[List[models.Record]]:
+        for segment in self._load_all(pdf_id, index_version):
+            for start in range(0, len(segment.ids), batch_size):
+                end = start + batch_size
+                yield [
+                    models.Record(id=point_id, payload=payload, vector=vector.tolist())
+                    for point_id, payload, vector in zip(
+                        segment.ids[start:end],
+                        segment.payloads[start:end],
+                        segment.vectors[start:end],
+                    )
+                ]
+
+    def delete_embeddings(
+        self, pdf_id: str, index_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        try:
+            with self._lock:
+                if index_version:
+                    if os.path.isdir(self._pdf_dir(pdf_id)):
+                        with self._file_lock(pdf_id):
+                            self._remove(pdf_id, index_version)
+                else:
+                    if os.path.isdir(self._pdf_dir(pdf_id)):
+                        with self._file_lock(pdf_id):
+                            shutil.rmtree(self._pdf_dir(pdf_id), ignore_errors=True)
+                    for cache in (self._segments, self._parts):
+                        for key in [key for key in cache if key[0] == pdf_id]:
+                            del cache[key]
+            self.logger.info(f"Successfully deleted embeddings for PDF {pdf_id}")
+            return {
+                "status": "success",
+                "message": f"Deleted embeddings for PDF {pdf_id}",
+            }
+        except Exception as e:
+            self.logger.error(f"Error deleting embeddings for PDF {pdf_id}: {str(e)}")
+            return {"status": "error", "message": str(e)}
+
+    def delete_stale_versions(self, pdf_id: str, index_version: str) -> None:
+        with self._lock:
+            names = [name for name in self._segment_names(pdf_id) if name != index_version]
+            if names:
+                with self._file_lock(pdf_id):
+                    for name in names:
+                        self._remove(pdf_id, name)
+        self.logger.info(f"Deleted embeddings of PDF {pdf_id} outside index version {index_version}")
+
+    def search_embeddings(
+        self,
+        pdf_id: str,
+        query_embedding: List[float],
+        top_k: int = 40,
+        page_range: Optional[Tuple[int, Optional[int]]] = None,
+        index_version: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        try:
+            if not pdf_id:
+                raise ValueError("The local vector store only searches within one PDF")
+            segments = self._load_all(pdf_id, index_version)
+
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+
+            candidates = []
+            for segment in segments:
+                if not segment.ids:
+                    continue
+                # Vectors are stored normalized, so this is the cosine similarity
+                scores = segment.vectors @ query
+                if page_range:
+                    first_page, last_page = page_range
+                    inside = segment.end_pages >= first_page
+                    if last_page is not None:
+                        inside &= segment.start_pages <= last_page
+                    outside = ~inside
+                    scores = np.where(outside, -np.inf, scores)
+                count = min(top_k, len(scores))
+                top = np.argpartition(-scores, count - 1)[:count]
+                candidates.extend(
+                    (float(scores[i]), segment.payloads[i]) for i in top if scores[i] > -np.inf
+                )
+
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            results = [
+                format_search_result(payload, score) for score, payload in candidates[:top_k]
+            ]
+            return {"status": "success", "results": results}
+
+        except Exception as e:
+            self.logger.error(f"Search error: {str(e)}")
+            return {"status": "error", "message": str(e)}
@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from qdrant_client.http import models
+
+from .base import VectorStore
+from ....config import config
+
+
+class BulkVectorWriter:
+    """
+    Buffers the vectors of one PDF and uploads them in large requests.
+
+    Points from many chunk batches are gathered into one buffer, which is sent
+    once it holds ``flush_points`` points or its oldest point has waited
+    ``flush_seconds``. Uploads use ``wait=False``, so Qdrant acknowledges them
+    as soon as they are queued on the server, and up to ``max_in_flight`` run
+    in parallel; adding blocks while that many are pending, which bounds
+    memory. ``close()`` is the consistency barrier to call before the PDF is
+    marked complete.
+    """
+
+    def __init__(
+        self,
+        vector_db: VectorStore,
+        pdf_id: str,
+        index_version: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        flush_points: Optional[int] = None,
+        flush_seconds: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        on_written: Optional[Callable[[int], None]] = None,
+        user_id: Optional[int] = None,
+    ):
+        """
+        Args:
+            vector_db: Vector database the points are written to
+            pdf_id: PDF every point belongs to
+            index_version: Index version stored with each point
+            embedding_model: Embedding model id stored with each point
+            flush_points: Buffer size that triggers an upload
+                (default: embedding_config.upsert_flush_points)
+            flush_seconds: Longest a point waits in the buffer
+                (default: embedding_config.upsert_flush_seconds)
+            max_in_flight: Uploads running at once
+                (default: embedding_config.upsert_workers)
+            on_written: Called with the number of points of each finished upload
+            user_id: Owner of the PDF, stored with each point
+        """
+        self.vector_db = vector_db
+        self.pdf_id = pdf_id
+        self.index_version = index_version
+        self.embedding_model = embedding_model
+        self.user_id = user_id
+        self.flush_points = max(1, flush_points or config.embedding_config.upsert_flush_points)
+        self.flush_seconds = flush_seconds or config.embedding_config.upsert_flush_seconds
+        max_in_flight = max(1, max_in_flight or config.embedding_config.upsert_workers)
+        self.on_written = on_written
+        self.logger = logging.getLogger(__name__)
+
+        self._buffer: List[models.PointStruct] = []
+        self._buffer_started = 0.0
+        self._last_point: Optional[models.PointStruct] = None
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="vector-upload"
+        )
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self.points_added = 0
+        self.points_written = 0
+        self.requests = 0
+
+        self._stop = threading.Event()
+        self._timer = threading.Thread(
+            target=self._flush_periodically, name="vector-upload-timer", daemon=True
+        )
+        self._timer.start()
+
+    def add(
+        self,
+        chunks: List[Union[str, Dict[str, Any]]],
+        embeddings: List[List[float]],
+    ) -> None:
+        """
+        Buffer the points of a batch of embedded chunks, uploading the buffer
+        if it is full
+
+        Raises:
+            The error of an earlier failed upload
+        """
+        self._raise_if_failed()
+        points = self.vector_db.build_points(
+            chunks,
+            embeddings,
+            self.pdf_id,
+            self.index_version,
+            self.embedding_model,
+            self.user_id,
+        )
+        if not points:
+            return
+        with self._lock:
+            if not self._buffer:
+                self._buffer_started = time.monotonic()
+            self._buffer.extend(points)
+            self._last_point = points[-1]
+            self.points_added += len(points)
+            batch = self._take() if len(self._buffer) >= self.flush_points else None
+        if batch:
+            self._submit(batch)
+
+    def flush(self) -> None:
+        """Upload whatever is buffered without waiting for it to be applied"""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._submit(batch)
+
+    def _take(self) -> List[models.PointStruct]:
+        batch = self._buffer
+        self._buffer = []
+        return batch
+
+    def _submit(self, points: List[models.PointStruct]) -> None:
+        # Blocks while max_in_flight uploads are pending
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._upload, points)
+        except RuntimeError:
+            # The writer was aborted meanwhile
+            self._slots.release()
+
+    def _upload(self, points: List[models.PointStruct]) -> None:
+        try:
+            self.vector_db.upsert_points(points, wait=False)
+            with self._lock:
+                self.points_written += len(points)
+                self.requests += 1
+            if self.on_written:
+                self.on_written(len(points))
+        except Exception as e:
+            self.logger.error(
+                f"Bulk upload of {len(points)} points for PDF {self.pdf_id} failed: {str(e)}"
+            )
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+        finally:
+            self._slots.release()
+
+    def _flush_periodically(self) -> None:
+        while not self._stop.wait(self.flush_seconds / 2):
+            with self._lock:
+                due = (
+                    self._buffer
+                    and time.monotonic() - self._buffer_started >= self.flush_seconds
+                )
+                batch = self._take() if due else None
+            if batch:
+                self._submit(batch)
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def _shutdown(self) -> None:
+        self._stop.set()
+        self._timer.join()
+
+    def close(self, expected: Optional[int] = None) -> int:
+        """
+        Upload the rest of the buffer, wait until Qdrant has applied every
+        write of this writer, and let the store compact what was written.
+
+        Args:
+            expected: Points the PDF (and index version) must have once all
+                writes are applied
+
+        Returns:
+            Number of points stored for the PDF and index version
+
+        Raises:
+            The error of a failed upload, or RuntimeError if fewer than
+            ``expected`` points are stored
+        """
+        if self._closed:
+            raise RuntimeError("BulkVectorWriter is already closed")
+        self._closed = True
+        self._shutdown()
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self._raise_if_failed()
+
+        # Qdrant applies the updates of a collection in the order it received
+        # them, so a waited write issued after every unwaited one has been
+        # acknowledged returns only once all of them are applied. Rewriting
+        # the last point is idempotent.
+        if self._last_point is not None:
+            self.vector_db.upsert_points([self._last_point], wait=True)
+            self.requests += 1
+
+        self.vector_db.compact(self.pdf_id, self.index_version)
+        stored = self.vector_db.count_embeddings(self.pdf_id, self.index_version)
+        if expected is not None and stored < expected:
+            raise RuntimeError(
+                f"Only {stored} of {expected} points of PDF {self.pdf_id} are stored"
+            )
+        self.logger.info(
+            f"Wrote {self.points_written} points for PDF {self.pdf_id} "
+            f"in {self.requests} requests"
+        )
+        return stored
+
+    def abort(self) -> None:
+        """
+        Drop the buffer and uploads not started yet, and wait for the running
+        ones, so a delete issued afterwards is not overtaken by them
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._shutdown()
+        with self._lock:
+            self._take()
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -1,34 +1,62 @@
 import logging
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Tuple
-from ..store.embeddings import VectorDB
-from .cache import LRUCache
-from .embed import generate_embeddings_batch
+from typing import Any, Dict, List, Optional, Tuple, Union
+from ..store.base import VectorStore, chunk_text
+from ..store.factory import get_vector_db
+from ..store.writer import BulkVectorWriter
+from .cache import EmbeddingCache
+from .cancel import CancellationToken
+from .disk_cache import DiskEmbeddingCache, get_disk_cache
+from .embed import (
+    agenerate_embeddings_batch,
+    embedding_cache_key,
+    generate_embeddings_batch,
+    get_embedding_model_id,
+)
 from ....config import config
 
 
 class EmbeddingBatcher:
-    def __init__(self):
+    def __init__(
+        self,
+        vector_db: VectorStore = None,
+        cache: EmbeddingCache = None,
+        disk_cache: DiskEmbeddingCache = None,
+    ):
         """
         Initialize the EmbedBatcher with a specified batch size, cache capacity, and thread pool.
         
         The batcher uses a thread pool to process multiple batches in parallel, significantly
         improving embedding generation performance. The number of threads is controlled by
         the config.embedding_config.num_threads parameter.
+
+        Args:
+            vector_db: Vector database to store embeddings in (the shared one if omitted)
+            cache: Embedding cache, pass one in to share it between several batchers
+            disk_cache: Persistent cache consulted on in-memory misses (defaults to
+                the process-wide one, if enabled)
         """
         self.batch_size = config.embedding_config.batch_size
-        self.vec_db = VectorDB()
-        self.chunk_embedding_cache = LRUCache(
-            capacity=config.embedding_config.cache_capacity
+        self.vec_db = vector_db or get_vector_db()
+        self.chunk_embedding_cache = cache or EmbeddingCache(
+            capacity=config.embedding_config.cache_capacity,
+            dim=config.embedding_config.vector_size,
+            dtype=config.embedding_config.cache_dtype,
         )
+        self.disk_cache = disk_cache or get_disk_cache()
         self.current_batch = []
         self.current_pdf_id = None
+        # Bulk writer of the PDF fed through process_chunk, closed by flush()
+        self.writer: Optional[BulkVectorWriter] = None
         self.logger = logging.getLogger(__name__)
         self.total_processed = 0
         self.cache_hits = 0
         self.num_threads = config.embedding_config.num_threads
         self.thread_pool = ThreadPoolExecutor(max_workers=self.num_threads)
+
+    def _cache_key(self, chunk: Union[str, Dict[str, Any]]) -> bytes:
+        return embedding_cache_key(chunk_text(chunk), get_embedding_model_id())
         
     def _process_current_batch(self):
         """
@@ -56,15 +84,13 @@ class EmbeddingBatcher:
                 if emb and len(emb) > 0:
                     valid_chunks.append(chunk)
                     valid_embeddings.append(emb)
-                    self.chunk_embedding_cache.put(chunk, emb)
+                    self.chunk_embedding_cache.put(self._cache_key(chunk), emb)
                 else:
                     self.logger.warning(f"Empty embedding for chunk {i} in batch")
             
             # Only store valid embeddings
             if valid_chunks:
-                self.vec_db.store_embeddings(
-                    valid_chunks, valid_embeddings, self.current_pdf_id
-                )
+                self._writer_for(self.current_pdf_id).add(valid_chunks, valid_embeddings)
                 self.total_processed += len(valid_chunks)
             else:
                 self.logger.error(f"No valid embeddings in batch of {batch_size} chunks")
@@ -75,75 +101,176 @@ class EmbeddingBatcher:
             # Always clear the batch to avoid getting stuck
             self.current_batch = []
 
-    def _process_batch(self, batch: List[str], pdf_id: str) -> Tuple[int, int]:
+    def seed_cache(self, pairs: List[Tuple[str, List[float]]]) -> None:
+        """
+        Add known (chunk text, embedding) pairs from the current embedding model
+        to the in-memory and disk caches, e.g. vectors of an index being rebuilt
+        """
+        if not pairs:
+            return
+        model_id = get_embedding_model_id()
+        entries = [(embedding_cache_key(text, model_id), emb) for text, emb in pairs]
+        for key, emb in entries:
+            self.chunk_embedding_cache.put(key, emb)
+        if self.disk_cache is not None:
+            try:
+                self.disk_cache.put_many(entries)
+            except Exception as e:
+                self.logger.warning(f"Could not write to the disk embedding cache: {str(e)}")
+
+    def _lookup_cached(
+        self, batch: List[Union[str, Dict[str, Any]]]
+    ) -> Tuple[List[Union[str, Dict[str, Any]]], List[List[float]], int, List[Tuple[Any, bytes]]]:
+        """
+        Resolve what can be served from the in-memory and disk caches.
+
+        Returns:
+            Tuple of (cached chunks, their embeddings, number of cache hits,
+            (chunk, cache key) pairs that still need embedding)
+        """
+        chunks = []
+        embeddings = []
+        cache_hits = 0
+        missing = []
+        model_id = get_embedding_model_id()
+        
+        # Check the in-memory cache first
+        for chunk in batch:
+            key = embedding_cache_key(chunk_text(chunk), model_id)
+            cached_embedding = self.chunk_embedding_cache.get(key)
+            if cached_embedding is not None:
+                chunks.append(chunk)
+                embeddings.append(cached_embedding)
+                cache_hits += 1
+            else:
+                missing.append((chunk, key))
+        
+        # Then the disk cache, which survives restarts and is shared between processes
+        if missing and self.disk_cache is not None:
+            try:
+                stored = self.disk_cache.get_many(key for _, key in missing)
+            except Exception as e:
+                self.logger.warning(f"Disk embedding cache lookup failed: {str(e)}")
+                stored = {}
+            still_missing = []
+            for chunk, key in missing:
+                if key in stored:
+                    self.chunk_embedding_cache.put(key, stored[key])
+                    chunks.append(chunk)
+                    embeddings.append(stored[key])
+                    cache_hits += 1
+                else:
+                    still_missing.append((chunk, key))
+            missing = still_missing
+
+        return chunks, embeddings, cache_hits, missing
+
+    def _add_generated(
+        self,
+        missing: List[Tuple[Any, bytes]],
+        generated: List[List[float]],
+        chunks: List[Union[str, Dict[str, Any]]],
+        embeddings: List[List[float]],
+    ) -> None:
+        """Cache freshly generated embeddings and append the valid ones to the results"""
+        if not generated:
+            self.logger.error(f"Failed to generate embeddings for batch of {len(missing)} chunks")
+        new_entries = []
+        for i, ((chunk, key), emb) in enumerate(zip(missing, generated)):
+            if emb and len(emb) > 0:
+                self.chunk_embedding_cache.put(key, emb)
+                new_entries.append((key, emb))
+                chunks.append(chunk)
+                embeddings.append(emb)
+            else:
+                self.logger.warning(f"Empty embedding for chunk {i} in batch")
+        if new_entries and self.disk_cache is not None:
+            try:
+                self.disk_cache.put_many(new_entries)
+            except Exception as e:
+                self.logger.warning(f"Could not write to the disk embedding cache: {str(e)}")
+
+    def embed_batch(
+        self, batch: List[Union[str, Dict[str, Any]]]
+    ) -> Tuple[List[Union[str, Dict[str, Any]]], List[List[float]], int]:
+        """
+        Embed a batch of chunks without storing them, using the cache where possible.
+        Chunks the provider failed to embed are dropped from the result.
+        
+        Args:
+            batch: Text chunks, either plain strings or chunk dicts with a "text" key
+            
+        Returns:
+            Tuple of (embedded chunks, their embeddings, number of cache hits),
+            with chunks and embeddings aligned
+        """
+        chunks, embeddings, cache_hits, missing = self._lookup_cached(batch)
+        if missing:
+            generated = generate_embeddings_batch([chunk_text(c) for c, _ in missing])
+            self._add_generated(missing, generated, chunks, embeddings)
+        return chunks, embeddings, cache_hits
+
+    async def aembed_batch(
+        self, batch: List[Union[str, Dict[str, Any]]]
+    ) -> Tuple[List[Union[str, Dict[str, Any]]], List[List[float]], int]:
+        """
+        Async counterpart of embed_batch; the provider is called through the
+        async embedding API so many batches can be in flight on one thread.
+        """
+        chunks, embeddings, cache_hits, missing = self._lookup_cached(batch)
+        if missing:
+            generated = await agenerate_embeddings_batch([chunk_text(c) for c, _ in missing])
+            self._add_generated(missing, generated, chunks, embeddings)
+        return chunks, embeddings, cache_hits
+
+    def _writer_for(self, pdf_id: str) -> BulkVectorWriter:
+        """Bulk writer for the PDF fed through process_chunk, created on first use"""
+        if self.writer is None:
+            self.writer = BulkVectorWriter(self.vec_db, pdf_id)
+        return self.writer
+
+    def _close_writer(self) -> None:
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.close()
+
+    def _process_batch(
+        self,
+        batch: List[str],
+        pdf_id: str,
+        cancel_token: CancellationToken = None,
+        writer: Optional[BulkVectorWriter] = None,
+    ) -> Tuple[int, int]:
         """
         Process a batch of chunks in a separate thread.
         
         Args:
             batch (List[str]): List of text chunks to process
             pdf_id (str): Identifier for the PDF/document
+            cancel_token: Batches are skipped once this is cancelled
+            writer: Bulk writer the embeddings are handed to (stored directly if omitted)
             
         Returns:
             Tuple[int, int]: (number of processed chunks, number of cache hits)
         """
-        if not batch:
+        if not batch or (cancel_token and cancel_token.cancelled):
             return 0, 0
             
         processed = 0
         cache_hits = 0
         
         try:
-            # First check cache for each chunk
-            valid_chunks = []
-            valid_embeddings = []
-            cached_chunks = []
-            cached_embeddings = []
+            chunks, embeddings, cache_hits = self.embed_batch(batch)
             
-            # Check cache first
-            for chunk in batch:
-                cached_embedding = self.chunk_embedding_cache.get(chunk)
-                if cached_embedding is not None:
-                    cached_chunks.append(chunk)
-                    cached_embeddings.append(cached_embedding)
-                    cache_hits += 1
-                else:
-                    valid_chunks.append(chunk)
-            
-            # Store cached embeddings if any
-            if cached_chunks:
-                self.vec_db.store_embeddings(cached_chunks, cached_embeddings, pdf_id)
-                processed += len(cached_chunks)
-            
-            # Process remaining chunks that weren't in cache
-            if valid_chunks:
-                embeddings = generate_embeddings_batch(valid_chunks)
-                
-                # Check if we got valid embeddings
-                if embeddings and len(embeddings) > 0:
-                    # Check if any embedding is empty
-                    for i, (chunk, emb) in enumerate(zip(valid_chunks, embeddings)):
-                        if emb and len(emb) > 0:
-                            # Cache the embedding
-                            self.chunk_embedding_cache.put(chunk, emb)
-                            valid_embeddings.append(emb)
-                        else:
-                            # Remove invalid chunks
-                            self.logger.warning(f"Empty embedding for chunk {i} in batch")
-                            valid_chunks[i] = None
-                    
-                    # Filter out None values
-                    filtered_chunks = [c for c in valid_chunks if c is not None]
-                    
-                    # Only store valid embeddings
-                    if filtered_chunks:
-                        self.vec_db.store_embeddings(
-                            filtered_chunks, valid_embeddings, pdf_id
-                        )
-                        processed += len(filtered_chunks)
-                    else:
-                        self.logger.error(f"No valid embeddings in batch of {len(valid_chunks)} chunks")
+            # Only store valid embeddings
+            if chunks:
+                if writer is not None:
+                    writer.add(chunks, embeddings)
                 else:
-                    self.logger.error(f"Failed to generate embeddings for batch of {len(valid_chunks)} chunks")
+                    self.vec_db.store_embeddings(chunks, embeddings, pdf_id)
+                processed += len(chunks)
+            else:
+                self.logger.error(f"No valid embeddings in batch of {len(batch)} chunks")
         except Exception as e:
             self.logger.error(f"Error processing batch in thread: {str(e)}")
             
@@ -167,14 +294,16 @@ class EmbeddingBatcher:
             self.logger.info(f"Switching from PDF {self.current_pdf_id} to {pdf_id}, processing remaining chunks")
             self._process_current_batch()
             self.current_batch = []
+        if self.current_pdf_id != pdf_id:
+            self._close_writer()
 
         self.current_pdf_id = pdf_id
 
         # Check if embedding already exists in cache
-        cached_embedding = self.chunk_embedding_cache.get(chunk)
+        cached_embedding = self.chunk_embedding_cache.get(self._cache_key(chunk))
         if cached_embedding is not None:
-            # Store the cached embedding directly into the vector DB
-            self.vec_db.store_embeddings([chunk], [cached_embedding], pdf_id)
+            # Buffer the cached embedding for the next bulk upload
+            self._writer_for(pdf_id).add([chunk], [cached_embedding])
             self.cache_hits += 1
             self.total_processed += 1
         else:
@@ -193,6 +322,8 @@ class EmbeddingBatcher:
             self.logger.info(f"Flushing remaining {len(self.current_batch)} chunks for PDF {self.current_pdf_id}")
             self._process_current_batch()
             self.logger.info(f"Final processing stats - Total chunks: {self.total_processed}, Cache hits: {self.cache_hits}")
+        # Wait until every buffered vector is applied
+        self._close_writer()
         
         # Shutdown the thread pool
         self.thread_pool.shutdown(wait=True)
@@ -216,13 +347,20 @@ class EmbeddingBatcher:
             self.num_threads = num_threads
             self.thread_pool = ThreadPoolExecutor(max_workers=self.num_threads)
 
-    def process_pdf_chunks(self, pdf_id: str, chunks: list):
+    def process_pdf_chunks(
+        self, pdf_id: str, chunks: list, cancel_token: CancellationToken = None
+    ):
         """
         Process all chunks from a PDF document using multiple threads.
         
         Args:
             pdf_id (str): Identifier for the PDF/document
             chunks (list): List of text chunks to process
+            cancel_token: Checked before each batch; raises IngestionCancelled
+                once the remaining batches have been skipped
+
+        Raises:
+            RuntimeError: If fewer than all chunks were stored
         """
         self.logger.info(f"Processing {len(chunks)} chunks for PDF {pdf_id} using {self.num_threads} threads")
         # Reset counters for new PDF
@@ -237,10 +375,14 @@ class EmbeddingBatcher:
             
         self.logger.info(f"Created {len(batches)} batches of size {self.batch_size}")
         
-        # Process batches in parallel using thread pool
+        # Process batches in parallel using thread pool; their vectors are
+        # gathered by one writer and uploaded in bulk
+        writer = BulkVectorWriter(self.vec_db, pdf_id)
         futures = []
         for batch in batches:
-            future = self.thread_pool.submit(self._process_batch, batch, pdf_id)
+            future = self.thread_pool.submit(
+                self._process_batch, batch, pdf_id, cancel_token, writer
+            )
             futures.append(future)
             
         # Wait for all futures to complete and collect results
@@ -248,6 +390,11 @@ class EmbeddingBatcher:
             processed, hits = future.result()
             self.total_processed += processed
             self.cache_hits += hits
+
+        if cancel_token and cancel_token.cancelled:
+            writer.abort()
+            cancel_token.raise_if_cancelled()
+        writer.close(expected=len(chunks))
             
         # Log final stats
         cache_hit_rate = (self.cache_hits / self.total_processed) * 100 if self.total_processed > 0 else 0
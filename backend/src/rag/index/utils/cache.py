@@ -1,20 +1,311 @@
+import asyncio
 import collections
-from typing import List
+import hashlib
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 
-class LRUCache:
-    def __init__(self, capacity: int):
+
+class _CacheShard:
+    """One lock-protected LRU segment of an EmbeddingCache"""
+
+    def __init__(self, capacity: int, dim: int, dtype):
         self.capacity = capacity
-        self.cache = collections.OrderedDict()
-
-    def get(self, key: str):
-        if key in self.cache:
-            self.cache.move_to_end(key)
-            return self.cache[key]
-        return None
-
-    def put(self, key: str, value: List[float]):
-        self.cache[key] = value
-        self.cache.move_to_end(key)
-        if len(self.cache) > self.capacity:
-            self.cache.popitem(last=False)
+        self.slab = np.zeros((capacity, dim), dtype=dtype)
+        self.slots = collections.OrderedDict()  # key -> row in slab
+        self.free = list(range(capacity - 1, -1, -1))
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class EmbeddingCache:
+    """
+    Compact LRU cache for embedding vectors.
+
+    Keys are fixed-size digests (see ``embedding_cache_key``) rather than chunk
+    text, and vectors live in preallocated float32 (or float16) slabs instead of
+    Python float lists, which cuts memory use by more than 10x. Entries are
+    spread over independently locked shards so concurrent batcher threads
+    rarely contend.
+    """
+
+    def __init__(
+        self, capacity: int, dim: int, dtype: str = "float32", num_shards: int = 16
+    ):
+        """
+        Args:
+            capacity: Maximum number of vectors held
+            dim: Vector dimension; vectors of any other size are not cached
+            dtype: "float32" or "float16"
+            num_shards: Number of independently locked segments
+        """
+        num_shards = max(1, min(num_shards, capacity))
+        shard_capacity = -(-capacity // num_shards)
+        self.capacity = shard_capacity * num_shards
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.shards = [
+            _CacheShard(shard_capacity, dim, self.dtype) for _ in range(num_shards)
+        ]
+
+    def _shard(self, key: bytes) -> _CacheShard:
+        # Keys are uniformly distributed digests, so their leading bytes pick a shard
+        return self.shards[int.from_bytes(key[:4], "little") % len(self.shards)]
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        shard = self._shard(key)
+        with shard.lock:
+            slot = shard.slots.get(key)
+            if slot is None:
+                shard.misses += 1
+                return None
+            shard.slots.move_to_end(key)
+            shard.hits += 1
+            return shard.slab[slot].tolist()
+
+    def put(self, key: bytes, value: List[float]) -> None:
+        if len(value) != self.dim:
+            return
+        shard = self._shard(key)
+        with shard.lock:
+            slot = shard.slots.get(key)
+            if slot is None:
+                if shard.free:
+                    slot = shard.free.pop()
+                else:
+                    _, slot = shard.slots.popitem(last=False)
+                    shard.evictions += 1
+                shard.slots[key] = slot
+            else:
+                shard.slots.move_to_end(key)
+            shard.slab[slot] = value
+
+    def __len__(self) -> int:
+        return sum(len(shard.slots) for shard in self.shards)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and memory footprint"""
+        hits = misses = evictions = 0
+        for shard in self.shards:
+            with shard.lock:
+                hits += shard.hits
+                misses += shard.misses
+                evictions += shard.evictions
+        lookups = hits + misses
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "slab_bytes": sum(shard.slab.nbytes for shard in self.shards),
+        }
+
+
+def _retrieve_exception(task: asyncio.Future) -> None:
+    # Every caller may have gone; the failure is theirs to log, not the loop's
+    if not task.cancelled():
+        task.exception()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache with expiry for the embeddings of search queries.
+
+    A query embedded by any chat of the process is served from memory until
+    ``ttl_seconds`` have passed, and concurrent lookups of the same key wait
+    for the one embedding request already in flight instead of sending their
+    own. Meant for a single event loop: entries are only touched between
+    awaits, so no lock is needed.
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: float):
+        """
+        Args:
+            capacity: Maximum number of query vectors held
+            ttl_seconds: How long a vector is served after it was embedded
+        """
+        self.capacity = max(1, capacity)
+        self.ttl_seconds = ttl_seconds
+        self.entries = collections.OrderedDict()  # key -> (expires at, vector)
+        self.pending: Dict[bytes, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_embed(
+        self, key: bytes, embed: Callable[[], Awaitable[List[float]]]
+    ) -> List[float]:
+        """
+        Return the cached vector of ``key``, or await ``embed()`` once for
+        every concurrent caller and cache its result
+
+        Args:
+            key: Digest of the normalized query and model (see query_cache_key)
+            embed: Produces the vector on a miss; empty vectors are not cached
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key]
+
+        task = self.pending.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # The request runs as its own task, so a caller that is cancelled
+            # (its chat disconnected) neither cancels it nor fails the others
+            task = asyncio.ensure_future(self._embed_and_store(key, embed))
+            task.add_done_callback(_retrieve_exception)
+            self.pending[key] = task
+        return await asyncio.shield(task)
+
+    async def _embed_and_store(
+        self, key: bytes, embed: Callable[[], Awaitable[List[float]]]
+    ) -> List[float]:
+        try:
+            vector = await embed()
+        finally:
+            del self.pending[key]
+        if vector:
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters; coalesced lookups waited on another's request"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+# Stands for "no cached results" where None is a valid index version
+_NO_VERSION = object()
+
+
+class RetrievalCache:
+    """
+    LRU cache of vector search results.
+
+    Keyed by PDF, index version, query vector, top_k and page window. The
+    vector is normalized and quantized to int8 before hashing, so the same
+    question asked again hits even if the provider returns a vector that
+    differs in the last digits. A search for another index version of a PDF
+    (its re-index went live) drops every result of the old one, and
+    ``invalidate`` drops a PDF's results when it is deleted.
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: float):
+        """
+        Args:
+            capacity: Maximum number of search results held
+            ttl_seconds: How long a result is served after the search
+        """
+        self.capacity = max(1, capacity)
+        self.ttl_seconds = ttl_seconds
+        self.entries = collections.OrderedDict()  # key -> (expires at, results)
+        # pdf_id -> index version its cached results belong to
+        self.live_versions: Dict[str, Optional[str]] = {}
+        # Searches run on the event loop, invalidations in request threads
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    @staticmethod
+    def make_key(
+        pdf_id: str,
+        index_version: Optional[str],
+        query_embedding: List[float],
+        top_k: int,
+        page_range: Optional[Tuple[int, Optional[int]]] = None,
+    ) -> Tuple:
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        quantized = np.round(vector * 127).astype(np.int8).tobytes()
+        return (pdf_id, index_version, hashlib.sha256(quantized).digest(), top_k, page_range)
+
+    async def get_or_search(
+        self,
+        pdf_id: str,
+        index_version: Optional[str],
+        query_embedding: List[float],
+        top_k: int,
+        page_range: Optional[Tuple[int, Optional[int]]],
+        search: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Return the cached results of a search, or await ``search()`` and
+        cache its results if it succeeded
+        """
+        start = time.perf_counter()
+        key = self.make_key(pdf_id, index_version, query_embedding, top_k, page_range)
+        with self.lock:
+            if self.live_versions.get(pdf_id, index_version) != index_version:
+                self._drop(pdf_id)
+            self.live_versions[pdf_id] = index_version
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.hit_seconds += time.perf_counter() - start
+                return entry[1]
+
+        results = await search()
+        with self.lock:
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+            # Skip results of a PDF invalidated or re-indexed during the search
+            live = self.live_versions.get(pdf_id, _NO_VERSION) == index_version
+            if live and results.get("status") == "success":
+                self.entries[key] = (time.monotonic() + self.ttl_seconds, results)
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.capacity:
+                    self.entries.popitem(last=False)
+        return results
+
+    def invalidate(self, pdf_id: str) -> None:
+        """Drop every cached result of a PDF"""
+        with self.lock:
+            self._drop(pdf_id)
+            self.live_versions.pop(pdf_id, None)
+
+    def _drop(self, pdf_id: str) -> None:
+        for key in [key for key in self.entries if key[0] == pdf_id]:
+            del self.entries[key]
+        self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and the average latency of hits and misses"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_hit_ms": self.hit_seconds * 1000 / self.hits if self.hits else 0.0,
+                "avg_miss_ms": self.miss_seconds * 1000 / self.misses if self.misses else 0.0,
+            }
@@ -0,0 +1,26 @@
+import threading
+
+
+class IngestionCancelled(Exception):
+    """Raised inside an ingestion run once its job has been cancelled"""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared between a worker and its ingestion
+    run. The worker sets it; the stages check it between pages and batches.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise IngestionCancelled()
@@ -0,0 +1,168 @@
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, Iterator, List
+import fitz
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from ....config import config
+
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+    """
+    Yield the text of a PDF one page at a time using PyMuPDF (fitz).
+
+    Only the current page is held in memory, so the cost of extraction does not
+    grow with the size of the document.
+
+    Args:
+        pdf_path: Path of the PDF file
+
+    Yields:
+        The text of each page, in page order
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        for page in doc:
+            yield page.get_text()
+    finally:
+        doc.close()
+
+
+class IncrementalChunker:
+    """
+    Split a stream of page texts into overlapping chunks without ever holding
+    the whole document.
+
+    Pages are appended to a buffer. Once the buffer holds ``window_chunks``
+    chunks worth of text it is split, every chunk but the last is emitted and
+    the buffer restarts at the last chunk, which keeps the usual overlap
+    between consecutive chunks across window boundaries.
+
+    Each chunk is a dict with its ``text``, its ordinal ``chunk_index``, the
+    1-based ``start_page``/``end_page`` it spans and its ``start_char``/
+    ``end_char`` offsets in the concatenated document text.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = None,
+        chunk_overlap: int = None,
+        window_chunks: int = 16,
+    ):
+        """
+        Args:
+            chunk_size: Maximum chunk size in characters (defaults to the config)
+            chunk_overlap: Overlap between consecutive chunks (defaults to the config)
+            window_chunks: How many chunks worth of text to buffer before splitting
+        """
+        self.chunk_size = chunk_size or config.pdf_chunk_config.max_chunk_size
+        self.chunk_overlap = (
+            config.pdf_chunk_config.chunk_overlap if chunk_overlap is None else chunk_overlap
+        )
+        self.window_size = self.chunk_size * window_chunks
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            length_function=len,
+            add_start_index=True,
+        )
+        self._buffer_parts: List[str] = []
+        self._buffer_len = 0
+        # Document offset of the first buffered character
+        self._buffer_start = 0
+        # Document offsets where pages start, with their page numbers, for the
+        # pages that overlap the buffer
+        self._page_offsets: List[int] = []
+        self._page_numbers: List[int] = []
+        self._pages_seen = 0
+        self._chunks_emitted = 0
+
+    def _page_at(self, offset: int) -> int:
+        return self._page_numbers[max(bisect_right(self._page_offsets, offset) - 1, 0)]
+
+    def _make_chunk(self, text: str, buffer_index: int) -> Dict[str, Any]:
+        start_char = self._buffer_start + buffer_index
+        end_char = start_char + len(text)
+        chunk = {
+            "text": text,
+            "chunk_index": self._chunks_emitted,
+            "start_page": self._page_at(start_char),
+            "end_page": self._page_at(max(end_char - 1, start_char)),
+            "start_char": start_char,
+            "end_char": end_char,
+        }
+        self._chunks_emitted += 1
+        return chunk
+
+    def _split_buffer(self, final: bool) -> List[Dict[str, Any]]:
+        text = "".join(self._buffer_parts)
+        self._buffer_parts = []
+        self._buffer_len = 0
+
+        documents = self.text_splitter.create_documents([text])
+        if not documents:
+            return []
+        if final or len(documents) == 1:
+            if not final:
+                # Not enough text for a second chunk yet, keep buffering
+                self._buffer_parts = [text]
+                self._buffer_len = len(text)
+                return []
+            return [
+                self._make_chunk(doc.page_content, doc.metadata["start_index"])
+                for doc in documents
+            ]
+
+        chunks = [
+            self._make_chunk(doc.page_content, doc.metadata["start_index"])
+            for doc in documents[:-1]
+        ]
+
+        # Carry the last (possibly incomplete) chunk into the next window
+        carry_index = documents[-1].metadata["start_index"]
+        carry = text[carry_index:]
+        self._buffer_parts = [carry]
+        self._buffer_len = len(carry)
+        self._buffer_start += carry_index
+
+        # Forget pages that end before the new buffer starts
+        first_page = max(bisect_right(self._page_offsets, self._buffer_start) - 1, 0)
+        del self._page_offsets[:first_page]
+        del self._page_numbers[:first_page]
+        return chunks
+
+    def add_page(self, page_text: str) -> List[Dict[str, Any]]:
+        """
+        Add the next page of text.
+
+        Returns:
+            Chunks that are complete and will not change, possibly empty
+        """
+        self._pages_seen += 1
+        self._page_offsets.append(self._buffer_start + self._buffer_len)
+        self._page_numbers.append(self._pages_seen)
+        self._buffer_parts.append(page_text)
+        self._buffer_len += len(page_text)
+        if self._buffer_len < self.window_size:
+            return []
+        return self._split_buffer(final=False)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Flush the text that is still buffered.
+
+        Returns:
+            The remaining chunks of the document
+        """
+        if not self._buffer_len:
+            return []
+        return self._split_buffer(final=True)
+
+    def chunk_pages(self, pages: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Chunk an iterable of page texts lazily.
+
+        Yields:
+            Chunk dicts in document order
+        """
+        for page_text in pages:
+            yield from self.add_page(page_text)
+        yield from self.finish()
@@ -0,0 +1,191 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+from ....config import config
+
+logger = logging.getLogger(__name__)
+
+
+class DiskEmbeddingCache:
+    """
+    Embedding cache persisted in a SQLite file, so vectors survive restarts
+    and are shared by every process on the host.
+
+    Keys are the digests built by ``embedding_cache_key`` (normalized text,
+    provider, model and dimension); values are float32 blobs. When the stored
+    vectors exceed ``max_bytes`` the least recently used ones are evicted. The
+    running total lives in a one-row table updated in the same transaction as
+    the vectors, so every process sees the writes and evictions of the others.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            max_bytes: Size budget for stored vectors
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings (last_access)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_meta "
+            "(id INTEGER PRIMARY KEY CHECK (id = 0), total_bytes INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO cache_meta (id, total_bytes) "
+            "SELECT 0, COALESCE(SUM(size), 0) FROM embeddings"
+        )
+        self.conn.commit()
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes of vectors stored by every process using the file"""
+        with self.lock:
+            return self._read_total()
+
+    def _read_total(self) -> int:
+        return self.conn.execute("SELECT total_bytes FROM cache_meta WHERE id = 0").fetchone()[0]
+
+    def _add_to_total(self, delta: int) -> None:
+        self.conn.execute(
+            "UPDATE cache_meta SET total_bytes = total_bytes + ? WHERE id = 0", (delta,)
+        )
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, List[float]]:
+        """
+        Look up several keys at once.
+
+        Returns:
+            Mapping of the keys that were found to their vectors
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    part,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[bytes(key)] = vector.tolist()
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.conn.commit()
+        return found
+
+    def put_many(self, items: Iterable[Tuple[bytes, List[float]]]) -> None:
+        """Store several (key, vector) pairs, evicting old entries if needed"""
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        if not rows:
+            return
+        with self.lock:
+            # Take the write lock up front so the total read below cannot go
+            # stale before this transaction commits
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = 0
+                for i in range(0, len(rows), 500):
+                    part = [row[0] for row in rows[i:i + 500]]
+                    placeholders = ",".join("?" * len(part))
+                    replaced += self.conn.execute(
+                        f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})",
+                        part,
+                    ).fetchone()[0]
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._add_to_total(sum(row[2] for row in rows) - replaced)
+                total = self._read_total()
+                if total > self.max_bytes:
+                    self._evict(total)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+    def _evict(self, total: int) -> None:
+        """Drop least recently used vectors until 90% of the budget is free"""
+        target = int(self.max_bytes * 0.9)
+        while total > target:
+            rows = self.conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                # Nothing left to evict; resynchronize a drifted total
+                self.conn.execute("UPDATE cache_meta SET total_bytes = 0 WHERE id = 0")
+                break
+            evicted = []
+            freed = 0
+            for key, size in rows:
+                evicted.append((key,))
+                freed += size
+                if total - freed <= target:
+                    break
+            self.conn.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+            self._add_to_total(-freed)
+            total -= freed
+            logger.info(f"Evicted {len(evicted)} embeddings from the disk cache")
+
+
+_disk_cache: Optional[DiskEmbeddingCache] = None
+_disk_cache_lock = threading.Lock()
+
+
+def get_disk_cache() -> Optional[DiskEmbeddingCache]:
+    """
+    Get the process-wide disk embedding cache, or None if it is disabled
+    (``embedding_config.disk_cache_path`` is empty) or cannot be opened.
+    """
+    global _disk_cache
+    path = config.embedding_config.disk_cache_path
+    if not path:
+        return None
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            try:
+                _disk_cache = DiskEmbeddingCache(
+                    path, config.embedding_config.disk_cache_max_mb * 1024 * 1024
+                )
+            except Exception as e:
+                logger.error(f"Could not open disk embedding cache at {path}: {str(e)}")
+                return None
+        return _disk_cache
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import List
 import logging
 from ....config import config
@@ -26,4 +28,72 @@ def generate_embeddings_batch(chunks: List[str]) -> List[List[float]]:
         # Return empty embeddings to avoid breaking the pipeline
         # This will allow processing to continue but will result in empty vectors
         return [[] for _ in chunks]
-    
\ No newline at end of file
+
+
+async def agenerate_embeddings_batch(chunks: List[str]) -> List[List[float]]:
+    """
+    Async counterpart of generate_embeddings_batch. Packed requests are sent
+    concurrently, up to the provider's concurrency limit.
+
+    Args:
+        chunks (List[str]): A list of text chunks to embed.
+
+    Returns:
+        List[List[float]]: A list of embedding vectors in input order.
+    """
+    try:
+        llm = get_llm(config.embedding_config.embedding_provider)
+        return await llm.aget_embeddings(chunks)
+    except Exception as e:
+        logger.error(f"Error generating embeddings: {str(e)}")
+        return [[] for _ in chunks]
+
+
+def get_embedding_model_id() -> str:
+    """
+    Identify the vectors the configured provider produces, as
+    "provider:model:dimension". Vectors with different ids are not interchangeable.
+    """
+    provider = config.embedding_config.embedding_provider
+    model = getattr(get_llm(provider), "embedding_model", "")
+    return f"{provider}:{model}:{config.embedding_config.vector_size}"
+
+
+def embedding_cache_key(text: str, model_id: str) -> bytes:
+    """
+    Cache key of a chunk's embedding: a digest of its whitespace-normalized
+    text and the id of the model that embeds it.
+
+    Args:
+        text: Chunk text
+        model_id: Value returned by get_embedding_model_id()
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{model_id}\0{normalized}".encode("utf-8")).digest()
+
+
+def query_cache_key(query: str, model_id: str) -> bytes:
+    """
+    Cache key of a search query's embedding. Queries differing only in case
+    or whitespace share a key.
+
+    Args:
+        query: Query text
+        model_id: Value returned by get_embedding_model_id()
+    """
+    return embedding_cache_key(query.casefold(), model_id)
+
+
+def get_index_version() -> str:
+    """
+    Identify the index the current configuration produces: a short hash of the
+    chunker settings and the embedding model id. PDFs indexed under another
+    version are re-indexed in the background.
+    """
+    settings = {
+        "max_chunk_size": config.pdf_chunk_config.max_chunk_size,
+        "chunk_overlap": config.pdf_chunk_config.chunk_overlap,
+        "embedding_model": get_embedding_model_id(),
+    }
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
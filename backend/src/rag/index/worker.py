@@ -1,10 +1,13 @@
-import fitz
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import time
 import logging
 from .queue import PDFQueue
 from .utils.batcher import EmbeddingBatcher
-from .store.embeddings import VectorDB
+from .utils.cache import EmbeddingCache
+from .store.base import VectorStore
+from .store.factory import get_vector_db
+from .stages import StagedIngestion
+from .utils.cancel import CancellationToken, IngestionCancelled
+from .utils.embed import get_embedding_model_id, get_index_version
 from ...models.pdf import PDF
 from typing import Dict, Any
 from ...config import config
@@ -12,6 +15,8 @@ from ...utils.database import get_db
 from .utils.toc import parse_table_of_contents
 import threading
 import concurrent.futures
+import os
+import socket
 
 
 class PDFWorker:
@@ -19,7 +24,8 @@ class PDFWorker:
         self,
         queue: PDFQueue,
         embedding_batcher: EmbeddingBatcher,
-        vector_db: VectorDB,
+        vector_db: VectorStore,
+        worker_index: int = 0,
     ):
         self.queue = queue
         self.embedding_batcher = embedding_batcher
@@ -27,31 +33,19 @@ class PDFWorker:
         self.logger = logging.getLogger(__name__)
         self.is_running = False
         self.worker_thread = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+        self.current_job_id = None
+        self.last_heartbeat = 0.0
+        self.cancel_token = CancellationToken()
+        self.last_cancel_check = 0.0
         # Add progress tracking variables
         self.current_pdf_id = None
+        self.current_user_id = None  # owner of the current PDF, stored with its vectors
         self.total_chunks = 0
         self.processed_chunks = 0
         # Thread pool for parallel processing
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
 
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from PDF using PyMuPDF (fitz)"""
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        return text
-
-    def create_text_chunks(self, text: str) -> list:
-        """Split text into chunks"""
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=config.pdf_chunk_config.max_chunk_size,
-            chunk_overlap=config.pdf_chunk_config.chunk_overlap,
-            length_function=len,
-        )
-        return text_splitter.split_text(text)
-
     def word_count(self, text: str) -> int:
         """Count the number of words in the text"""
         return len(text.split())
@@ -113,6 +107,45 @@ class PDFWorker:
             self.logger.error(f"Error chunking and storing PDF {pdf_id}: {str(e)}")
             return {"status": "error", "message": str(e)}
 
+    def get_progress(self) -> Dict[str, Any]:
+        """Get a snapshot of this worker's progress on its current PDF"""
+        progress = {
+            "worker_id": self.worker_id,
+            "running": self.is_running,
+            "current_pdf_id": self.current_pdf_id,
+            "total_chunks": self.total_chunks,
+            "processed_chunks": self.processed_chunks,
+            "progress_percentage": 0,
+        }
+        if self.total_chunks > 0:
+            progress["progress_percentage"] = (self.processed_chunks / self.total_chunks) * 100
+        return progress
+
+    def _heartbeat(self) -> None:
+        """
+        Check whether the current job was cancelled, and extend its lease if a
+        third of it has elapsed
+        """
+        if self.current_job_id is None:
+            return
+        if time.time() - self.last_cancel_check >= config.ingestion_config.cancel_check_interval:
+            self.last_cancel_check = time.time()
+            if self.queue.is_cancel_requested(self.current_job_id):
+                self.cancel_token.cancel()
+        interval = config.ingestion_config.lease_seconds / 3
+        if time.time() - self.last_heartbeat < interval:
+            return
+        self.last_heartbeat = time.time()
+        if not self.queue.extend_lease(self.current_job_id, self.worker_id):
+            self.logger.warning(
+                f"Lost lease on job {self.current_job_id} for PDF {self.current_pdf_id}"
+            )
+
+    def _check_in(self) -> None:
+        """Keep the lease alive and stop if the current job was cancelled"""
+        self._heartbeat()
+        self.cancel_token.raise_if_cancelled()
+
     def process_toc_in_parallel(self, pdf_id: str):
         """Process table of contents in a separate thread"""
         try:
@@ -120,33 +153,117 @@ class PDFWorker:
         except Exception as e:
             self.logger.error(f"Error processing table of contents for PDF {pdf_id}: {str(e)}")
 
-    def process_pdf(self, pdf_path: str, pdf_id: str) -> None:
-        """Process PDF and generate embeddings index"""
-        # Extract text from PDF
-        text = self.extract_text_from_pdf(pdf_path)
+    def _on_stage_progress(self, stage: str, count: int) -> None:
+        """Track chunks as the staged ingestion creates and stores them"""
+        if stage == "chunk":
+            self.total_chunks += count
+        elif stage == "upsert":
+            self.processed_chunks += count
 
-        # Split text into chunks for embeddings
-        chunks = self.create_text_chunks(text)
-        
+    def process_pdf(self, pdf_path: str, pdf_id: str, resume: bool = False) -> str:
+        """
+        Process PDF and generate embeddings index
+
+        Args:
+            resume: Skip chunks an interrupted earlier attempt already stored
+
+        Returns:
+            Index version the vectors were stored under
+        """
         # Reset progress tracking for new PDF
         self.current_pdf_id = pdf_id
-        self.total_chunks = len(chunks)
+        self.total_chunks = 0
         self.processed_chunks = 0
-        self.logger.info(f"Starting to process {self.total_chunks} chunks for PDF {pdf_id}")
+        index_version = get_index_version()
+        self.logger.info(f"Starting staged ingestion for PDF {pdf_id} (index version {index_version})")
 
         # Start table of contents extraction in parallel
         toc_future = self.executor.submit(self.process_toc_in_parallel, pdf_id)
         
-        # Process each chunk
-        for chunk in chunks:
-            self.embedding_batcher.process_chunk(chunk, pdf_id)
-            # Update and log progress
-            self.processed_chunks += 1
+        # Extract, chunk, embed and store with all stages overlapping
+        ingestion = StagedIngestion(
+            self.embedding_batcher,
+            self.vector_db,
+            progress_callback=self._on_stage_progress,
+            cancel_token=self.cancel_token,
+            resume=resume,
+        )
+        ingestion.run(
+            pdf_path,
+            pdf_id,
+            on_tick=self._heartbeat,
+            index_version=index_version,
+            embedding_model=get_embedding_model_id(),
+            user_id=self.current_user_id,
+        )
         
         # Wait for TOC processing to complete if it's still running
         if not toc_future.done():
             self.logger.info(f"Waiting for table of contents extraction to complete for PDF {pdf_id}")
-            toc_future.result()  # This will wait for the future to complete
+            while True:
+                try:
+                    toc_future.result(timeout=1)
+                    break
+                except concurrent.futures.TimeoutError:
+                    self._check_in()
+        return index_version
+
+    def reindex_pdf(
+        self, pdf_path: str, pdf_id: str, old_version: str, resume: bool = False
+    ) -> str:
+        """
+        Rebuild the index of a PDF under the current index version. Vectors of
+        the live version that came from the current embedding model are fed to
+        the embedding cache first, so only chunks whose text changed under the
+        new chunking are sent to the provider.
+
+        Returns:
+            Index version the vectors were stored under
+        """
+        model_id = get_embedding_model_id()
+        reusable = 0
+        for records in self.vector_db.iter_embeddings(pdf_id, old_version):
+            self._check_in()
+            pairs = [
+                (record.payload["text"], record.vector)
+                for record in records
+                if record.payload.get("embedding_model") == model_id
+            ]
+            self.embedding_batcher.seed_cache(pairs)
+            reusable += len(pairs)
+        self.logger.info(
+            f"Re-indexing PDF {pdf_id} from version {old_version}, "
+            f"{reusable} existing vectors reusable"
+        )
+        return self.process_pdf(pdf_path, pdf_id, resume)
+
+    def clone_pdf(
+        self, source_pdf_id: str, pdf_id: str, pdf_path: str, source_version: str = None
+    ) -> str:
+        """
+        Index a PDF by copying the vectors of an identical, already processed PDF.
+        Falls back to full processing if the source has no vectors any more.
+
+        Returns:
+            Index version of the copied (or freshly created) vectors
+        """
+        self.current_pdf_id = pdf_id
+        self.logger.info(f"Cloning index of PDF {source_pdf_id} for identical PDF {pdf_id}")
+        copied = self.vector_db.copy_embeddings(
+            source_pdf_id,
+            pdf_id,
+            index_version=source_version,
+            user_id=self.current_user_id,
+            on_batch=self._check_in,
+        )
+        if copied == 0:
+            self.logger.warning(
+                f"Source PDF {source_pdf_id} has no embeddings, processing PDF {pdf_id} from scratch"
+            )
+            return self.process_pdf(pdf_path, pdf_id)
+        self.total_chunks = copied
+        self.processed_chunks = copied
+        return source_version
 
     def _process_queue(self) -> None:
         """Process PDFs in the queue"""
@@ -155,51 +272,117 @@ class PDFWorker:
         db = next(get_db())
         while self.is_running:
             try:
-                # Get the next PDF from the queue
-                pdf_data = self.queue.get_next_item(db)
+                # Claim the next PDF from the queue
+                pdf_data = self.queue.get_next_item(self.worker_id)
                 
                 if not pdf_data:
-                    time.sleep(5)
+                    time.sleep(config.ingestion_config.poll_interval)
                     continue
 
+                job_id = pdf_data["job_id"]
                 pdf_id = pdf_data["pdf_id"]
                 pdf_path = pdf_data["pdf_path"]
+                kind = pdf_data.get("kind") or "ingest"
+                self.current_job_id = job_id
+                self.current_user_id = pdf_data.get("user_id")
+                self.last_heartbeat = time.time()
+                self.cancel_token = CancellationToken()
+                target_version = None
+                # A job claimed again after its lease ran out was interrupted;
+                # point ids are deterministic, so its stored chunks can be kept
+                resume = pdf_data.get("attempts", 1) > 1
                 try:
-                    # Process the PDF
-                    self.process_pdf(pdf_path, pdf_id)
+                    self.vector_db.ensure_healthy()
+                    # Process the PDF, rebuild its index, or reuse the index of an identical one
+                    if kind == "reindex":
+                        pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+                        old_version = pdf.index_version if pdf else None
+                        target_version = get_index_version()
+                        if old_version == target_version:
+                            self.logger.info(f"PDF {pdf_id} is already on index version {target_version}")
+                            new_version = target_version
+                        else:
+                            new_version = self.reindex_pdf(pdf_path, pdf_id, old_version, resume)
+                    elif pdf_data.get("source_pdf_id"):
+                        source_version = (
+                            db.query(PDF.index_version)
+                            .filter(PDF.id == pdf_data["source_pdf_id"])
+                            .scalar()
+                        )
+                        new_version = self.clone_pdf(
+                            pdf_data["source_pdf_id"], pdf_id, pdf_path, source_version
+                        )
+                    else:
+                        new_version = self.process_pdf(pdf_path, pdf_id, resume)
+
+                    # A cancellation requested after the last heartbeat still applies
+                    if self.queue.is_cancel_requested(job_id):
+                        self.cancel_token.cancel()
+                    self.cancel_token.raise_if_cancelled()
 
                     try:
                         pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
-                        if pdf: 
+                        if pdf is None:
+                            # Deleted without waiting for this job to stop;
+                            # nothing owns the vectors it stored any more
+                            self.logger.warning(
+                                f"PDF {pdf_id} was deleted while being processed, purging its vectors"
+                            )
+                            self.vector_db.delete_embeddings(pdf_id)
+                            self.queue.complete_job(job_id, self.worker_id)
+                        elif not self.queue.complete_job(job_id, self.worker_id):
+                            # The lease ran out and the job was claimed again;
+                            # that run switches the index, and shares this
+                            # run's point ids, so its vectors are left alone
+                            self.logger.warning(
+                                f"Lost job {job_id} for PDF {pdf_id}, leaving its index to the new owner"
+                            )
+                        else:
                             pdf.has_embeddings = True
                             pdf.processing_status = "completed"
+                            # Searches filter on this column, so committing it
+                            # switches the PDF to the new index atomically
+                            pdf.index_version = new_version
                             db.commit()
                             self.logger.info(f"Successfully processed PDF {pdf_id}")
-                        else:
-                            self.logger.error(f"PDF {pdf_id} not found in database")
+                            # Vectors of other versions are no longer searched
+                            if new_version:
+                                self.vector_db.delete_stale_versions(pdf_id, new_version)
                     finally:
                         db.close()
 
+                except IngestionCancelled:
+                    # The PDF is being deleted; drop whatever this job stored
+                    # and let the deleting request know the job has stopped
+                    self.logger.info(f"Ingestion of PDF {pdf_id} cancelled")
+                    self.vector_db.delete_embeddings(pdf_id, target_version)
+                    self.queue.acknowledge_cancel(job_id, self.worker_id)
+
                 except Exception as e:
                     self.logger.error(f"Error processing PDF {pdf_id}: {str(e)}")
                     
                     try:
-                        pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
-                        if pdf:
-                            pdf.has_embeddings = False
-                            pdf.processing_status = "failed"
-                            pdf.processing_error = str(e)
-                            db.commit()
+                        if kind == "reindex":
+                            # Keep serving the previous index and drop the partial new one
+                            pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+                            if target_version and pdf and pdf.index_version != target_version:
+                                self.vector_db.delete_embeddings(pdf_id, target_version)
+                        else:
+                            pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+                            if pdf:
+                                pdf.has_embeddings = False
+                                pdf.processing_status = "failed"
+                                pdf.processing_error = str(e)
+                                db.commit()
                     finally:
                         db.close()
+                    self.queue.fail_job(job_id, self.worker_id, str(e))
 
                 finally:
-                    # Remove the item from the queue
-                    self.queue.pop_from_queue()
-                    self.logger.info(f"Removed PDF {pdf_id} from queue")
-                    
                     # Reset progress tracking variables after processing is complete
+                    self.current_job_id = None
                     self.current_pdf_id = None
+                    self.current_user_id = None
                     self.total_chunks = 0
                     self.processed_chunks = 0
                     self.logger.info("Reset progress tracking variables")
@@ -235,12 +418,25 @@ class PDFEmbeddingPipeline:
     A wrapper class that initializes and manages the PDF embedding pipeline components.
     This class is used as the main entry point for the PDF embedding process.
     """
-    def __init__(self, enable_monitor=True, monitor_interval=10):
+    def __init__(self, enable_monitor=True, monitor_interval=10, num_workers=None):
         self.queue = PDFQueue()
-        self.embedding_batcher = EmbeddingBatcher()
-        self.embedding_batcher.set_num_threads(config.embedding_config.num_threads)
-        self.vector_db = VectorDB()
-        self.worker = PDFWorker(self.queue, self.embedding_batcher, self.vector_db)
+        self.vector_db = get_vector_db()
+        # One embedding cache shared by every worker so a chunk embedded by one
+        # worker is a cache hit for the others
+        self.embedding_cache = EmbeddingCache(
+            capacity=config.embedding_config.cache_capacity,
+            dim=config.embedding_config.vector_size,
+            dtype=config.embedding_config.cache_dtype,
+        )
+        self.num_workers = max(1, num_workers or config.ingestion_config.num_workers)
+        self.workers = []
+        for worker_index in range(self.num_workers):
+            # Batchers keep per-PDF batch state, so each worker needs its own
+            embedding_batcher = EmbeddingBatcher(self.vector_db, self.embedding_cache)
+            embedding_batcher.set_num_threads(config.embedding_config.num_threads)
+            self.workers.append(
+                PDFWorker(self.queue, embedding_batcher, self.vector_db, worker_index)
+            )
         self.logger = logging.getLogger(__name__)
         self.monitor = None
         self.enable_monitor = enable_monitor
@@ -248,7 +444,27 @@ class PDFEmbeddingPipeline:
         
     def start(self):
         """Start the PDF embedding pipeline"""
-        worker_started = self.worker.start()
+        # Pick up work that was interrupted by the last shutdown or crash
+        try:
+            requeued = self.queue.reconcile()
+            if requeued:
+                self.logger.info(f"Re-enqueued {requeued} interrupted PDFs")
+        except Exception as e:
+            self.logger.error(f"Failed to reconcile ingestion queue: {str(e)}")
+
+        # Rebuild indexes made under another chunker or embedding model config
+        if config.ingestion_config.auto_reindex:
+            try:
+                stale = self.queue.enqueue_reindex(get_index_version())
+                if stale:
+                    self.logger.info(f"Queued {stale} PDFs for re-indexing")
+            except Exception as e:
+                self.logger.error(f"Failed to queue re-indexing: {str(e)}")
+
+        started = [worker.start() for worker in self.workers]
+        worker_started = any(started)
+        if worker_started:
+            self.logger.info(f"Started {sum(started)} of {self.num_workers} PDF workers")
         
         # Start the monitor if enabled
         if worker_started and self.enable_monitor:
@@ -272,8 +488,9 @@ class PDFEmbeddingPipeline:
             except Exception as e:
                 self.logger.error(f"Error stopping monitor: {str(e)}")
                 
-        # Stop the worker
-        return self.worker.stop()
+        # Stop the workers
+        stopped = [worker.stop() for worker in self.workers]
+        return any(stopped)
         
     def get_queue_status(self):
         """Get the status of the PDF processing queue"""
@@ -283,22 +500,95 @@ class PDFEmbeddingPipeline:
         """Get detailed progress information about the PDF processing pipeline"""
         queue_status = self.queue.get_queue_status()
         
-        # Get current processing progress if available
-        current_progress = {
-            "current_pdf_id": self.worker.current_pdf_id,
-            "total_chunks": self.worker.total_chunks,
-            "processed_chunks": self.worker.processed_chunks,
-            "progress_percentage": 0
-        }
-        
-        if self.worker.total_chunks > 0:
-            current_progress["progress_percentage"] = (self.worker.processed_chunks / self.worker.total_chunks) * 100
+        # Get per-worker progress
+        workers = [worker.get_progress() for worker in self.workers]
+        active = [w for w in workers if w["current_pdf_id"]]
+        total_chunks = sum(w["total_chunks"] for w in active)
+        processed_chunks = sum(w["processed_chunks"] for w in active)
             
         # Combine all information
         detailed_progress = {
             "queue_status": queue_status,
-            "current_progress": current_progress,
-            "worker_running": self.worker.is_running
+            "workers": workers,
+            "active_workers": len(active),
+            "total_chunks": total_chunks,
+            "processed_chunks": processed_chunks,
+            "progress_percentage": (processed_chunks / total_chunks) * 100 if total_chunks > 0 else 0,
+            "worker_running": any(w["running"] for w in workers),
+            "embedding_cache": self.embedding_cache.get_stats(),
         }
         
         return detailed_progress
+
+
+def main():
+    """
+    Run ingestion workers as a standalone process.
+
+    Workers claim jobs from the shared job store, so any number of these
+    processes (on any number of hosts using the same database and vector DB)
+    can run next to API processes started with INGESTION_IN_API=false.
+
+    Usage:
+        python -m src.rag.index.worker [--workers N] [--no-monitor]
+    """
+    import argparse
+    import signal
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Run PDF ingestion workers")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="PDFs ingested concurrently (default: ingestion_config.num_workers)",
+    )
+    parser.add_argument(
+        "--no-monitor", action="store_true", help="Do not log pipeline progress"
+    )
+    parser.add_argument(
+        "--monitor-interval", type=int, default=10, help="Seconds between progress logs"
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logger = logging.getLogger(__name__)
+
+    # Register every model with the metadata before creating missing tables
+    from ...models import highlight, job, pdf, user  # noqa: F401
+    from ...models.base import Base
+    from ...utils.database import engine, upgrade_schema
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(Base.metadata, engine)
+
+    pipeline = PDFEmbeddingPipeline(
+        enable_monitor=not args.no_monitor,
+        monitor_interval=args.monitor_interval,
+        num_workers=args.workers,
+    )
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    if not pipeline.start():
+        logger.error("No ingestion worker could be started")
+        raise SystemExit(1)
+    logger.info(f"Ingestion process {socket.gethostname()}:{os.getpid()} running")
+
+    stop_event.wait()
+    pipeline.stop()
+    logger.info("Ingestion process stopped")
+
+
+if __name__ == "__main__":
+    main()
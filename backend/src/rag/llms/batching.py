@@ -0,0 +1,248 @@
+"""
+Packing of embedding inputs into provider requests that respect the provider's
+item and token limits.
+
+Token counts are estimated from character length, deliberately on the high
+side, so a packed request never trips the provider's "too many tokens" error.
+Chunks longer than the per-input limit are split up front and their piece
+embeddings averaged back into one vector. A request the provider still rejects
+as too large is split in half and retried, down to single inputs.
+"""
+import asyncio
+import logging
+import math
+import threading
+from typing import AsyncContextManager, Awaitable, Callable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Conservative characters-per-token ratio; real tokenizers average ~4 on prose
+CHARS_PER_TOKEN = 3
+
+
+class BatchTooLargeError(Exception):
+    """Raised by a provider request whose batch exceeds the provider's token limit"""
+
+
+class ProcessSemaphore:
+    """
+    Async context manager over a threading semaphore, so one limit holds
+    across every event loop and thread in the process. Waiters poll instead
+    of blocking a thread, which keeps executor threads free for the requests
+    already holding a slot.
+    """
+
+    def __init__(self, value: int, poll_interval: float = 0.005, max_poll_interval: float = 0.05):
+        self._semaphore = threading.BoundedSemaphore(value)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    async def __aenter__(self) -> "ProcessSemaphore":
+        delay = self.poll_interval
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore.release()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens a provider will count for `text`"""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def split_oversized(text: str, max_tokens: int) -> List[str]:
+    """
+    Split `text` into pieces that each fit in `max_tokens`, preferring to cut
+    at whitespace.
+
+    Returns:
+        [text] unchanged if it already fits
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = text.rfind(" ", start + max_chars // 2, end)
+            if cut > start:
+                end = cut
+        piece = text[start:end].strip()
+        if piece:
+            pieces.append(piece)
+        start = end
+    return pieces
+
+
+def pack_batches(
+    token_counts: List[int], max_items: int, max_tokens: int
+) -> List[Tuple[int, int]]:
+    """
+    Greedily group consecutive inputs into batches under both limits.
+
+    Args:
+        token_counts: Estimated tokens of each input, each at most `max_tokens`
+        max_items: Maximum inputs per request
+        max_tokens: Maximum total tokens per request
+
+    Returns:
+        List of (start, end) index ranges, one per request
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if i > start and (i - start >= max_items or batch_tokens + tokens > max_tokens):
+            batches.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def _split_inputs(texts: List[str], max_input_tokens: int) -> Tuple[List[str], List[int]]:
+    """Flatten texts into pieces that fit the per-input limit, and each piece's owner"""
+    pieces = []
+    owners = []
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        split = split_oversized(text, max_input_tokens)
+        if len(split) > 1:
+            logger.info(f"Split oversized input of {len(text)} chars into {len(split)} pieces")
+        pieces.extend(split)
+        owners.extend([index] * len(split))
+    return pieces, owners
+
+
+def _checked(vectors: List[List[float]], batch: List[str]) -> List[List[float]]:
+    if len(vectors) != len(batch):
+        logger.error(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+        return [[] for _ in batch]
+    return vectors
+
+
+def _embed_splitting(
+    embed_batch: Callable[[List[str]], List[List[float]]], batch: List[str]
+) -> List[List[float]]:
+    """Embed one batch, halving it for as long as the provider rejects it as too large"""
+    try:
+        return _checked(embed_batch(batch), batch)
+    except BatchTooLargeError as e:
+        if len(batch) == 1:
+            logger.error(f"Provider rejected a single input as too large: {str(e)}")
+            return [[]]
+        logger.warning(f"Provider rejected a batch of {len(batch)} inputs as too large, splitting it")
+        half = len(batch) // 2
+        return _embed_splitting(embed_batch, batch[:half]) + _embed_splitting(
+            embed_batch, batch[half:]
+        )
+
+
+def _merge_pieces(
+    count: int,
+    owners: List[int],
+    piece_embeddings: List[List[float]],
+    token_counts: List[int],
+) -> List[List[float]]:
+    """Reassemble one vector per text; split texts get the token-weighted mean of their pieces"""
+    grouped = [[] for _ in range(count)]
+    for owner, vector, tokens in zip(owners, piece_embeddings, token_counts):
+        grouped[owner].append((vector, tokens))
+
+    embeddings = []
+    for parts in grouped:
+        if not parts or any(not vector for vector, _ in parts):
+            embeddings.append([])
+        elif len(parts) == 1:
+            embeddings.append(list(parts[0][0]))
+        else:
+            vectors = np.array([vector for vector, _ in parts], dtype=np.float32)
+            weights = np.array([tokens for _, tokens in parts], dtype=np.float32)
+            embeddings.append(np.average(vectors, axis=0, weights=weights).tolist())
+    return embeddings
+
+
+def embed_in_packed_batches(
+    texts: List[str],
+    embed_batch: Callable[[List[str]], List[List[float]]],
+    max_items: int,
+    max_batch_tokens: int,
+    max_input_tokens: int,
+) -> List[List[float]]:
+    """
+    Embed `texts` with as few provider calls as the limits allow.
+
+    Args:
+        texts: Texts to embed
+        embed_batch: Makes one provider request; must return one vector per
+            input, or empty vectors for inputs that failed, and raise
+            BatchTooLargeError if the provider rejects the batch as too large
+        max_items: Provider's maximum inputs per request
+        max_batch_tokens: Provider's maximum total tokens per request
+        max_input_tokens: Provider's maximum tokens per input
+
+    Returns:
+        One vector per input text, aligned with `texts`; empty for blank or
+        failed inputs
+    """
+    pieces, owners = _split_inputs(texts, min(max_input_tokens, max_batch_tokens))
+    token_counts = [estimate_tokens(piece) for piece in pieces]
+    piece_embeddings = []
+    for start, end in pack_batches(token_counts, max_items, max_batch_tokens):
+        piece_embeddings.extend(_embed_splitting(embed_batch, pieces[start:end]))
+    return _merge_pieces(len(texts), owners, piece_embeddings, token_counts)
+
+
+async def aembed_in_packed_batches(
+    texts: List[str],
+    aembed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+    max_items: int,
+    max_batch_tokens: int,
+    max_input_tokens: int,
+    semaphore: AsyncContextManager,
+) -> List[List[float]]:
+    """
+    Async variant of embed_in_packed_batches that sends the packed requests
+    concurrently, at most as many at a time as `semaphore` allows. Results are
+    returned in input order.
+
+    Args:
+        aembed_batch: Coroutine function making one provider request
+        semaphore: Caps requests in flight; share a ProcessSemaphore between
+            calls to enforce a provider-wide limit across event loops
+    """
+    pieces, owners = _split_inputs(texts, min(max_input_tokens, max_batch_tokens))
+    token_counts = [estimate_tokens(piece) for piece in pieces]
+
+    async def send(batch: List[str]) -> List[List[float]]:
+        try:
+            async with semaphore:
+                return _checked(await aembed_batch(batch), batch)
+        except BatchTooLargeError as e:
+            if len(batch) == 1:
+                logger.error(f"Provider rejected a single input as too large: {str(e)}")
+                return [[]]
+            logger.warning(f"Provider rejected a batch of {len(batch)} inputs as too large, splitting it")
+            half = len(batch) // 2
+            first, second = await asyncio.gather(send(batch[:half]), send(batch[half:]))
+            return first + second
+
+    results = await asyncio.gather(
+        *(
+            send(pieces[start:end])
+            for start, end in pack_batches(token_counts, max_items, max_batch_tokens)
+        )
+    )
+    piece_embeddings = [vector for vectors in results for vector in vectors]
+    return _merge_pieces(len(texts), owners, piece_embeddings, token_counts)
@@ -5,6 +5,7 @@ from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 from .llm import LLM
+from .batching import embed_in_packed_batches
 
 load_dotenv()
 
@@ -12,6 +13,12 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 
 class GeminiLLM(LLM):
+    # text-embedding-004 accepts 2048 tokens per input and 100 inputs per request
+    embedding_max_batch_items = 100
+    embedding_max_batch_tokens = 20000
+    embedding_max_input_tokens = 2000
+    embedding_max_concurrency = 8
+
     def __init__(self, model: str = "gemini-2.0-flash", api_key: str = None):
         """
         Initialize the GeminiLLM with model and API key.
@@ -93,9 +100,30 @@ class GeminiLLM(LLM):
             print(f"Error streaming from Gemini API: {str(e)}")
             yield f"Error: {str(e)}"
     
+    def _embed_request(self, texts: List[str]) -> List[List[float]]:
+        """Embed one packed batch; failed requests yield empty vectors"""
+        try:
+            response = self.client.models.embed_content(model=self.embedding_model, contents=texts)
+            return [embedding.values for embedding in response.embeddings]
+        except Exception as e:
+            print(f"Error generating embeddings with Gemini: {str(e)}")
+            return [[] for _ in texts]
+
+    async def _aembed_request(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of _embed_request"""
+        try:
+            response = await self.client.aio.models.embed_content(
+                model=self.embedding_model, contents=texts
+            )
+            return [embedding.values for embedding in response.embeddings]
+        except Exception as e:
+            print(f"Error generating embeddings with Gemini: {str(e)}")
+            return [[] for _ in texts]
+
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Generate embeddings for a list of texts using Gemini's embedding model.
+        Texts are packed into requests within Gemini's item and token limits.
         
         Args:
             texts: List of texts to generate embeddings for
@@ -103,10 +131,10 @@ class GeminiLLM(LLM):
         Returns:
             List of embedding vectors
         """
-        try:
-            response = self.client.models.embed_content(model=self.embedding_model, contents=texts)
-            return [embedding.values for embedding in response.embeddings]
-           
-        except Exception as e:
-            print(f"Error generating embeddings with Gemini: {str(e)}")
-            return [] 
\ No newline at end of file
+        return embed_in_packed_batches(
+            texts,
+            self._embed_request,
+            max_items=self.embedding_max_batch_items,
+            max_batch_tokens=self.embedding_max_batch_tokens,
+            max_input_tokens=self.embedding_max_input_tokens,
+        )
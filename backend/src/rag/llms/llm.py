@@ -1,8 +1,24 @@
 # Define the LLM class with completion and stream methods
-from typing import AsyncGenerator
+import asyncio
+import threading
+from typing import AsyncGenerator, Dict, List
+
+from .batching import ProcessSemaphore, aembed_in_packed_batches
+
+# One embedding limit per provider class, shared by every instance, event loop
+# and thread in the process (ingestion workers each run their own loop)
+_embedding_limits: Dict[type, ProcessSemaphore] = {}
+_embedding_limits_lock = threading.Lock()
 
 
 class LLM:
+    # Embedding request limits, used to pack inputs into as few calls as possible
+    embedding_max_batch_items: int = 100
+    embedding_max_batch_tokens: int = 8000
+    embedding_max_input_tokens: int = 2048
+    # Embedding requests kept in flight at once by the async API, process-wide
+    embedding_max_concurrency: int = 4
+
     def __init__(self, model: str, api_key: str):
         self.model = model
         self.api_key = api_key
@@ -16,3 +32,42 @@ class LLM:
         self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7
     ) -> AsyncGenerator[str, None]:
         pass
+
+    def _embed_request(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError(f"{type(self).__name__} does not support embeddings")
+
+    async def _aembed_request(self, texts: List[str]) -> List[List[float]]:
+        """Embed one packed batch; providers without an async client run the sync one in a thread"""
+        return await asyncio.to_thread(self._embed_request, texts)
+
+    def _embedding_semaphore(self) -> ProcessSemaphore:
+        provider = type(self)
+        with _embedding_limits_lock:
+            semaphore = _embedding_limits.get(provider)
+            if semaphore is None:
+                semaphore = ProcessSemaphore(self.embedding_max_concurrency)
+                _embedding_limits[provider] = semaphore
+        return semaphore
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings asynchronously, keeping up to
+        ``embedding_max_concurrency`` packed requests in flight across every
+        concurrent caller in the process, whichever event loop it runs on.
+
+        Args:
+            texts: List of texts to generate embeddings for
+
+        Returns:
+            List of embedding vectors in input order, empty for failed inputs
+        """
+        if not texts:
+            return []
+        return await aembed_in_packed_batches(
+            texts,
+            self._aembed_request,
+            max_items=self.embedding_max_batch_items,
+            max_batch_tokens=self.embedding_max_batch_tokens,
+            max_input_tokens=self.embedding_max_input_tokens,
+            semaphore=self._embedding_semaphore(),
+        )
@@ -1,15 +1,33 @@
 import os
+import time
+import asyncio
+import logging
 from typing import AsyncGenerator
 from mistralai import Mistral
 from fastapi import HTTPException
 from .llm import LLM
+from .batching import BatchTooLargeError, embed_in_packed_batches
 from dotenv import load_dotenv
 from ...config import config
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def _is_batch_too_large(error: Exception) -> bool:
+    """Whether Mistral rejected a request for exceeding its token limit"""
+    return "Too many tokens" in str(error)
+
 
 class MistralLLM(LLM):
+    # mistral-embed accepts 8192 tokens per input and 16384 per request
+    embedding_max_batch_items = 128
+    embedding_max_batch_tokens = 16000
+    embedding_max_input_tokens = 8000
+    embedding_max_concurrency = 8
+    max_retries = 3
+
     def __init__(self, model: str = "mistral-large-latest", api_key: str = None):
         """
         Initialize the MistralLLM with model and API key.
@@ -88,12 +106,54 @@ class MistralLLM(LLM):
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Mistral API error: {str(e)}")
 
-    
+
+    def _embed_request(self, batch: list[str]) -> list[list[float]]:
+        """
+        Embed one packed batch, retrying transient errors with exponential backoff
+
+        Raises:
+            BatchTooLargeError: Mistral counted more tokens than the estimate;
+                retrying the same batch cannot succeed, so the caller splits it
+        """
+        for retry in range(self.max_retries):
+            try:
+                response = self.client.embeddings.create(model=self.embedding_model, inputs=batch)
+                return [data.embedding for data in response.data]
+            except Exception as e:
+                if _is_batch_too_large(e):
+                    raise BatchTooLargeError(str(e)) from e
+                logger.error(f"Error generating embeddings (attempt {retry+1}/{self.max_retries}): {str(e)}")
+                if retry < self.max_retries - 1:
+                    wait_time = 2 ** retry
+                    logger.info(f"Retrying in {wait_time} seconds...")
+                    time.sleep(wait_time)
+        # Add empty embeddings to maintain alignment
+        logger.error(f"Failed to generate embeddings after {self.max_retries} retries")
+        return [[] for _ in batch]
+
+    async def _aembed_request(self, batch: list[str]) -> list[list[float]]:
+        """Async counterpart of _embed_request"""
+        for retry in range(self.max_retries):
+            try:
+                response = await self.client.embeddings.create_async(
+                    model=self.embedding_model, inputs=batch
+                )
+                return [data.embedding for data in response.data]
+            except Exception as e:
+                if _is_batch_too_large(e):
+                    raise BatchTooLargeError(str(e)) from e
+                logger.error(f"Error generating embeddings (attempt {retry+1}/{self.max_retries}): {str(e)}")
+                if retry < self.max_retries - 1:
+                    await asyncio.sleep(2 ** retry)
+        logger.error(f"Failed to generate embeddings after {self.max_retries} retries")
+        return [[] for _ in batch]
+
     def get_embeddings(self, chunks: list[str]) -> list[list[float]]:
         """
         Uses the Mistral Embed model to generate embeddings in batch.
         Each input chunk is embedded into a vector of size 1024.
-        Rate limited to MAX_CALLS_PER_MINUTE API calls per minute.
+        Chunks are packed into requests that stay under Mistral's item and
+        token limits, and oversized chunks are split up front.
 
         Args:
             chunks (List[str]): A list of text chunks to embed.
@@ -101,60 +161,13 @@ class MistralLLM(LLM):
         Returns:
             List[List[float]]: A list of embedding vectors, one per input chunk.
         """
-        import time
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        all_embeddings = []
-        max_retries = 3
-        
-        # If no chunks, return empty list
         if not chunks:
             return []
 
-        for i in range(0, len(chunks), config.embedding_config.batch_size):
-            batch = chunks[i : i + config.embedding_config.batch_size]
-            
-            # Skip empty chunks
-            batch = [chunk for chunk in batch if chunk and len(chunk.strip()) > 0]
-            if not batch:
-                continue
-                
-            # Try with retries and exponential backoff
-            for retry in range(max_retries):
-                try:
-                    logger.info(f"Generating embeddings for batch {i//config.embedding_config.batch_size + 1} (size: {len(batch)})")
-                    response = self.client.embeddings.create(model=self.embedding_model, inputs=batch)
-                    batch_embeddings = [data.embedding for data in response.data]
-                    all_embeddings.extend(batch_embeddings)
-                    break  # Success, exit retry loop
-                except Exception as e:
-                    logger.error(f"Error generating embeddings (attempt {retry+1}/{max_retries}): {str(e)}")
-                    if "Too many tokens in batch" in str(e) and config.embedding_config.batch_size > 1:
-                        # If token limit error, process one by one
-                        logger.info("Token limit exceeded, processing chunks individually")
-                        for single_chunk in batch:
-                            try:
-                                single_response = self.client.embeddings.create(
-                                    model=self.embedding_model, 
-                                    inputs=[single_chunk]
-                                )
-                                all_embeddings.append(single_response.data[0].embedding)
-                                # Small delay to avoid rate limits
-                                time.sleep(0.1)
-                            except Exception as single_e:
-                                logger.error(f"Error with single chunk: {str(single_e)}")
-                                # Add empty embedding to maintain alignment
-                                all_embeddings.append([])
-                        break  # Exit retry loop after individual processing
-                    elif retry < max_retries - 1:
-                        # Wait before retrying (exponential backoff)
-                        wait_time = 2 ** retry
-                        logger.info(f"Retrying in {wait_time} seconds...")
-                        time.sleep(wait_time)
-                    else:
-                        # Last retry failed, add empty embeddings to maintain alignment
-                        logger.error(f"Failed to generate embeddings after {max_retries} retries")
-                        all_embeddings.extend([[] for _ in batch])
-
-        return all_embeddings
\ No newline at end of file
+        return embed_in_packed_batches(
+            chunks,
+            self._embed_request,
+            max_items=self.embedding_max_batch_items,
+            max_batch_tokens=self.embedding_max_batch_tokens,
+            max_input_tokens=self.embedding_max_input_tokens,
+        )
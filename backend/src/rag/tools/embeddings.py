@@ -1,9 +1,19 @@
 # implement the tool class for the embeddings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import logging
 from .tool_interface import ToolInterface
-from ..index.store.embeddings import VectorDB
-from ..index.utils.embed import generate_embeddings_batch
+from ..index.store.async_embeddings import AsyncVectorDB
+from ..index.store.factory import get_async_vector_db
+from ..index.utils.cache import QueryEmbeddingCache, RetrievalCache
+from ..index.utils.embed import (
+    agenerate_embeddings_batch,
+    get_embedding_model_id,
+    query_cache_key,
+)
+from ...models.pdf import PDF
+from ...utils.database import SessionLocal
+from ...config import config
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -22,17 +32,56 @@ embeddings_tool = ToolInterface(
     - Use atleast 50 results to answer the user's query.
     - When user asks for a specific topic or a general question, You should use this tool to answer the user's query.
     - When user asks for document/pdf in general, Use summary or table of contents to answer the user's query.
+    - When the question is about a specific chapter or page range, pass start_page and end_page (from the table of contents) to search only those pages.
     
     The tool converts queries into vector embeddings and finds the most semantically relevant sections in the document.
+    Every result includes the start_page and end_page it was taken from.
     """
 )
 
 # Set the injectable parameters for this tool
-embeddings_tool.set_injectable_params({"vector_db"})
-embeddings_tool.set_injectable_params({"pdf_id"})
+embeddings_tool.set_injectable_params({"vector_db", "pdf_id"})
+
+# Query vectors shared by every chat of the process
+query_embedding_cache = QueryEmbeddingCache(
+    capacity=config.embedding_config.query_cache_capacity,
+    ttl_seconds=config.embedding_config.query_cache_ttl_seconds,
+)
+# Search results shared by every chat of the process
+retrieval_cache = RetrievalCache(
+    capacity=config.embedding_config.retrieval_cache_capacity,
+    ttl_seconds=config.embedding_config.retrieval_cache_ttl_seconds,
+)
+
+
+async def embed_query(query: str) -> List[float]:
+    """Embedding of a search query, from the query cache when it was embedded recently"""
+    key = query_cache_key(query, get_embedding_model_id())
+
+    async def embed() -> List[float]:
+        return (await agenerate_embeddings_batch([query]))[0]
+
+    return await query_embedding_cache.get_or_embed(key, embed)
+
+
+def get_live_index_version(pdf_id: str) -> Optional[str]:
+    """Index version the PDF's searches are served from (None before versioning)"""
+    db = SessionLocal()
+    try:
+        return db.query(PDF.index_version).filter(PDF.id == pdf_id).scalar()
+    finally:
+        db.close()
+
 
 @embeddings_tool.register_function
-def search_embeddings(pdf_id: int, query: str, top_k: int = 5, vector_db: VectorDB = None) -> Dict[str, Any]:
+async def search_embeddings(
+    pdf_id: int,
+    query: str,
+    top_k: int = 5,
+    start_page: int = None,
+    end_page: int = None,
+    vector_db: AsyncVectorDB = None,
+) -> Dict[str, Any]:
     """
     Search for similar content using vector embeddings
     
@@ -40,25 +89,46 @@ def search_embeddings(pdf_id: int, query: str, top_k: int = 5, vector_db: Vector
         pdf_id: ID of the PDF document (injected)
         query: Search query text
         top_k: Number of results to return (default: 5)
+        start_page: Optional first page of the range to search in; without
+            end_page the search runs to the last page
+        end_page: Optional last page of the range to search in
         
     Returns:
         Dictionary with search results
     """
     try:
-        if vector_db is None:
-            raise ValueError("Vector database is required but not provided")
+        vector_db = vector_db or get_async_vector_db()
         
         # Log the incoming query for debugging
         logger.debug(f"Embedding search query: pdf_id={pdf_id}, query='{query}', top_k={top_k}")
         
         # First, convert the query string to an embedding vector
-        query_embedding = generate_embeddings_batch([query])[0]
+        query_embedding = await embed_query(query)
         
         # Log successful embedding generation
         logger.debug(f"Successfully generated embedding vector of length {len(query_embedding)}")
         
-        # Now search using the embedding vector
-        results = vector_db.search_embeddings(pdf_id, query_embedding, top_k)
+        # Restrict the search to a page window if one was requested; without
+        # an end_page the window runs to the end of the document
+        page_range = None
+        if start_page is not None or end_page is not None:
+            page_range = (
+                int(start_page or 1),
+                int(end_page) if end_page is not None else None,
+            )
+        
+        # Now search using the embedding vector, on the PDF's live index only
+        index_version = await asyncio.to_thread(get_live_index_version, pdf_id)
+        results = await retrieval_cache.get_or_search(
+            pdf_id,
+            index_version,
+            query_embedding,
+            top_k,
+            page_range,
+            lambda: vector_db.search_embeddings(
+                pdf_id, query_embedding, top_k, page_range, index_version
+            ),
+        )
         
         # Log the search results
         logger.debug(f"Search results: {results}")
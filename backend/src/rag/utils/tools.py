@@ -2,6 +2,8 @@
 Utility functions for working with tools in the RAG system.
 """
 from typing import Dict, List, Any, AsyncGenerator, Optional, Tuple
+import asyncio
+import inspect
 import json
 import logging
 from ..tools import get_function_descriptions, get_all_tool_interfaces
@@ -221,9 +223,10 @@ def parse_tool_calls(llm_response: str) -> List[Dict[str, Any]]:
         return tool_calls
  
 
-def execute_tool_call(tool_call: Dict[str, Any], pdf_id: int, db: Optional[Any] = None, vector_db: Optional[Any] = None) -> Dict[str, Any]:
+async def execute_tool_call(tool_call: Dict[str, Any], pdf_id: int, db: Optional[Any] = None, vector_db: Optional[Any] = None) -> Dict[str, Any]:
     """
-    Execute a single tool call with dependency injection.
+    Execute a single tool call with dependency injection. Async tool
+    functions are awaited.
     
     Args:
         tool_call: Dictionary containing tool, function, and parameters
@@ -280,6 +283,8 @@ def execute_tool_call(tool_call: Dict[str, Any], pdf_id: int, db: Optional[Any]
         print(f"Execution parameters: {execution_params}")
         # Execute the function with parameters
         func_result = func(**execution_params)
+        if inspect.isawaitable(func_result):
+            func_result = await func_result
         print(f"Function result: {func_result}")
         # Update result
         result["success"] = True
@@ -347,9 +352,11 @@ async def run_with_tools(
     # Execute tool calls
     tool_results = []
     if tool_calls:
-        for tool_call in tool_calls:
-            result = execute_tool_call(tool_call, pdf_id=pdf_id, db=db, vector_db=vector_db)
-            tool_results.append(result)
+        # Searches of the different tool calls wait on Qdrant concurrently
+        tool_results = list(await asyncio.gather(*[
+            execute_tool_call(tool_call, pdf_id=pdf_id, db=db, vector_db=vector_db)
+            for tool_call in tool_calls
+        ]))
         
     # Generate the second prompt with tool results and conversation history
     second_prompt = generate_tool_results_prompt(
@@ -13,14 +13,14 @@ from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
-import shutil
 from ...utils.database import get_db
 from ...models.pdf import PDF
 from ...utils.auth import get_current_user
-from ...utils.common import generate_pdf_thumbnail
-from ...rag.index.worker import PDFEmbeddingPipeline
+from ...utils.common import generate_pdf_thumbnail, save_file_with_hash
 from ...rag.index.queue import PDFQueue
-from ...rag.index.store.embeddings import VectorDB
+from ...rag.index.store.factory import get_vector_db
+from ...rag.tools.embeddings import retrieval_cache
+from ...config import config
 from pydantic import BaseModel
 import fitz
 import logging
@@ -28,14 +28,9 @@ import logging
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize the embedding pipeline
-pdf_pipeline = PDFEmbeddingPipeline()
-
-# Use the queue from the pipeline instead of creating a new one
-pdf_queue = pdf_pipeline.queue
-
-# Initialize vector database connection
-vector_db = VectorDB()
+# The API only enqueues jobs in the shared job store; ingestion workers run
+# either in main.py's startup hook or as `python -m src.rag.index.worker`
+pdf_queue = PDFQueue()
 
 thumbnail_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "thumbnails")
 
@@ -49,6 +44,8 @@ class PDFResponse(BaseModel):
     file_size: int
     total_pages: int = None
     current_page: int = 1
+    # Only set on upload: estimated seconds until the PDF is ready to chat with
+    estimated_ready_seconds: Optional[float] = None
 
 
 class PDFUpdateRequest(BaseModel):
@@ -99,19 +96,32 @@ def upload_pdf(
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Invalid file type")
 
+    # Refuse new work while ingestion is too far behind, before touching the disk
+    retry_after = pdf_queue.check_admission(current_user.id)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many PDFs are waiting to be processed, please try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
     filename = file.filename
 
     # Create upload directory if it doesn't exist
     upload_dir = os.path.join(os.getcwd(), "uploads")
     os.makedirs(upload_dir, exist_ok=True)
 
-    # Save the file
+    # Save the file, hashing it on the way
     file_path = os.path.join(upload_dir, filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Get file size
-    file_size = os.path.getsize(file_path)
+    file_size, content_hash = save_file_with_hash(file.file, file_path)
+
+    # An identical document that is already indexed lets us skip extraction,
+    # the table of contents LLM call and every embedding request
+    duplicate_of = db.query(PDF).filter(
+        PDF.content_hash == content_hash,
+        PDF.processing_status == "completed",
+        PDF.has_embeddings == True,  # noqa: E712
+    ).first()
 
     # Generate thumbnail
     thumbnail_path = generate_pdf_thumbnail(thumbnail_dir, file_path)
@@ -133,16 +143,28 @@ def upload_pdf(
         description=description,
         user_id=current_user.id,
         has_embeddings=False,
-        total_pages=total_pages
+        total_pages=total_pages,
+        content_hash=content_hash,
+        table_of_contents=duplicate_of.table_of_contents if duplicate_of else None,
     )
 
     db.add(pdf)
     db.commit()
     db.refresh(pdf)
 
-    pdf_queue.add_to_queue(pdf.id, file_path, db)
+    if duplicate_of:
+        logger.info(f"PDF {pdf.id} is identical to PDF {duplicate_of.id}, reusing its index")
+    # Estimate before queueing, so the backlog does not yet include this PDF
+    estimated_ready_seconds = pdf_queue.estimate_ready_seconds(
+        0 if duplicate_of else (total_pages or 0)
+    )
+    pdf_queue.add_to_queue(
+        pdf.id, file_path, source_pdf_id=duplicate_of.id if duplicate_of else None
+    )
 
-    return pdf
+    response = PDFResponse.model_validate(pdf, from_attributes=True)
+    response.estimated_ready_seconds = estimated_ready_seconds
+    return response
 
 
 @router.get("/{pdf_id}")
@@ -162,6 +184,10 @@ def get_pdf(
     if not os.path.exists(pdf.file_path):
         raise HTTPException(status_code=404, detail="PDF file not found")
 
+    # The user is about to read (and chat with) this PDF, so index it next
+    if pdf.processing_status == "pending":
+        pdf_queue.boost(pdf.id)
+
     return FileResponse(
         pdf.file_path, media_type="application/pdf", filename=pdf.filename
     )
@@ -206,6 +232,11 @@ def delete_pdf(
         raise HTTPException(status_code=404, detail="PDF not found or you don't have access to it")
     
     logger.info(f"Deleting PDF {pdf_id}: {pdf.title}")
+
+    # Stop any ingestion of this PDF first, so a running job cannot store
+    # vectors after they are purged below
+    if not pdf_queue.cancel_jobs(pdf_id, timeout=config.ingestion_config.cancel_timeout):
+        logger.warning(f"Ingestion of PDF {pdf_id} did not stop in time, its worker will purge its vectors")
     
     # Delete the actual PDF file if it exists
     if pdf.file_path and os.path.exists(pdf.file_path):
@@ -228,7 +259,8 @@ def delete_pdf(
     
     # Delete embeddings from vector database
     try:
-        vector_db.delete_embeddings(pdf_id)
+        get_vector_db().delete_embeddings(pdf_id)
+        retrieval_cache.invalidate(pdf_id)
         logger.info(f"Deleted embeddings for PDF {pdf_id}")
     except Exception as e:
         logger.error(f"Error deleting embeddings for PDF {pdf_id}: {str(e)}")
@@ -7,8 +7,10 @@ from ...utils.database import get_db
 from ...models.pdf import PDF
 from ...rag.utils.tools import run_with_tools, generate_no_tools_prompt
 from ...rag.llms.client import stream_llm
-from ...rag.index.store.embeddings import get_vector_db, VectorDB
+from ...rag.index.store.async_embeddings import AsyncVectorDB
+from ...rag.index.store.factory import get_async_vector_db
 from ...rag.tools.content import get_page_content
+from ...rag.tools.embeddings import query_embedding_cache, retrieval_cache
 from ...utils.auth import get_current_user
 from ...rag.tools.summary import get_key_sentences_for_summary
 from ...rag.llms.prompts import generate_welcome_chat_prompt
@@ -37,7 +39,7 @@ async def chat(
     request: ChatRequest,
     pdf_id: str = Path(..., description="The ID of the PDF to chat with"), 
     db: Session = Depends(get_db), 
-    vector_db: VectorDB = Depends(get_vector_db),
+    vector_db: AsyncVectorDB = Depends(get_async_vector_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -143,3 +145,14 @@ async def chat(
         logger.exception(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/cache/stats")
+async def cache_stats(current_user: User = Depends(get_current_user)) -> Dict[str, Any]:
+    """
+    Hit rates and latency of this process's search caches: query embeddings
+    and retrieval results
+    """
+    return {
+        "query_embeddings": query_embedding_cache.get_stats(),
+        "retrieval": retrieval_cache.get_stats(),
+    }
@@ -1,4 +1,5 @@
 import fitz  # PyMuPDF
+import hashlib
 import os
 from PIL import Image
 import time
@@ -6,6 +7,31 @@ import uuid
 
 
 
+def save_file_with_hash(source, destination_path, chunk_size=1024 * 1024):
+    """
+    Copy a file object to disk while computing its SHA-256 in the same pass.
+
+    Args:
+        source: Readable binary file object
+        destination_path: Where to write the file
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        Tuple of (file size in bytes, hex SHA-256 digest)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(destination_path, "wb") as buffer:
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            hasher.update(data)
+            buffer.write(data)
+            size += len(data)
+    return size, hasher.hexdigest()
+
+
 def generate_pdf_thumbnail(thumbnail_dir, pdf_file):
     try:
 
@@ -1,7 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine, inspect, literal, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # Get database URL from environment variable or use a default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
 
@@ -37,3 +41,43 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def upgrade_schema(metadata: MetaData, bind: Engine = engine) -> None:
+    """
+    Add the columns and indexes models gained after their table was created.
+    create_all only creates missing tables, so without this an existing
+    database fails every query touching a new column. Safe to run repeatedly.
+
+    Args:
+        metadata: Metadata with every model registered
+        bind: Engine of the database to upgrade
+    """
+    inspector = inspect(bind)
+    dialect = bind.dialect
+    quote = dialect.identifier_preparer.quote
+    with bind.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.primary_key:
+                    continue
+                ddl = f"{quote(column.name)} {column.type.compile(dialect=dialect)}"
+                default = column.default
+                if default is not None and default.is_scalar:
+                    value = literal(default.arg, column.type).compile(
+                        dialect=dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    ddl += f" DEFAULT {value}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {ddl}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    logger.info(f"Added index {index.name} on {table.name}")
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import unittest
+
+from src.rag.index.utils.cache import EmbeddingCache, QueryEmbeddingCache, RetrievalCache
+from src.rag.index.utils.embed import embedding_cache_key, query_cache_key
+
+
+def key(i):
+    return embedding_cache_key(f"chunk {i}", "test:model:8")
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    """Test the sharded numpy-backed embedding cache."""
+
+    def test_round_trip_and_counters(self):
+        cache = EmbeddingCache(capacity=32, dim=8, num_shards=4)
+        vector = [float(i) / 8 for i in range(8)]
+        cache.put(key(1), vector)
+
+        self.assertEqual(cache.get(key(1)), vector)
+        self.assertIsNone(cache.get(key(2)))
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+    def test_evicts_least_recently_used_per_shard(self):
+        cache = EmbeddingCache(capacity=2, dim=8, num_shards=1)
+        cache.put(key(1), [1.0] * 8)
+        cache.put(key(2), [2.0] * 8)
+        cache.get(key(1))
+        cache.put(key(3), [3.0] * 8)
+
+        self.assertIsNotNone(cache.get(key(1)))
+        self.assertIsNone(cache.get(key(2)))
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_skips_vectors_of_the_wrong_dimension(self):
+        cache = EmbeddingCache(capacity=4, dim=8)
+        cache.put(key(1), [1.0] * 4)
+        self.assertIsNone(cache.get(key(1)))
+
+    def test_float16_storage(self):
+        cache = EmbeddingCache(capacity=4, dim=8, dtype="float16", num_shards=1)
+        cache.put(key(1), [0.5] * 8)
+        self.assertEqual(cache.get(key(1)), [0.5] * 8)
+        self.assertEqual(cache.get_stats()["slab_bytes"], 4 * 8 * 2)
+
+    def test_concurrent_access(self):
+        cache = EmbeddingCache(capacity=64, dim=8, num_shards=4)
+        errors = []
+
+        def hammer(offset):
+            try:
+                for i in range(2000):
+                    k = key((i + offset) % 200)
+                    cache.put(k, [float(i)] * 8)
+                    value = cache.get(k)
+                    if value is not None and len(value) != 8:
+                        errors.append(value)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=hammer, args=(n * 50,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(cache), cache.capacity)
+
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    """Test expiry and request coalescing of the query embedding cache."""
+
+    def setUp(self):
+        self.calls = 0
+
+    async def _embed(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [float(self.calls)] * 8
+
+    def test_normalized_queries_share_a_key(self):
+        self.assertEqual(
+            query_cache_key("What is  Attention?", "test:model:8"),
+            query_cache_key("what is attention?", "test:model:8"),
+        )
+
+    def test_concurrent_lookups_embed_once(self):
+        cache = QueryEmbeddingCache(capacity=8, ttl_seconds=60)
+
+        async def run():
+            results = await asyncio.gather(
+                *[cache.get_or_embed(key(1), self._embed) for _ in range(5)]
+            )
+            results.append(await cache.get_or_embed(key(1), self._embed))
+            return results
+
+        results = asyncio.run(run())
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == [1.0] * 8 for result in results))
+        stats = cache.get_stats()
+        self.assertEqual((stats["misses"], stats["coalesced"], stats["hits"]), (1, 4, 1))
+
+    def test_cancelled_caller_does_not_cancel_waiters(self):
+        cache = QueryEmbeddingCache(capacity=8, ttl_seconds=60)
+
+        async def run():
+            first = asyncio.ensure_future(cache.get_or_embed(key(1), self._embed))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(cache.get_or_embed(key(1), self._embed))
+            await asyncio.sleep(0)
+            first.cancel()
+            result = await second
+            return first.cancelled(), result
+
+        self.assertEqual(asyncio.run(run()), (True, [1.0] * 8))
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_entries_are_embedded_again(self):
+        cache = QueryEmbeddingCache(capacity=8, ttl_seconds=0)
+
+        async def run():
+            await cache.get_or_embed(key(1), self._embed)
+            return await cache.get_or_embed(key(1), self._embed)
+
+        self.assertEqual(asyncio.run(run()), [2.0] * 8)
+        self.assertEqual(self.calls, 2)
+
+
+
+class TestRetrievalCache(unittest.TestCase):
+    """Test keying and invalidation of the retrieval result cache."""
+
+    def setUp(self):
+        self.cache = RetrievalCache(capacity=8, ttl_seconds=60)
+        self.searches = 0
+
+    def _search(self, pdf_id, index_version, vector, status="success"):
+        async def search():
+            self.searches += 1
+            return {"status": status, "results": []}
+
+        return asyncio.run(
+            self.cache.get_or_search(pdf_id, index_version, vector, 5, None, search)
+        )
+
+    def test_near_identical_vectors_hit(self):
+        self._search("abcde", "v1", [0.5, 0.25, 0.125])
+        self._search("abcde", "v1", [0.5000001, 0.25, 0.125])
+        self._search("abcde", "v1", [0.125, 0.25, 0.5])
+        self.assertEqual(self.searches, 2)
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_new_index_version_and_delete_invalidate(self):
+        self._search("abcde", "v1", [1.0, 0.0])
+        self._search("abcde", "v2", [1.0, 0.0])
+        self.assertEqual(len(self.cache.entries), 1)
+
+        self.cache.invalidate("abcde")
+        self._search("abcde", "v2", [1.0, 0.0])
+        self.assertEqual(self.searches, 3)
+
+    def test_errors_are_not_cached(self):
+        self._search("abcde", "v1", [1.0, 0.0], status="error")
+        self._search("abcde", "v1", [1.0, 0.0])
+        self.assertEqual(self.searches, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
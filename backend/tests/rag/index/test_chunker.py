@@ -0,0 +1,67 @@
+import unittest
+from bisect import bisect_right
+
+from src.rag.index.utils.chunker import IncrementalChunker
+
+
+def make_pages(count):
+    return [
+        f"Page {i} opens here. " + " ".join(f"word{i}_{j}" for j in range(60)) + "\n\n"
+        for i in range(count)
+    ]
+
+
+class TestIncrementalChunker(unittest.TestCase):
+    """Test chunking a stream of pages without buffering the whole document."""
+
+    def test_chunks_respect_size_limit(self):
+        chunker = IncrementalChunker(chunk_size=200, chunk_overlap=20, window_chunks=4)
+        chunks = list(chunker.chunk_pages(make_pages(40)))
+
+        self.assertTrue(chunks)
+        self.assertTrue(all(len(chunk["text"]) <= 200 for chunk in chunks))
+
+    def test_matches_whole_document_split(self):
+        pages = make_pages(40)
+        chunker = IncrementalChunker(chunk_size=200, chunk_overlap=20, window_chunks=4)
+        streamed = [chunk["text"] for chunk in chunker.chunk_pages(pages)]
+        whole = chunker.text_splitter.split_text("".join(pages))
+
+        # Every word of the document ends up in some chunk
+        self.assertEqual(
+            set(" ".join(streamed).split()), set(" ".join(whole).split())
+        )
+        self.assertLessEqual(abs(len(streamed) - len(whole)), len(whole) // 10 + 1)
+
+    def test_buffer_stays_bounded(self):
+        chunker = IncrementalChunker(chunk_size=200, chunk_overlap=20, window_chunks=4)
+        for page_text in make_pages(200):
+            chunker.add_page(page_text)
+            self.assertLess(chunker._buffer_len, chunker.window_size + len(page_text))
+
+    def test_short_document_is_flushed_on_finish(self):
+        chunker = IncrementalChunker(chunk_size=200, chunk_overlap=20)
+        self.assertEqual(chunker.add_page("A single short page."), [])
+        chunks = chunker.finish()
+        self.assertEqual([chunk["text"] for chunk in chunks], ["A single short page."])
+        self.assertEqual(chunker.finish(), [])
+
+    def test_chunks_carry_page_ranges_and_offsets(self):
+        pages = make_pages(30)
+        document = "".join(pages)
+        page_starts = [sum(len(p) for p in pages[:i]) for i in range(len(pages))]
+        chunker = IncrementalChunker(chunk_size=200, chunk_overlap=20, window_chunks=4)
+        chunks = list(chunker.chunk_pages(pages))
+
+        self.assertEqual([c["chunk_index"] for c in chunks], list(range(len(chunks))))
+        for chunk in chunks:
+            # Offsets point back at the chunk's text in the document
+            self.assertEqual(document[chunk["start_char"]:chunk["end_char"]], chunk["text"])
+            # Page numbers are 1-based and match where the offsets fall
+            self.assertEqual(chunk["start_page"], bisect_right(page_starts, chunk["start_char"]))
+            self.assertEqual(chunk["end_page"], bisect_right(page_starts, chunk["end_char"] - 1))
+        self.assertEqual(chunks[-1]["end_page"], 30)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
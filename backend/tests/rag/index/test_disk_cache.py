@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from src.rag.index.utils.disk_cache import DiskEmbeddingCache
+from src.rag.index.utils.embed import embedding_cache_key
+
+
+class TestDiskEmbeddingCache(unittest.TestCase):
+    """Test the SQLite-backed embedding cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "cache.db")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_survives_reopen(self):
+        key = embedding_cache_key("some chunk", "gemini:text-embedding-004:4")
+        cache = DiskEmbeddingCache(self.path, max_bytes=1 << 20)
+        cache.put_many([(key, [0.5, 1.0, -2.0, 0.25])])
+        cache.conn.close()
+
+        reopened = DiskEmbeddingCache(self.path, max_bytes=1 << 20)
+        self.assertEqual(reopened.get_many([key]), {key: [0.5, 1.0, -2.0, 0.25]})
+        self.assertEqual(reopened.total_bytes, 16)
+
+    def test_key_normalizes_whitespace_and_includes_model(self):
+        model_id = "mistral:mistral-embed:1024"
+        self.assertEqual(
+            embedding_cache_key("a  chunk\nof text ", model_id),
+            embedding_cache_key("a chunk of text", model_id),
+        )
+        self.assertNotEqual(
+            embedding_cache_key("a chunk of text", model_id),
+            embedding_cache_key("a chunk of text", "gemini:text-embedding-004:768"),
+        )
+
+    def test_evicts_least_recently_used(self):
+        # Room for four 4-dimensional float32 vectors
+        cache = DiskEmbeddingCache(self.path, max_bytes=64)
+        keys = [embedding_cache_key(f"chunk {i}", "m") for i in range(4)]
+        for key in keys:
+            cache.put_many([(key, [1.0, 2.0, 3.0, 4.0])])
+        # Touch the oldest entry so it is no longer the eviction candidate
+        cache.get_many([keys[0]])
+
+        new_key = embedding_cache_key("chunk 4", "m")
+        cache.put_many([(new_key, [1.0, 2.0, 3.0, 4.0])])
+
+        remaining = cache.get_many(keys + [new_key])
+        self.assertIn(keys[0], remaining)
+        self.assertIn(new_key, remaining)
+        self.assertNotIn(keys[1], remaining)
+        self.assertLessEqual(cache.total_bytes, 64)
+
+    def test_budget_is_shared_between_connections(self):
+        # Two processes' caches on the same file, with room for four vectors
+        first = DiskEmbeddingCache(self.path, max_bytes=64)
+        second = DiskEmbeddingCache(self.path, max_bytes=64)
+        for i in range(3):
+            first.put_many([(embedding_cache_key(f"first {i}", "m"), [1.0, 2.0, 3.0, 4.0])])
+        for i in range(3):
+            second.put_many([(embedding_cache_key(f"second {i}", "m"), [1.0, 2.0, 3.0, 4.0])])
+
+        stored = first.conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        self.assertLessEqual(stored, 64)
+        self.assertEqual(first.total_bytes, stored)
+        self.assertEqual(second.total_bytes, stored)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.models.base import Base
+from src.models.user import User
+from src.models.pdf import PDF
+from src.models.highlight import Highlight  # noqa: F401 - registers the mapper
+from src.models.job import IngestionJob, IngestionUserQueue
+from src.rag.index.queue import PDFQueue
+
+
+class TestPDFQueue(unittest.TestCase):
+    """Test the database-backed ingestion queue."""
+
+    def setUp(self):
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        self.queue = PDFQueue(session_factory=self.Session)
+
+        db = self.Session()
+        db.add(User(id=1, email="reader@example.com", username="reader"))
+        db.add(User(id=2, email="other@example.com", username="other"))
+        for pdf_id in ("AAAAA", "BBBBB"):
+            db.add(PDF(id=pdf_id, title=pdf_id, filename=f"{pdf_id}.pdf",
+                       file_path=f"/tmp/{pdf_id}.pdf", user_id=1))
+        db.commit()
+        db.close()
+
+    def _pdf_status(self, pdf_id):
+        db = self.Session()
+        try:
+            return db.query(PDF).filter(PDF.id == pdf_id).one().processing_status
+        finally:
+            db.close()
+
+    def _job_statuses(self):
+        db = self.Session()
+        try:
+            return [job.status for job in db.query(IngestionJob).order_by(IngestionJob.id)]
+        finally:
+            db.close()
+
+    def test_jobs_are_claimed_in_order_and_only_once(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        self.queue.add_to_queue("BBBBB", "/tmp/BBBBB.pdf")
+
+        first = self.queue.get_next_item("worker-1")
+        second = self.queue.get_next_item("worker-2")
+
+        self.assertEqual(first["pdf_id"], "AAAAA")
+        self.assertEqual(second["pdf_id"], "BBBBB")
+        self.assertIsNone(self.queue.get_next_item("worker-3"))
+        self.assertEqual(self._pdf_status("AAAAA"), "processing")
+
+    def test_status_counts(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        self.queue.add_to_queue("BBBBB", "/tmp/BBBBB.pdf")
+        job = self.queue.get_next_item("worker-1")
+        self.assertTrue(self.queue.complete_job(job["job_id"], "worker-1"))
+
+        status = self.queue.get_queue_status()
+        self.assertEqual(status["queue_size"], 1)
+        self.assertEqual(status["status_counts"], {"queued": 1})
+
+    def test_purge_deletes_only_expired_finished_jobs(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        self.queue.add_to_queue("BBBBB", "/tmp/BBBBB.pdf")
+        job = self.queue.get_next_item("worker-1")
+        self.assertTrue(self.queue.complete_job(job["job_id"], "worker-1"))
+        self.assertEqual(self.queue.purge_finished_jobs(), 0)
+
+        db = self.Session()
+        old = datetime.utcnow() - timedelta(seconds=self.queue.retention_seconds + 60)
+        db.query(IngestionJob).update({IngestionJob.updated_at: old})
+        db.commit()
+        db.close()
+
+        self.assertEqual(self.queue.purge_finished_jobs(batch_size=1), 1)
+        self.assertEqual(self._job_statuses(), ["queued"])
+
+    def test_only_lease_holder_can_finish_job(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        job = self.queue.get_next_item("worker-1")
+
+        self.assertFalse(self.queue.complete_job(job["job_id"], "worker-2"))
+        self.assertFalse(self.queue.extend_lease(job["job_id"], "worker-2"))
+        self.assertTrue(self.queue.extend_lease(job["job_id"], "worker-1"))
+        self.assertTrue(self.queue.fail_job(job["job_id"], "worker-1", "boom"))
+
+    def test_expired_lease_is_reclaimed(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        job = self.queue.get_next_item("worker-1")
+
+        db = self.Session()
+        db.query(IngestionJob).filter(IngestionJob.id == job["job_id"]).update(
+            {IngestionJob.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)}
+        )
+        db.commit()
+        db.close()
+
+        reclaimed = self.queue.get_next_item("worker-2")
+        self.assertEqual(reclaimed["job_id"], job["job_id"])
+        self.assertEqual(reclaimed["attempts"], 2)
+        # The original worker lost its lease and cannot complete the job
+        self.assertFalse(self.queue.complete_job(job["job_id"], "worker-1"))
+
+    def test_reconcile_requeues_orphaned_pdfs(self):
+        # Both PDFs are 'pending' by default but have no job rows
+        self.assertEqual(self.queue.reconcile(), 2)
+        # A second pass finds nothing new to do
+        self.assertEqual(self.queue.reconcile(), 0)
+        self.assertEqual(self.queue.get_queue_status()["queue_size"], 2)
+
+    def _add_pdf(self, pdf_id, user_id, total_pages):
+        db = self.Session()
+        db.add(PDF(id=pdf_id, title=pdf_id, filename=f"{pdf_id}.pdf",
+                   file_path=f"/tmp/{pdf_id}.pdf", user_id=user_id,
+                   total_pages=total_pages))
+        db.commit()
+        db.close()
+        self.queue.add_to_queue(pdf_id, f"/tmp/{pdf_id}.pdf")
+
+    def test_users_share_workers_fairly(self):
+        # User 1 bulk-uploads before user 2 uploads a single paper
+        for i in range(3):
+            self._add_pdf(f"BULK{i}", 1, 10)
+        self._add_pdf("PAPER", 2, 10)
+
+        claimed = [self.queue.get_next_item(f"worker-{i}")["pdf_id"] for i in range(2)]
+        self.assertEqual(claimed, ["BULK0", "PAPER"])
+
+    def _user_queue(self, user_id):
+        db = self.Session()
+        try:
+            row = db.query(IngestionUserQueue).filter(IngestionUserQueue.user_key == user_id).one()
+            return row.top_priority, row.running
+        finally:
+            db.close()
+
+    def test_user_queue_follows_job_transitions(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        self.queue.add_to_queue("BBBBB", "/tmp/BBBBB.pdf")
+        self.assertEqual(self._user_queue(1), (0, 0))
+
+        job = self.queue.get_next_item("worker-1")
+        self.assertEqual(self._user_queue(1), (0, 1))
+        self.queue.complete_job(job["job_id"], "worker-1")
+        self.queue.get_next_item("worker-1")
+        self.assertEqual(self._user_queue(1), (None, 1))
+
+        # A stale row of a user without jobs is corrected instead of blocking the pick
+        db = self.Session()
+        db.add(IngestionUserQueue(user_key=2, top_priority=1, running=0, weight=1.0))
+        db.commit()
+        db.close()
+        self.assertIsNone(self.queue.get_next_item("worker-2"))
+        self.assertEqual(self._user_queue(2), (None, 0))
+
+    def test_short_documents_go_first(self):
+        self._add_pdf("LONG1", 1, 1500)
+        self._add_pdf("SHORT", 1, 10)
+
+        self.assertEqual(self.queue.get_next_item("worker-1")["pdf_id"], "SHORT")
+
+    def test_long_documents_age_in(self):
+        self._add_pdf("LONG1", 1, 1500)
+        db = self.Session()
+        # Pretend the long job has waited longer than its page cost
+        db.query(IngestionJob).update({IngestionJob.sched_key: IngestionJob.sched_key - 3600})
+        db.commit()
+        db.close()
+        self._add_pdf("SHORT", 1, 10)
+
+        self.assertEqual(self.queue.get_next_item("worker-1")["pdf_id"], "LONG1")
+
+    def test_open_pdf_is_boosted(self):
+        self._add_pdf("SHORT", 1, 10)
+        self._add_pdf("LONG1", 1, 1500)
+
+        self.assertTrue(self.queue.boost("LONG1"))
+        self.assertFalse(self.queue.boost("LONG1"))
+        self.assertEqual(self.queue.get_next_item("worker-1")["pdf_id"], "LONG1")
+
+    def test_cancelling_queued_job(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+
+        self.assertTrue(self.queue.cancel_jobs("AAAAA", timeout=0))
+        self.assertIsNone(self.queue.get_next_item("worker-1"))
+        self.assertEqual(self._job_statuses(), ["cancelled"])
+
+    def test_cancelling_running_job_waits_for_acknowledgement(self):
+        self.queue.add_to_queue("AAAAA", "/tmp/AAAAA.pdf")
+        job = self.queue.get_next_item("worker-1")
+
+        # Nobody acknowledges: the cancel times out but is still requested
+        self.assertFalse(self.queue.cancel_jobs("AAAAA", timeout=0))
+        self.assertTrue(self.queue.is_cancel_requested(job["job_id"]))
+        # The worker keeps its lease while it winds down
+        self.assertTrue(self.queue.extend_lease(job["job_id"], "worker-1"))
+
+        acknowledger = threading.Timer(
+            0.3, self.queue.acknowledge_cancel, (job["job_id"], "worker-1")
+        )
+        acknowledger.start()
+        self.assertTrue(self.queue.cancel_jobs("AAAAA", timeout=5))
+        acknowledger.join()
+        self.assertEqual(self._job_statuses(), ["cancelled"])
+
+    def test_admission_limits(self):
+        self.queue.max_pending_per_user = 2
+        self.queue.max_queue_depth = 3
+        self._add_pdf("U1AAA", 1, 100)
+        self.assertIsNone(self.queue.check_admission(1))
+        self._add_pdf("U1BBB", 1, 100)
+
+        # User 1 is at their limit, user 2 is not
+        self.assertGreaterEqual(self.queue.check_admission(1), 1)
+        self.assertIsNone(self.queue.check_admission(2))
+
+        # A full queue rejects everyone
+        self._add_pdf("U2AAA", 2, 100)
+        self.assertGreaterEqual(self.queue.check_admission(2), 1)
+
+    def test_ready_estimate_uses_measured_throughput(self):
+        self._add_pdf("DONE1", 1, 100)
+        job = self.queue.get_next_item("worker-1")
+        self.queue.complete_job(job["job_id"], "worker-1")
+        db = self.Session()
+        # The job took 50 seconds for 100 pages
+        db.query(IngestionJob).filter(IngestionJob.id == job["job_id"]).update(
+            {IngestionJob.claimed_at: datetime.utcnow() - timedelta(seconds=50)}
+        )
+        db.commit()
+        db.close()
+        self._add_pdf("QUEUE", 1, 300)
+
+        throughput = self.queue.get_throughput()
+        self.assertAlmostEqual(throughput["seconds_per_page"], 0.5, places=1)
+        self.assertEqual(throughput["workers"], 1)
+        # 300 queued pages plus 100 new ones at 0.5 s/page on one worker
+        self.assertAlmostEqual(self.queue.estimate_ready_seconds(100), 200, delta=2)
+
+    def test_stale_index_versions_are_queued_for_reindex(self):
+        db = self.Session()
+        for pdf in db.query(PDF).all():
+            pdf.processing_status = "completed"
+            pdf.has_embeddings = True
+        db.query(PDF).filter(PDF.id == "AAAAA").one().index_version = "v2"
+        db.commit()
+        db.close()
+
+        # Only the PDF that is not on the current version is re-indexed, once
+        self.assertEqual(self.queue.enqueue_reindex("v2"), 1)
+        self.assertEqual(self.queue.enqueue_reindex("v2"), 0)
+
+        job = self.queue.get_next_item("worker-1")
+        self.assertEqual((job["pdf_id"], job["kind"]), ("BBBBB", "reindex"))
+        # The PDF stays available on its old index while it is rebuilt
+        self.assertEqual(self._pdf_status("BBBBB"), "completed")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+import fitz
+
+from src.config import config
+from src.rag.index.stages import StagedIngestion
+from src.rag.index.store.local import LocalVectorDB
+from src.rag.index.utils.chunker import IncrementalChunker
+
+
+class _Batcher:
+    """Embeds every chunk, or none of them while the provider is down"""
+
+    def __init__(self, provider_down=False):
+        self.provider_down = provider_down
+
+    async def aembed_batch(self, batch):
+        if self.provider_down:
+            return [], [], 0
+        return batch, [[1.0] * config.embedding_config.vector_size] * len(batch), 0
+
+
+class TestStagedIngestion(unittest.TestCase):
+    """Test that a run only succeeds once every chunk is stored."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pdf_path = os.path.join(self.tmp_dir.name, "book.pdf")
+        doc = fitz.open()
+        for i in range(5):
+            doc.new_page().insert_text((72, 72), f"Page {i} " + "lorem ipsum " * 40)
+        doc.save(self.pdf_path)
+        doc.close()
+        self.db = LocalVectorDB(os.path.join(self.tmp_dir.name, "vectors"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _run(self, batcher):
+        ingestion = StagedIngestion(batcher, self.db, IncrementalChunker(50, 10))
+        return ingestion.run(self.pdf_path, "abcde", index_version="v1")
+
+    def test_stores_every_chunk(self):
+        stats = self._run(_Batcher())
+        self.assertGreater(stats["chunks"], 0)
+        self.assertEqual(self.db.count_embeddings("abcde", "v1"), stats["chunks"])
+
+    def test_missing_embeddings_fail_the_run(self):
+        with self.assertRaises(RuntimeError):
+            self._run(_Batcher(provider_down=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
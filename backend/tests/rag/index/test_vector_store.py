@@ -0,0 +1,267 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from src.config import config
+from src.rag.index.store.async_embeddings import AsyncVectorDB, ThreadedVectorDB
+from src.rag.index.store.base import chunk_point_id
+from src.rag.index.store import factory
+from src.rag.index.store.embeddings import VectorDB
+from src.rag.index.store.local import LocalVectorDB
+from src.rag.index.store.writer import BulkVectorWriter
+
+
+def _chunks(count, start=0):
+    return [
+        {"text": f"chunk {i}", "chunk_index": i, "start_page": 1, "end_page": 1}
+        for i in range(start, start + count)
+    ]
+
+
+def _vectors(count):
+    size = config.embedding_config.vector_size
+    return [[float(i + 1)] + [0.5] * (size - 1) for i in range(count)]
+
+
+class TestVectorDBPointIds(unittest.TestCase):
+    """Test that chunk points are idempotent across retries."""
+
+    def setUp(self):
+        self.db = VectorDB(path=":memory:", collection_name="test_chunks")
+
+    def _count(self):
+        return self.db.client.count(self.db.collection_name, exact=True).count
+
+    def test_point_id_is_deterministic(self):
+        self.assertEqual(chunk_point_id("abcde", "v1", 3), chunk_point_id("abcde", "v1", 3))
+        self.assertNotEqual(chunk_point_id("abcde", "v1", 3), chunk_point_id("abcde", "v2", 3))
+        self.assertNotEqual(chunk_point_id("abcde", "v1", 3), chunk_point_id("fghij", "v1", 3))
+
+    def test_storing_again_overwrites(self):
+        self.db.store_embeddings(_chunks(5), _vectors(5), "abcde", "v1")
+        self.db.store_embeddings(_chunks(5), _vectors(5), "abcde", "v1")
+        self.assertEqual(self._count(), 5)
+
+        # Another index version of the same PDF lives next to it
+        self.db.store_embeddings(_chunks(5), _vectors(5), "abcde", "v2")
+        self.assertEqual(self._count(), 10)
+
+    def test_existing_point_ids(self):
+        self.db.store_embeddings(_chunks(3), _vectors(3), "abcde", "v1")
+        ids = [chunk_point_id("abcde", "v1", i) for i in range(5)]
+        self.assertEqual(self.db.existing_point_ids("abcde", "v1", ids), set(ids[:3]))
+
+    def test_copy_is_idempotent(self):
+        self.db.store_embeddings(_chunks(4), _vectors(4), "abcde", "v1")
+        self.db.copy_embeddings("abcde", "fghij", index_version="v1")
+        self.db.copy_embeddings("abcde", "fghij", index_version="v1")
+        self.assertEqual(self._count(), 8)
+
+    def test_open_ended_page_window(self):
+        chunks = [
+            {"text": f"chunk {i}", "chunk_index": i, "start_page": i + 1, "end_page": i + 1}
+            for i in range(4)
+        ]
+        self.db.store_embeddings(chunks, _vectors(4), "abcde", "v1")
+        results = self.db.search_embeddings(
+            "abcde", _vectors(1)[0], top_k=10, page_range=(2, None), index_version="v1"
+        )["results"]
+        self.assertEqual(sorted(r["chunk_index"] for r in results), [1, 2, 3])
+
+    def test_copy_stops_when_batch_callback_raises(self):
+        self.db.store_embeddings(_chunks(4), _vectors(4), "abcde", "v1")
+        calls = []
+
+        def on_batch():
+            calls.append(1)
+            if len(calls) > 1:
+                raise RuntimeError("cancelled")
+
+        with self.assertRaises(RuntimeError):
+            self.db.copy_embeddings("abcde", "fghij", batch_size=2, index_version="v1",
+                                    on_batch=on_batch)
+        self.assertEqual(self._count(), 6)
+
+
+class TestBulkVectorWriter(unittest.TestCase):
+    """Test buffering and the final barrier of the bulk writer."""
+
+    def setUp(self):
+        self.db = VectorDB(path=":memory:", collection_name="test_chunks")
+
+    def test_uploads_in_few_requests(self):
+        written = []
+        writer = BulkVectorWriter(
+            self.db, "abcde", "v1", flush_points=50, flush_seconds=60, on_written=written.append
+        )
+        for start in range(0, 120, 10):
+            writer.add(_chunks(10, start), _vectors(10))
+        self.assertEqual(writer.close(expected=120), 120)
+        self.assertEqual(sum(written), 120)
+        # Two full buffers, the remainder, and the barrier write
+        self.assertEqual(writer.requests, 4)
+
+    def test_flushes_on_time(self):
+        writer = BulkVectorWriter(self.db, "abcde", "v1", flush_points=1000, flush_seconds=0.1)
+        writer.add(_chunks(3), _vectors(3))
+        time.sleep(0.5)
+        self.assertEqual(writer.points_written, 3)
+        writer.close()
+
+    def test_barrier_checks_count(self):
+        writer = BulkVectorWriter(self.db, "abcde", "v1")
+        writer.add(_chunks(3), _vectors(3))
+        with self.assertRaises(RuntimeError):
+            writer.close(expected=4)
+
+
+class TestLocalVectorDB(TestVectorDBPointIds):
+    """Run the point id tests on the local backend, plus exact search."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = LocalVectorDB(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _count(self):
+        return self.db.count_embeddings("abcde") + self.db.count_embeddings("fghij")
+
+    def test_search_is_exact(self):
+        size = config.embedding_config.vector_size
+        chunks = [
+            {"text": f"chunk {i}", "chunk_index": i, "start_page": i + 1, "end_page": i + 1}
+            for i in range(4)
+        ]
+        vectors = [[1.0 if d == i else 0.0 for d in range(size)] for i in range(4)]
+        self.db.store_embeddings(chunks, vectors, "abcde", "v1")
+        query = [0.0] * size
+        query[2], query[3] = 3.0, 1.0
+
+        results = self.db.search_embeddings("abcde", query, top_k=2, index_version="v1")["results"]
+        self.assertEqual([r["chunk_index"] for r in results], [2, 3])
+        self.assertAlmostEqual(results[0]["similarity"], 3 / 10 ** 0.5, places=5)
+
+        windowed = self.db.search_embeddings("abcde", query, top_k=5, page_range=(1, 2))
+        self.assertEqual([r["chunk_index"] for r in windowed["results"]], [0, 1])
+        open_ended = self.db.search_embeddings("abcde", query, top_k=5, page_range=(2, None))
+        self.assertEqual([r["chunk_index"] for r in open_ended["results"]], [2, 3, 1])
+
+    def test_stale_versions_and_delete(self):
+        self.db.store_embeddings(_chunks(3), _vectors(3), "abcde", "v1")
+        self.db.store_embeddings(_chunks(2), _vectors(2), "abcde", "v2")
+        self.db.delete_stale_versions("abcde", "v2")
+        self.assertEqual(self.db.count_embeddings("abcde"), 2)
+        self.assertEqual(self.db.count_embeddings("abcde", "v1"), 0)
+
+        self.db.delete_embeddings("abcde")
+        self.assertEqual(self.db.count_embeddings("abcde"), 0)
+
+    def test_visible_to_another_instance(self):
+        self.db.store_embeddings(_chunks(3), _vectors(3), "abcde", "v1")
+        reader = LocalVectorDB(self.tmp_dir.name)
+        self.assertEqual(reader.count_embeddings("abcde", "v1"), 3)
+        self.db.store_embeddings(_chunks(2, start=3), _vectors(2), "abcde", "v1")
+        self.assertEqual(reader.count_embeddings("abcde", "v1"), 5)
+
+    def test_writes_append_parts_until_compacted(self):
+        self.db.store_embeddings(_chunks(3), _vectors(3), "abcde", "v1")
+        first_parts = set(os.listdir(os.path.join(self.tmp_dir.name, "abcde")))
+        self.db.store_embeddings(_chunks(2, start=3), _vectors(2), "abcde", "v1")
+        # Rewriting chunk 0 replaces it on read without touching earlier parts
+        self.db.store_embeddings(_chunks(1), [_vectors(2)[1]], "abcde", "v1")
+        files = set(os.listdir(os.path.join(self.tmp_dir.name, "abcde")))
+        self.assertTrue(first_parts - {"v1.json"} <= files)
+        self.assertEqual(self.db.count_embeddings("abcde", "v1"), 5)
+
+        self.db.compact("abcde", "v1")
+        files = os.listdir(os.path.join(self.tmp_dir.name, "abcde"))
+        self.assertEqual(len([name for name in files if name.endswith(".npy")]), 1)
+        records = [record for batch in self.db.iter_embeddings("abcde", "v1") for record in batch]
+        self.assertEqual(len(records), 5)
+        rewritten = next(r for r in records if r.payload["chunk_index"] == 0)
+        self.assertAlmostEqual(rewritten.vector[0], records[1].vector[0], places=5)
+
+    def test_concurrent_writers_keep_each_others_points(self):
+        writers = [LocalVectorDB(self.tmp_dir.name) for _ in range(4)]
+
+        def write(db, start):
+            for offset in range(0, 20, 2):
+                db.store_embeddings(_chunks(2, start + offset), _vectors(2), "abcde", "v1")
+
+        threads = [
+            threading.Thread(target=write, args=(db, i * 20)) for i, db in enumerate(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(LocalVectorDB(self.tmp_dir.name).count_embeddings("abcde", "v1"), 80)
+
+    def test_async_search_matches_sync(self):
+        self.db.store_embeddings(_chunks(4), _vectors(4), "abcde", "v1")
+        query = _vectors(1)[0]
+        results = asyncio.run(
+            ThreadedVectorDB(self.db).search_embeddings("abcde", query, top_k=3, index_version="v1")
+        )
+        self.assertEqual(results, self.db.search_embeddings("abcde", query, 3, None, "v1"))
+
+
+class TestAsyncVectorDB(unittest.TestCase):
+    """Test the async Qdrant search of the chat path."""
+
+    def _free_port(self):
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            return sock.getsockname()[1]
+
+    def test_unreachable_grpc_port_falls_back_to_rest(self):
+        async def run():
+            db = AsyncVectorDB(
+                host="localhost", port=self._free_port(), grpc_port=self._free_port(),
+                collection_name="test_chunks", prefer_grpc=True,
+            )
+            grpc_client = db.client
+            try:
+                result = await db.search_embeddings("abcde", _vectors(1)[0], top_k=3)
+            finally:
+                await db.close()
+            return db, grpc_client, result
+
+        db, grpc_client, result = asyncio.run(run())
+        self.assertFalse(db.prefer_grpc)
+        self.assertIsNot(db.client, grpc_client)
+        # Nothing listens on the REST port either, so the retried search fails
+        self.assertEqual(result["status"], "error")
+
+
+class TestVectorDBFactory(unittest.TestCase):
+    """Test that the process shares one vector store."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.embedding_config = config.embedding_config
+        self.saved = (self.embedding_config.vector_backend, self.embedding_config.local_vector_path)
+        self.embedding_config.vector_backend = "local"
+        self.embedding_config.local_vector_path = self.tmp_dir.name
+        factory._vector_db = None
+
+    def tearDown(self):
+        factory._vector_db = None
+        self.embedding_config.vector_backend, self.embedding_config.local_vector_path = self.saved
+        self.tmp_dir.cleanup()
+
+    def test_shared_instance(self):
+        vector_db = factory.get_vector_db()
+        self.assertIsInstance(vector_db, LocalVectorDB)
+        self.assertIs(factory.get_vector_db(), vector_db)
+        self.assertIsNot(factory.create_vector_db(), vector_db)
+
+
+if __name__ == "__main__":
+    unittest.main()
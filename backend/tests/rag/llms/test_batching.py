@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.rag.llms.batching import (
+    BatchTooLargeError,
+    aembed_in_packed_batches,
+    embed_in_packed_batches,
+    estimate_tokens,
+    pack_batches,
+    split_oversized,
+)
+from src.rag.llms.llm import LLM
+
+
+class TestEmbeddingBatchPacking(unittest.TestCase):
+    """Test packing embedding inputs under provider item and token limits."""
+
+    def test_batches_respect_item_and_token_limits(self):
+        batches = pack_batches([40, 40, 40, 10, 10, 10, 10], max_items=3, max_tokens=100)
+        self.assertEqual(batches, [(0, 2), (2, 5), (5, 7)])
+
+    def test_oversized_text_is_split_at_whitespace(self):
+        text = " ".join(f"word{i}" for i in range(500))
+        pieces = split_oversized(text, max_tokens=100)
+
+        self.assertGreater(len(pieces), 1)
+        self.assertTrue(all(estimate_tokens(piece) <= 100 for piece in pieces))
+        self.assertEqual(" ".join(pieces).split(), text.split())
+
+    def test_requests_never_exceed_limits(self):
+        texts = ["short text"] * 20 + ["x " * 2000] + ["medium " * 50] * 10
+        requests = []
+
+        def embed(batch):
+            requests.append(batch)
+            return [[1.0, float(len(text))] for text in batch]
+
+        embeddings = embed_in_packed_batches(
+            texts, embed, max_items=8, max_batch_tokens=500, max_input_tokens=300
+        )
+
+        self.assertEqual(len(embeddings), len(texts))
+        self.assertTrue(all(embeddings))
+        for batch in requests:
+            self.assertLessEqual(len(batch), 8)
+            self.assertLessEqual(sum(estimate_tokens(t) for t in batch), 500)
+
+    def test_blank_and_failed_inputs_stay_aligned(self):
+        def embed(batch):
+            return [[] if "bad" in text else [1.0] for text in batch]
+
+        embeddings = embed_in_packed_batches(
+            ["good", "", "bad", "good"], embed,
+            max_items=10, max_batch_tokens=100, max_input_tokens=100,
+        )
+        self.assertEqual(embeddings, [[1.0], [], [], [1.0]])
+
+    def test_async_requests_are_concurrent_bounded_and_ordered(self):
+        texts = [f"text number {i}" for i in range(40)]
+        state = {"in_flight": 0, "peak": 0}
+
+        async def embed(batch):
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            # Finish later batches first to check results are still in input order
+            await asyncio.sleep(0.01 * (40 - int(batch[0].split()[-1])) / 40)
+            state["in_flight"] -= 1
+            return [[float(text.split()[-1])] for text in batch]
+
+        async def run():
+            return await aembed_in_packed_batches(
+                texts, embed, max_items=4, max_batch_tokens=1000,
+                max_input_tokens=1000, semaphore=asyncio.Semaphore(3),
+            )
+
+        embeddings = asyncio.run(run())
+        self.assertEqual(embeddings, [[float(i)] for i in range(40)])
+        self.assertEqual(state["peak"], 3)
+
+
+class TestBatchTooLargeFallback(unittest.TestCase):
+    """Batches the provider rejects as too large are split until they fit."""
+
+    class RejectingLLM(LLM):
+        embedding_max_batch_items = 16
+
+        def __init__(self, max_items):
+            super().__init__(model="fake", api_key="")
+            self.max_items = max_items
+            self.requests = []
+
+        def _embed_request(self, texts):
+            self.requests.append(len(texts))
+            if len(texts) > self.max_items:
+                raise BatchTooLargeError("Too many tokens in batch")
+            if any("huge" in text for text in texts):
+                raise BatchTooLargeError("Too many tokens in batch")
+            return [[float(text.split()[-1])] for text in texts]
+
+    def test_async_batches_are_halved_until_accepted(self):
+        llm = self.RejectingLLM(max_items=3)
+        texts = [f"text {i}" for i in range(10)]
+        embeddings = asyncio.run(llm.aget_embeddings(texts))
+        self.assertEqual(embeddings, [[float(i)] for i in range(10)])
+        # Every input was embedded exactly once, in requests the provider accepted
+        self.assertEqual(sum(size for size in llm.requests if size <= 3), 10)
+
+    def test_sync_batches_fail_only_the_rejected_input(self):
+        llm = self.RejectingLLM(max_items=4)
+        texts = [f"text {i}" for i in range(5)] + ["huge 5"] + [f"text {i}" for i in range(6, 8)]
+        embeddings = embed_in_packed_batches(
+            texts, llm._embed_request, max_items=16, max_batch_tokens=1000, max_input_tokens=1000,
+        )
+        expected = [[float(i)] for i in range(8)]
+        expected[5] = []
+        self.assertEqual(embeddings, expected)
+        self.assertEqual(llm.requests[0], 8)
+
+
+class TestProviderEmbeddingLimit(unittest.TestCase):
+    """The embedding limit holds across event loops, as used by ingestion workers."""
+
+    def test_limit_is_shared_by_event_loops_in_threads(self):
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+
+        class FakeLLM(LLM):
+            embedding_max_batch_items = 1
+            embedding_max_concurrency = 2
+
+            def _embed_request(self, texts):
+                with lock:
+                    state["in_flight"] += 1
+                    state["peak"] = max(state["peak"], state["in_flight"])
+                time.sleep(0.02)
+                with lock:
+                    state["in_flight"] -= 1
+                return [[1.0] for _ in texts]
+
+        def worker():
+            llm = FakeLLM(model="fake", api_key="")
+            asyncio.run(llm.aget_embeddings([f"text {i}" for i in range(6)]))
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(state["peak"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,11 +7,49 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Import all test modules
 from tests.rag.tools.test_init import TestToolsInit
+from tests.rag.index.test_queue import TestPDFQueue
+from tests.rag.index.test_chunker import TestIncrementalChunker
+from tests.rag.index.test_disk_cache import TestDiskEmbeddingCache
+from tests.rag.index.test_cache import (
+    TestEmbeddingCache,
+    TestQueryEmbeddingCache,
+    TestRetrievalCache,
+)
+from tests.rag.index.test_stages import TestStagedIngestion
+from tests.rag.index.test_vector_store import (
+    TestAsyncVectorDB,
+    TestBulkVectorWriter,
+    TestLocalVectorDB,
+    TestVectorDBFactory,
+    TestVectorDBPointIds,
+)
+from tests.rag.llms.test_batching import (
+    TestBatchTooLargeFallback,
+    TestEmbeddingBatchPacking,
+    TestProviderEmbeddingLimit,
+)
+from tests.utils.test_database import TestUpgradeSchema
 
 if __name__ == "__main__":
     # Create a test suite
     loader = unittest.TestLoader()
     suite = loader.loadTestsFromTestCase(TestToolsInit)
+    suite.addTests(loader.loadTestsFromTestCase(TestPDFQueue))
+    suite.addTests(loader.loadTestsFromTestCase(TestIncrementalChunker))
+    suite.addTests(loader.loadTestsFromTestCase(TestDiskEmbeddingCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestEmbeddingCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestQueryEmbeddingCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestRetrievalCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestStagedIngestion))
+    suite.addTests(loader.loadTestsFromTestCase(TestVectorDBPointIds))
+    suite.addTests(loader.loadTestsFromTestCase(TestBulkVectorWriter))
+    suite.addTests(loader.loadTestsFromTestCase(TestLocalVectorDB))
+    suite.addTests(loader.loadTestsFromTestCase(TestVectorDBFactory))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncVectorDB))
+    suite.addTests(loader.loadTestsFromTestCase(TestEmbeddingBatchPacking))
+    suite.addTests(loader.loadTestsFromTestCase(TestBatchTooLargeFallback))
+    suite.addTests(loader.loadTestsFromTestCase(TestProviderEmbeddingLimit))
+    suite.addTests(loader.loadTestsFromTestCase(TestUpgradeSchema))
     
     # Run the tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,72 @@
+import unittest
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.models.base import Base
+from src.models.user import User  # noqa: F401 - registers the mapper
+from src.models.pdf import PDF
+from src.models.highlight import Highlight  # noqa: F401 - registers the mapper
+from src.models.job import IngestionJob
+from src.utils.database import upgrade_schema
+
+
+class TestUpgradeSchema(unittest.TestCase):
+    """Test that tables created by older versions gain the new columns."""
+
+    def setUp(self):
+        self.engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        Base.metadata.create_all(bind=self.engine)
+        # Recreate the tables as an older version of the models left them
+        with self.engine.begin() as conn:
+            conn.execute(text("DROP TABLE pdfs"))
+            conn.execute(text(
+                "CREATE TABLE pdfs (id VARCHAR(5) PRIMARY KEY, title VARCHAR(100) NOT NULL, "
+                "filename VARCHAR(100) NOT NULL, file_path VARCHAR(200) NOT NULL, "
+                "file_size INTEGER, thumbnail_path VARCHAR(200), description TEXT, "
+                "uploaded_at DATETIME, user_id INTEGER NOT NULL, total_pages INTEGER, "
+                "current_page INTEGER, has_embeddings BOOLEAN, processing_error VARCHAR, "
+                "processing_status VARCHAR(20), table_of_contents JSON)"
+            ))
+            conn.execute(text(
+                "INSERT INTO pdfs (id, title, filename, file_path, user_id) "
+                "VALUES ('AAAAA', 'a', 'a.pdf', '/tmp/a.pdf', 1)"
+            ))
+            conn.execute(text("DROP TABLE ingestion_jobs"))
+            conn.execute(text(
+                "CREATE TABLE ingestion_jobs (id INTEGER PRIMARY KEY, pdf_id VARCHAR(5) NOT NULL, "
+                "pdf_path VARCHAR(200) NOT NULL, status VARCHAR(20) NOT NULL, "
+                "attempts INTEGER NOT NULL, created_at DATETIME, updated_at DATETIME)"
+            ))
+            conn.execute(text(
+                "INSERT INTO ingestion_jobs (pdf_id, pdf_path, status, attempts) "
+                "VALUES ('AAAAA', '/tmp/a.pdf', 'queued', 0)"
+            ))
+
+    def test_missing_columns_and_indexes_are_added(self):
+        upgrade_schema(Base.metadata, self.engine)
+        upgrade_schema(Base.metadata, self.engine)
+
+        inspector = inspect(self.engine)
+        columns = {column["name"] for column in inspector.get_columns("pdfs")}
+        self.assertTrue({"content_hash", "index_version"} <= columns)
+        indexes = {index["name"] for index in inspector.get_indexes("pdfs")}
+        self.assertIn("ix_pdfs_content_hash", indexes)
+
+        db = sessionmaker(bind=self.engine)()
+        try:
+            pdf = db.query(PDF).filter(PDF.id == "AAAAA").one()
+            self.assertIsNone(pdf.content_hash)
+            job = db.query(IngestionJob).one()
+            self.assertEqual((job.kind, job.priority, job.sched_key), ("ingest", 0, 0.0))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()